@@ -0,0 +1,254 @@
+"""Mesures de performance d'e-Note, hors interface graphique.
+
+Usage: python benchmark.py
+       python benchmark.py --suite [--tailles 1000 10000 100000] [--donnees DOSSIER]
+                           [--sortie resultats.json] [--reference reference.json] [--enregistrer-reference]
+
+--suite chronomètre les chemins principaux de Database et des rapports sur des bases synthétiques
+déterministes, enregistre les résultats en JSON et les compare à une référence: le code de sortie
+est 1 si une opération a régressé.
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+import timeit
+from datetime import datetime
+
+from gestion_notes import (Database, DeliberationRules, generate_bulletin_html, export_classement_pdf_file,
+                           export_statistics_pdf_file, render_bulletins_lot)
+
+
+def bench_bulletin_html(n_bulletins=2000, n_matieres=20):
+    """Temps moyen (en secondes) de génération du HTML d'un bulletin"""
+    notes = [(f"MAT{i:02d}", f"Matière {i}", float(1 + i % 4), float(i % 20)) for i in range(n_matieres)]
+    total_coef = sum(n[2] for n in notes)
+    weighted_sum = sum(n[2] * n[3] for n in notes)
+    moyenne_data = (round(weighted_sum / total_coef, 2), weighted_sum, total_coef)
+    observation = DeliberationRules().observation(moyenne_data[0], notes)
+    elapsed = timeit.timeit(
+        lambda: generate_bulletin_html("2024-0001", "Rakoto Jean", "L2", 2024, notes, moyenne_data,
+                                       observation=observation),
+        number=n_bulletins)
+    return elapsed / n_bulletins
+
+
+def bench_classement_pdf(n_etudiants=10000):
+    """Durée (en secondes) et taille (en octets) de l'export paginé du classement"""
+    rows = ((rang, f"2024-{rang:05d}", f"Étudiant {rang}", "L1", 2024, round(20 - rang * 20 / n_etudiants, 2))
+            for rang in range(1, n_etudiants + 1))
+    fd, filename = tempfile.mkstemp(suffix=".pdf")
+    os.close(fd)
+    try:
+        start = time.perf_counter()
+        export_classement_pdf_file(filename, rows, 2024, "L1", total=n_etudiants)
+        return time.perf_counter() - start, os.path.getsize(filename)
+    finally:
+        os.remove(filename)
+
+
+def remplir_base(db, n_etudiants, n_matieres=20, annees=(2022, 2023, 2024)):
+    """Base déterministe: étudiants répartis sur les années et les niveaux, une note par matière"""
+    niveaux = ["L1", "L2", "L3", "M1", "M2"]
+    etudiants = [(f"{annees[i % len(annees)]}-{i:06d}", f"Étudiant {i}", niveaux[i // len(annees) % len(niveaux)],
+                  annees[i % len(annees)]) for i in range(n_etudiants)]
+    db.conn.executemany("INSERT INTO matieres (codeMat, libelle, coef) VALUES (?, ?, ?)",
+                        [(f"MAT{j:02d}", f"Matière {j}", float(1 + j % 4)) for j in range(n_matieres)])
+    db.conn.executemany("INSERT INTO etudiants (n_inscription, nom, niveau, annee) VALUES (?, ?, ?, ?)", etudiants)
+    db.conn.executemany("INSERT INTO notes (codeMat, n_inscription, annee, note) VALUES (?, ?, ?, ?)",
+                        ((f"MAT{j:02d}", n, annee, (i * 7 + j * 13) % 41 / 2)
+                         for i, (n, _, _, annee) in enumerate(etudiants) for j in range(n_matieres)))
+    db.conn.commit()
+    return etudiants
+
+
+def bench_format_notes(n_etudiants=30000, n_matieres=20, annees=(2022, 2023, 2024)):
+    """Format standard contre format compact (Database.migrer_format_compact), sur les mêmes données.
+
+    Pour chaque format: taille du fichier (octets, après VACUUM), parcours de toutes les notes,
+    chargement et moyennes d'une année (matrice) et moyenne de 1000 étudiants un par un
+    (secondes, meilleur de 3 essais).
+    """
+    dossier = tempfile.mkdtemp()
+    try:
+        standard = os.path.join(dossier, "standard.db")
+        compact = os.path.join(dossier, "compact.db")
+        db = Database(standard)
+        etudiants = remplir_base(db, n_etudiants, n_matieres, annees)
+        db.conn.close()
+        shutil.copy(standard, compact)
+        db = Database(compact)
+        db.migrer_format_compact()
+        db.conn.close()
+
+        resultats = {}
+        for nom, fichier in (("standard", standard), ("compact", compact)):
+            db = Database(fichier)
+            db.conn.execute("VACUUM")
+            taille = os.path.getsize(fichier)
+            parcours = min(timeit.repeat(
+                lambda: db.conn.execute("SELECT annee, COUNT(*), SUM(note) FROM notes GROUP BY annee").fetchall(),
+                number=1, repeat=3))
+            matrice = min(timeit.repeat(lambda: db._load_grade_matrix(annees[-1], None).moyennes(),
+                                        number=1, repeat=3))
+            moyennes = min(timeit.repeat(
+                lambda: [db.calculate_average_for_student(n, annee) for n, _, _, annee in etudiants[:1000]],
+                number=1, repeat=3))
+            db.conn.close()
+            resultats[nom] = {'taille': taille, 'parcours': parcours, 'matrice': matrice, 'moyennes': moyennes}
+        return resultats
+    finally:
+        shutil.rmtree(dossier)
+
+
+def preparer_base(dossier, n_etudiants, n_matieres=20, annees=(2022, 2023, 2024)):
+    """Chemin d'une base remplie par remplir_base, générée une seule fois par jeu de paramètres"""
+    chemin = os.path.join(dossier, f"bench_{n_etudiants}x{n_matieres}_{annees[0]}-{annees[-1]}.db")
+    if not os.path.exists(chemin):
+        temporaire = chemin + ".tmp"
+        if os.path.exists(temporaire):
+            os.remove(temporaire)
+        db = Database(temporaire)
+        remplir_base(db, n_etudiants, n_matieres, annees)
+        db.conn.close()
+        os.replace(temporaire, chemin)
+    return chemin
+
+
+def bench_suite_base(chemin, annee, niveau="L1", recherche="Étudiant 12", repetitions=3):
+    """Durées (secondes, meilleur de repetitions essais) des chemins principaux sur la base chemin.
+
+    Les caches de Database sont invalidés avant chaque essai: les durées sont celles d'un
+    premier affichage après une modification. Les exports PDF sont chronométrés seuls, leurs
+    données étant lues une fois.
+    """
+    db = Database(chemin)
+    fd, pdf = tempfile.mkstemp(suffix=".pdf")
+    os.close(fd)
+
+    def bulletins():
+        decisions = db.get_decisions(annee=annee, niveau=niveau)
+        lot = [etudiant + (notes, moyenne_data,
+                           db.rang_promotion(annee, etudiant, moyenne_data[0] if moyenne_data else None),
+                           decisions.get(etudiant[0]))
+               for etudiant, notes, moyenne_data in db.get_notes_for_students(annee=annee, niveau=niveau)]
+        return render_bulletins_lot(lot)
+
+    statistiques = db.get_statistics(annee=annee)
+    classement = [row[:6] for row in db.get_classement(annee=annee)]
+    operations = {
+        "get_all_students_with_average": lambda: db.get_all_students_with_average(annee=annee),
+        "get_statistics": lambda: db.get_statistics(annee=annee),
+        "get_notes": lambda: db.get_notes(annee=annee),
+        "find_etudiant": lambda: db.find_etudiant(recherche),
+        "find_matiere": lambda: db.find_matiere("Matière 1"),
+        "find_notes": lambda: db.find_notes(recherche),
+        "bulletins_html": bulletins,
+        "export_statistiques_pdf": lambda: export_statistics_pdf_file(pdf, statistiques, annee),
+        "export_classement_pdf": lambda: export_classement_pdf_file(pdf, classement, annee, "Tous les niveaux"),
+    }
+    try:
+        return {nom: min(timeit.repeat(fonction, setup=db._touch, number=1, repeat=repetitions))
+                for nom, fonction in operations.items()}
+    finally:
+        db.conn.close()
+        os.remove(pdf)
+
+
+def bench_suite(tailles=(1000, 10000, 100000), n_matieres=20, annees=(2022, 2023, 2024), dossier=None,
+                repetitions=3):
+    """Résultats de bench_suite_base pour chaque nombre d'étudiants, avec l'environnement de mesure"""
+    temporaire = dossier is None
+    dossier = dossier or tempfile.mkdtemp()
+    os.makedirs(dossier, exist_ok=True)
+    try:
+        resultats = {}
+        for n in tailles:
+            chemin = preparer_base(dossier, n, n_matieres, annees)
+            resultats[str(n)] = bench_suite_base(chemin, annees[-1], repetitions=repetitions)
+        return {"date": datetime.now().isoformat(timespec="seconds"), "python": platform.python_version(),
+                "sqlite": sqlite3.sqlite_version, "plateforme": platform.platform(), "matieres": n_matieres,
+                "annees": list(annees), "resultats": resultats}
+    finally:
+        if temporaire:
+            shutil.rmtree(dossier)
+
+
+def comparer(mesures, reference, tolerance=0.25, plancher=0.005):
+    """[(taille, opération, référence, mesure, ratio, régression)] des opérations présentes des deux côtés.
+
+    Régression: plus de tolerance (relative) au-dessus de la référence, et plus de plancher
+    secondes d'écart pour ne pas signaler le bruit des opérations très courtes.
+    """
+    lignes = []
+    for taille, operations in mesures["resultats"].items():
+        for nom, duree in operations.items():
+            ref = reference["resultats"].get(taille, {}).get(nom)
+            if ref is None:
+                continue
+            regression = duree > ref * (1 + tolerance) and duree - ref > plancher
+            lignes.append((taille, nom, ref, duree, duree / ref if ref else float("inf"), regression))
+    return lignes
+
+
+def main_suite(args):
+    mesures = bench_suite(args.tailles, dossier=args.donnees, repetitions=args.repetitions)
+    for taille, operations in mesures["resultats"].items():
+        print(f"{taille} étudiants:")
+        for nom, duree in operations.items():
+            print(f"  {nom:32s} {duree * 1e3:10.1f} ms")
+    with open(args.sortie, "w", encoding="utf-8") as f:
+        json.dump(mesures, f, ensure_ascii=False, indent=2)
+    print(f"Résultats enregistrés: {args.sortie}")
+
+    if args.enregistrer_reference:
+        shutil.copy(args.sortie, args.reference)
+        print(f"Référence enregistrée: {args.reference}")
+        return 0
+    if not os.path.exists(args.reference):
+        print(f"Pas de référence ({args.reference}): relancer avec --enregistrer-reference pour en créer une")
+        return 0
+    with open(args.reference, encoding="utf-8") as f:
+        reference = json.load(f)
+    regressions = 0
+    print(f"Comparaison avec {args.reference} ({reference['date']}):")
+    for taille, nom, ref, duree, ratio, regression in comparer(mesures, reference, args.tolerance):
+        regressions += regression
+        print(f"  {taille:>7s} {nom:32s} {ref * 1e3:10.1f} -> {duree * 1e3:10.1f} ms  x{ratio:.2f}"
+              + ("  RÉGRESSION" if regression else ""))
+    print(f"{regressions} régression(s)")
+    return 1 if regressions else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Mesures de performance d'e-Note")
+    parser.add_argument("--suite", action="store_true", help="suite complète sur des bases synthétiques")
+    parser.add_argument("--tailles", type=int, nargs="+", default=[1000, 10000, 100000],
+                        help="nombres d'étudiants des bases générées")
+    parser.add_argument("--repetitions", type=int, default=3, help="essais par opération (le meilleur est retenu)")
+    parser.add_argument("--donnees", help="dossier où conserver les bases générées d'une exécution à l'autre")
+    parser.add_argument("--sortie", default="benchmark_resultats.json", help="fichier JSON des résultats")
+    parser.add_argument("--reference", default="benchmark_reference.json", help="fichier JSON de référence")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="hausse relative tolérée avant régression")
+    parser.add_argument("--enregistrer-reference", action="store_true",
+                        help="enregistre ces résultats comme nouvelle référence")
+    args = parser.parse_args()
+    if args.suite:
+        sys.exit(main_suite(args))
+
+    print(f"Bulletin HTML: {bench_bulletin_html() * 1e6:.1f} µs/bulletin")
+    for n in (1000, 10000):
+        elapsed, size = bench_classement_pdf(n)
+        print(f"Classement PDF {n} étudiants: {elapsed:.2f} s, {size // 1024} Ko")
+    for nom, r in bench_format_notes().items():
+        print(f"Notes, format {nom}: {r['taille'] // 1024} Ko, parcours {r['parcours'] * 1e3:.0f} ms, "
+              f"matrice d'une année {r['matrice'] * 1e3:.0f} ms, 1000 moyennes {r['moyennes'] * 1e3:.0f} ms")
+
+
+if __name__ == "__main__":
+    main()
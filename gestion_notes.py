@@ -5,18 +5,43 @@ from PyQt5.QtWidgets import (
     QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout, QPushButton,
     QLabel, QLineEdit, QMessageBox, QComboBox, QTableWidget, QTableWidgetItem,
     QSpinBox, QDoubleSpinBox, QGroupBox, QFileDialog, QTextEdit, QDialog,
-    QTextBrowser, QDialog
+    QTextBrowser, QDialog, QProgressDialog, QCompleter, QCheckBox, QShortcut
 )
 
-from PyQt5.QtGui import QPalette, QColor, QIcon 
-from PyQt5.QtCore import Qt
+from PyQt5.QtGui import (
+    QPalette, QColor, QIcon, QPixmap, QGuiApplication, QPdfWriter, QPageSize,
+    QPageLayout, QPainter, QTextDocument, QKeySequence
+)
+from PyQt5.QtCore import Qt, QMarginsF, QRectF, QSizeF, QObject, QTimer, QStringListModel, pyqtSignal, QEvent
 from PyQt5.QtGui import QPalette, QColor
 from PyQt5.QtPrintSupport import QPrinter, QPrintDialog
-import matplotlib.pyplot as plt
+import matplotlib
+import numpy as np
+from matplotlib.figure import Figure
+from matplotlib.patches import Rectangle
 from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg as FigureCanvas
 from matplotlib.backends.backend_pdf import PdfPages
+from matplotlib.font_manager import FontProperties, findfont, get_font
 from datetime import datetime
+from collections import OrderedDict, deque
+from itertools import groupby
+from bisect import bisect_left, bisect_right, insort
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+import multiprocessing
+from html import escape
+import functools
+import gzip
+import inspect
+import io
+import json
 import os
+import re
+import shutil
+import threading
+import time
+import warnings
+from queue import Queue, Empty
+from urllib.request import pathname2url
 
 DEFAULT_USERNAME = "admin"
 DEFAULT_PASSWORD = "admin123"
@@ -181,16 +206,100 @@ class LoginDialog(QDialog):
             self.password_input.setFocus()
 
 DB_FILE = "gestion_notes.db"
+NIVEAUX = ["L1", "L2", "L3", "M1", "M2"]
+# Niveau atteint par un admis; pas de niveau suivant après le M2
+NIVEAU_SUIVANT = dict(zip(NIVEAUX, NIVEAUX[1:]))
+
+def _encoder_journal(valeur):
+    if isinstance(valeur, DeliberationRules):
+        return {"__regles__": valeur.to_dict()}
+    if isinstance(valeur, np.generic):
+        return valeur.item()
+    raise TypeError(f"Valeur non journalisable: {valeur!r}")
+
+def _decoder_journal(objet):
+    if "__regles__" in objet:
+        return DeliberationRules.from_dict(objet["__regles__"])
+    return objet
+
+def _journalise(methode):
+    """Écriture rejouable: en mode mémoire, l'appel réussi est consigné dans le journal des écritures"""
+    @functools.wraps(methode)
+    def enveloppe(self, *args, **kwargs):
+        resultat = methode(self, *args, **kwargs)
+        if self._journal is not None and not kwargs.get("simulation"):
+            self._consigner(methode.__name__, args, kwargs)
+        return resultat
+    return enveloppe
+
+def _ecriture_immediate(methode):
+    """Opération qui touche d'autres fichiers ou le schéma: en mode mémoire, recopiée sur disque aussitôt"""
+    @functools.wraps(methode)
+    def enveloppe(self, *args, **kwargs):
+        resultat = methode(self, *args, **kwargs)
+        if self.en_memoire:
+            self.ecrire_sur_disque()
+        return resultat
+    return enveloppe
+
+class ArchiveInaccessible(sqlite3.OperationalError):
+    """Fichier d'archive d'une année absent ou illisible"""
+
+class ModificationConcurrente(sqlite3.OperationalError):
+    """Mode mémoire: le fichier de la base a été modifié par une autre connexion pendant la session"""
 
 class Database:
-    def __init__(self, filename=DB_FILE):
-        self.conn = sqlite3.connect(filename)
+    def __init__(self, filename=DB_FILE, en_memoire=False):
+        self.filename = filename
+        self.en_memoire = en_memoire
+        self._journal = None
+        self._ecritures_en_attente = 0
+        self.profileur = None
+        # Relevée avant toute écriture de cette ouverture (schéma, triggers), pour _rejouer_journal
+        empreinte = self._empreinte_fichier()
+        # uri=True: les archives annuelles sont attachées en lecture seule par une URI file:...?mode=ro
+        if en_memoire:
+            # Mode mémoire: lectures et écritures en RAM, ecrire_sur_disque() recopie la base dans son fichier
+            self.conn = sqlite3.connect(":memory:", uri=True)
+            # Connexion gardée pour toute la session: son data_version signale les commits des autres connexions
+            self._disque = sqlite3.connect(filename, timeout=30)
+            self._disque.backup(self.conn)
+            self._version_disque = self._disque.execute("PRAGMA data_version").fetchone()[0]
+        else:
+            self.conn = sqlite3.connect(filename, uri=True)
+        # Même arrondi que Python (calculate_average_for_student), ROUND() de SQLite arrondit autrement les demis
+        self.conn.create_function("arrondi", 2, round, deterministic=True)
+        self._data_version = 0
+        self._rankings = {}
+        self._rankings_version = None
+        self._distributions = {}
+        self._matrices = {}
+        self._statistiques_matieres = {}
+        self._regles = {}
+        self._archives = {}
+        self._attachees = OrderedDict()
+        self._historique = None
+        # Années dont l'archive est lue directement par les vues de l'historique: jamais détachées
+        self._historique_attachees = set()
+        # id(cache) -> [succès, échecs], pour le panneau de diagnostic
+        self._compteurs_caches = {}
         self._create_tables()
         self.update_database_schema()  
+        self._create_archives()
+        self._create_stats_annuelles()
+        self._rejouer_journal(empreinte)
+        if en_memoire:
+            self._journal = open(self._chemin_journal(), "a", encoding="utf-8")
 
     def _create_tables(self):
         cur = self.conn.cursor()
+        # Ne s'applique qu'à une base vide; une base existante est convertie par convertir_auto_vacuum
+        cur.execute("PRAGMA auto_vacuum = INCREMENTAL")
         cur.execute("PRAGMA foreign_keys = ON")
+        cur.execute("SELECT type FROM sqlite_master WHERE name='notes'")
+        row = cur.fetchone()
+        # Format compact (migrer_format_compact): notes est une vue sur notes_compactes
+        self.compact = row is not None and row[0] == 'view'
         
         cur.execute("""
         CREATE TABLE IF NOT EXISTS etudiants (
@@ -205,17 +314,36 @@ class Database:
             libelle TEXT NOT NULL,
             coef REAL NOT NULL
         )""")
+        if not self.compact:
+            cur.execute("""
+            CREATE TABLE IF NOT EXISTS notes (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                codeMat TEXT NOT NULL,
+                n_inscription TEXT NOT NULL,
+                annee INTEGER NOT NULL,
+                note REAL NOT NULL,
+                FOREIGN KEY(codeMat) REFERENCES matieres(codeMat) ON DELETE CASCADE,
+                FOREIGN KEY(n_inscription) REFERENCES etudiants(n_inscription) ON DELETE CASCADE,
+                UNIQUE(codeMat, n_inscription, annee)
+            )""")
+            cur.execute("CREATE INDEX IF NOT EXISTS idx_notes_etudiant ON notes(n_inscription, annee)")
         cur.execute("""
-        CREATE TABLE IF NOT EXISTS notes (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            codeMat TEXT NOT NULL,
-            n_inscription TEXT NOT NULL,
+        CREATE TABLE IF NOT EXISTS parametres (
+            cle TEXT PRIMARY KEY,
+            valeur TEXT NOT NULL
+        )""")
+        # Inscriptions des années quittées par promouvoir_promotion: etudiants ne garde que l'année en cours,
+        # les rapports d'une année close y retrouvent les étudiants promus depuis (voir PARCOURS)
+        cur.execute("""
+        CREATE TABLE IF NOT EXISTS inscriptions (
+            n_inscription TEXT NOT NULL REFERENCES etudiants(n_inscription) ON DELETE CASCADE,
             annee INTEGER NOT NULL,
-            note REAL NOT NULL,
-            FOREIGN KEY(codeMat) REFERENCES matieres(codeMat) ON DELETE CASCADE,
-            FOREIGN KEY(n_inscription) REFERENCES etudiants(n_inscription) ON DELETE CASCADE,
-            UNIQUE(codeMat, n_inscription, annee)
+            niveau TEXT NOT NULL,
+            PRIMARY KEY(annee, n_inscription)
         )""")
+        cur.execute("CREATE INDEX IF NOT EXISTS idx_inscriptions_etudiant ON inscriptions(n_inscription)")
+        cur.execute("CREATE INDEX IF NOT EXISTS idx_etudiants_annee_niveau ON etudiants(annee, niveau)")
+        cur.execute("CREATE INDEX IF NOT EXISTS idx_etudiants_nom ON etudiants(nom COLLATE NOCASE)")
         
         cur.execute("PRAGMA foreign_keys")
         result = cur.fetchone()
@@ -230,6 +358,8 @@ class Database:
             return cur.fetchone()[0]
 
     def update_database_schema(self):
+        if self.compact:
+            return
         cur = self.conn.cursor()
         
         try:
@@ -266,6 +396,7 @@ class Database:
                 
                 cur.execute("DROP TABLE notes")
                 cur.execute("ALTER TABLE notes_temp RENAME TO notes")
+                cur.execute("CREATE INDEX IF NOT EXISTS idx_notes_etudiant ON notes(n_inscription, annee)")
                 
                 self.conn.commit()
                 print("Schéma mis à jour avec succès")
@@ -274,27 +405,725 @@ class Database:
             print(f"Erreur lors de la mise à jour du schéma: {e}")
             self.conn.rollback()
 
+    # Identifiant d'une note au format compact: annee * ID_ANNEE + id étudiant * ID_ETUDIANT + id matière
+    ID_ANNEE = 10 ** 12
+    ID_ETUDIANT = 10 ** 4
+
+    # Une ligne par année d'inscription: année en cours (etudiants) et années quittées (inscriptions).
+    # Sert de table etudiants aux rapports d'une année; la condition sur annee est poussée dans
+    # chaque branche, qui garde son index.
+    PARCOURS = """(SELECT n_inscription, nom, niveau, annee FROM main.etudiants
+                   UNION ALL
+                   SELECT inscriptions.n_inscription, etudiants.nom, inscriptions.niveau, inscriptions.annee
+                   FROM main.inscriptions JOIN main.etudiants ON etudiants.n_inscription = inscriptions.n_inscription)"""
+    # Même chose au format compact, avec la clé entière de l'étudiant
+    PARCOURS_COMPACT = """(SELECT id, n_inscription, nom, niveau, annee FROM main.etudiants
+                           UNION ALL
+                           SELECT etudiants.id, inscriptions.n_inscription, etudiants.nom, inscriptions.niveau,
+                                  inscriptions.annee
+                           FROM main.inscriptions
+                           JOIN main.etudiants ON etudiants.n_inscription = inscriptions.n_inscription)"""
+    # Chaque étudiant une fois, avec son inscription de l'année en paramètre s'il en a une (bulletins)
+    INSCRITS = """(SELECT etudiants.n_inscription, etudiants.nom,
+                          COALESCE(inscriptions.niveau, etudiants.niveau) AS niveau,
+                          COALESCE(inscriptions.annee, etudiants.annee) AS annee
+                   FROM main.etudiants
+                   LEFT JOIN main.inscriptions ON inscriptions.n_inscription = etudiants.n_inscription
+                                              AND inscriptions.annee = ?)"""
+
+    @_ecriture_immediate
+    def migrer_format_compact(self):
+        """Passe la base au format compact des notes; sans effet si c'est déjà fait.
+
+        Étudiants et matières reçoivent une clé entière (id), et les notes sont rangées dans
+        notes_compactes: table WITHOUT ROWID de clé (annee, etudiant_id, matiere_id), notes en centièmes
+        entiers. notes devient une vue de mêmes colonnes, avec des triggers INSTEAD OF, si bien que
+        les requêtes existantes restent valables. Les notes sont arrondies au centième.
+        Renvoie le nombre de notes migrées.
+        """
+        if self.compact:
+            return 0
+        cur = self.conn.cursor()
+        # Les vues de l'historique des archives lisent les tables reconstruites ici
+        for table in ("etudiants", "notes"):
+            cur.execute(f"DROP VIEW IF EXISTS temp.historique_{table}")
+        self._historique = None
+        self._historique_attachees = set()
+        self.conn.commit()
+        # Tables reconstruites: les clés étrangères sont vérifiées par foreign_key_check avant validation
+        cur.execute("PRAGMA foreign_keys = OFF")
+        try:
+            cur.execute("BEGIN IMMEDIATE")
+            cur.execute("""CREATE TABLE etudiants_compacts (
+                               n_inscription TEXT NOT NULL UNIQUE,
+                               nom TEXT NOT NULL,
+                               niveau TEXT NOT NULL,
+                               annee INTEGER NOT NULL,
+                               id INTEGER PRIMARY KEY
+                           )""")
+            cur.execute("""CREATE TABLE matieres_compactes (
+                               codeMat TEXT NOT NULL UNIQUE,
+                               libelle TEXT NOT NULL,
+                               coef REAL NOT NULL,
+                               id INTEGER PRIMARY KEY
+                           )""")
+            cur.execute("""CREATE TABLE notes_compactes (
+                               annee INTEGER NOT NULL,
+                               etudiant_id INTEGER NOT NULL REFERENCES etudiants_compacts(id) ON DELETE CASCADE,
+                               matiere_id INTEGER NOT NULL REFERENCES matieres_compactes(id) ON DELETE CASCADE,
+                               centiemes INTEGER NOT NULL,
+                               PRIMARY KEY(annee, etudiant_id, matiere_id)
+                           ) WITHOUT ROWID""")
+            cur.execute("""INSERT INTO etudiants_compacts (n_inscription, nom, niveau, annee)
+                           SELECT n_inscription, nom, niveau, annee FROM etudiants ORDER BY n_inscription""")
+            cur.execute("""INSERT INTO matieres_compactes (codeMat, libelle, coef)
+                           SELECT codeMat, libelle, coef FROM matieres ORDER BY codeMat""")
+            cur.execute("SELECT COUNT(*) FROM etudiants_compacts")
+            etudiants = cur.fetchone()[0]
+            cur.execute("SELECT COUNT(*) FROM matieres_compactes")
+            if etudiants >= self.ID_ANNEE // self.ID_ETUDIANT or cur.fetchone()[0] >= self.ID_ETUDIANT:
+                raise ValueError("Trop d'étudiants ou de matières pour le format compact.")
+            cur.execute("""INSERT INTO notes_compactes (annee, etudiant_id, matiere_id, centiemes)
+                           SELECT notes.annee, etudiants_compacts.id, matieres_compactes.id,
+                                  CAST(round(notes.note * 100) AS INTEGER)
+                           FROM notes
+                           JOIN etudiants_compacts ON etudiants_compacts.n_inscription = notes.n_inscription
+                           JOIN matieres_compactes ON matieres_compactes.codeMat = notes.codeMat
+                           ORDER BY 1, 2, 3""")
+            migrees = cur.rowcount
+            cur.execute("DROP TABLE notes")
+            cur.execute("DROP TABLE etudiants")
+            cur.execute("DROP TABLE matieres")
+            cur.execute("ALTER TABLE etudiants_compacts RENAME TO etudiants")
+            cur.execute("ALTER TABLE matieres_compactes RENAME TO matieres")
+            cur.execute("CREATE INDEX idx_etudiants_annee_niveau ON etudiants(annee, niveau)")
+            cur.execute("CREATE INDEX idx_etudiants_nom ON etudiants(nom COLLATE NOCASE)")
+            cur.execute(f"""CREATE VIEW notes AS
+                            SELECT notes_compactes.annee * {self.ID_ANNEE}
+                                   + notes_compactes.etudiant_id * {self.ID_ETUDIANT}
+                                   + notes_compactes.matiere_id AS id,
+                                   matieres.codeMat AS codeMat, etudiants.n_inscription AS n_inscription,
+                                   notes_compactes.annee AS annee, notes_compactes.centiemes / 100.0 AS note
+                            FROM notes_compactes
+                            JOIN etudiants ON etudiants.id = notes_compactes.etudiant_id
+                            JOIN matieres ON matieres.id = notes_compactes.matiere_id""")
+            cle = ("annee = OLD.annee"
+                   " AND etudiant_id = (SELECT id FROM etudiants WHERE n_inscription = OLD.n_inscription)"
+                   " AND matiere_id = (SELECT id FROM matieres WHERE codeMat = OLD.codeMat)")
+            cur.execute("""CREATE TRIGGER trg_notes_insert INSTEAD OF INSERT ON notes BEGIN
+                               INSERT INTO notes_compactes (annee, etudiant_id, matiere_id, centiemes)
+                               VALUES (NEW.annee,
+                                       (SELECT id FROM etudiants WHERE n_inscription = NEW.n_inscription),
+                                       (SELECT id FROM matieres WHERE codeMat = NEW.codeMat),
+                                       CAST(round(NEW.note * 100) AS INTEGER));
+                           END""")
+            cur.execute(f"""CREATE TRIGGER trg_notes_update INSTEAD OF UPDATE ON notes BEGIN
+                                UPDATE notes_compactes
+                                SET annee = NEW.annee,
+                                    etudiant_id = (SELECT id FROM etudiants WHERE n_inscription = NEW.n_inscription),
+                                    matiere_id = (SELECT id FROM matieres WHERE codeMat = NEW.codeMat),
+                                    centiemes = CAST(round(NEW.note * 100) AS INTEGER)
+                                WHERE {cle};
+                            END""")
+            cur.execute(f"""CREATE TRIGGER trg_notes_delete INSTEAD OF DELETE ON notes BEGIN
+                                DELETE FROM notes_compactes WHERE {cle};
+                            END""")
+            # Arrondi au centième: les agrégats de toutes les années sont à recalculer
+            cur.execute("""INSERT OR IGNORE INTO stats_annuelles_a_recalculer (annee)
+                           SELECT annee FROM etudiants UNION SELECT annee FROM inscriptions
+                           UNION SELECT annee FROM archives_annuelles""")
+            cur.execute("PRAGMA foreign_key_check")
+            if cur.fetchone() is not None:
+                raise ValueError("Clés étrangères incohérentes après migration.")
+            self.conn.commit()
+        except (sqlite3.Error, ValueError) as e:
+            self.conn.rollback()
+            print(f"Erreur lors de la migration au format compact: {e}")
+            raise e
+        finally:
+            cur.execute("PRAGMA foreign_keys = ON")
+        self.compact = True
+        # Les triggers sur les anciennes tables ont disparu avec elles
+        self._create_archives()
+        self._create_stats_annuelles()
+        self._touch()
+        self._rankings.clear()
+        return migrees
+
+    def _cle_note(self, note_id):
+        """Condition SQL sur la vue ou la table notes qui retrouve la note note_id par index"""
+        if not self.compact:
+            return "id = ?", (note_id,)
+        annee, reste = divmod(note_id, self.ID_ANNEE)
+        etudiant_id, matiere_id = divmod(reste, self.ID_ETUDIANT)
+        return ("annee = ? AND n_inscription = (SELECT n_inscription FROM etudiants WHERE id = ?)"
+                " AND codeMat = (SELECT codeMat FROM matieres WHERE id = ?)", (annee, etudiant_id, matiere_id))
+
+    def _create_stats_annuelles(self):
+        """Agrégats par année, tenus à jour année par année.
+
+        Des triggers inscrivent dans stats_annuelles_a_recalculer chaque année dont les notes,
+        les étudiants ou les coefficients changent, y compris depuis une autre connexion;
+        rafraichir_stats_annuelles ne recalcule que ces années-là.
+        Créés après update_database_schema, qui peut recréer la table notes et ses triggers.
+        """
+        cur = self.conn.cursor()
+        cur.execute("""
+        CREATE TABLE IF NOT EXISTS stats_annuelles (
+            annee INTEGER NOT NULL,
+            niveau TEXT NOT NULL,
+            effectif INTEGER NOT NULL,
+            admis INTEGER NOT NULL,
+            redoublant INTEGER NOT NULL,
+            exclus INTEGER NOT NULL,
+            sans_notes INTEGER NOT NULL,
+            somme_moyennes REAL NOT NULL,
+            histogramme TEXT NOT NULL,
+            PRIMARY KEY(annee, niveau)
+        )""")
+        cur.execute("""
+        CREATE TABLE IF NOT EXISTS stats_annuelles_matieres (
+            annee INTEGER NOT NULL,
+            niveau TEXT NOT NULL,
+            codeMat TEXT NOT NULL,
+            effectif INTEGER NOT NULL,
+            somme REAL NOT NULL,
+            reussis INTEGER NOT NULL,
+            PRIMARY KEY(annee, niveau, codeMat)
+        )""")
+        cur.execute("CREATE TABLE IF NOT EXISTS stats_annuelles_a_recalculer (annee INTEGER PRIMARY KEY)")
+
+        # NOT EXISTS plutôt que OR IGNORE: dans un trigger, la clause ON CONFLICT de l'instruction
+        # déclenchante (un upsert par exemple) remplace celle du trigger
+        marquer = ("INSERT INTO stats_annuelles_a_recalculer (annee) SELECT {0} "
+                   "WHERE NOT EXISTS (SELECT 1 FROM stats_annuelles_a_recalculer WHERE annee = {0})")
+        notes = "notes_compactes" if self.compact else "notes"
+        triggers = {
+            "trg_stats_notes_insert": (f"AFTER INSERT ON {notes}", [marquer.format("NEW.annee")]),
+            "trg_stats_notes_update": (f"AFTER UPDATE ON {notes}",
+                                       [marquer.format("OLD.annee"), marquer.format("NEW.annee")]),
+            "trg_stats_notes_delete": (f"AFTER DELETE ON {notes}", [marquer.format("OLD.annee")]),
+            "trg_stats_etudiants_insert": ("AFTER INSERT ON etudiants", [marquer.format("NEW.annee")]),
+            "trg_stats_etudiants_update": ("AFTER UPDATE OF niveau, annee ON etudiants",
+                                           [marquer.format("OLD.annee"), marquer.format("NEW.annee")]),
+            "trg_stats_etudiants_delete": ("AFTER DELETE ON etudiants", [marquer.format("OLD.annee")]),
+            "trg_stats_inscriptions_insert": ("AFTER INSERT ON inscriptions", [marquer.format("NEW.annee")]),
+            "trg_stats_inscriptions_delete": ("AFTER DELETE ON inscriptions", [marquer.format("OLD.annee")]),
+            # Un coefficient modifié change les moyennes de toutes les années
+            "trg_stats_matieres_coef": ("AFTER UPDATE OF coef ON matieres",
+                                        ["INSERT INTO stats_annuelles_a_recalculer (annee) "
+                                         "SELECT annee FROM etudiants UNION SELECT annee FROM inscriptions "
+                                         "UNION SELECT annee FROM archives_annuelles EXCEPT SELECT annee FROM stats_annuelles_a_recalculer"]),
+        }
+        for nom, (evenement, actions) in triggers.items():
+            # Recréés à chaque ouverture pour que leur définition suive celle du code
+            cur.execute(f"DROP TRIGGER IF EXISTS {nom}")
+            cur.execute(f"CREATE TRIGGER {nom} {evenement} BEGIN {'; '.join(actions)}; END")
+
+        # Base existante ou agrégats jamais calculés: toutes les années manquantes sont à calculer
+        cur.execute("""INSERT OR IGNORE INTO stats_annuelles_a_recalculer (annee)
+                       SELECT annee FROM etudiants UNION SELECT annee FROM inscriptions
+                       EXCEPT SELECT annee FROM stats_annuelles""")
+        self.conn.commit()
+
+    def rafraichir_stats_annuelles(self):
+        """Recalcule les agrégats des seules années marquées; renvoie la liste de ces années.
+
+        Une année archivée dont le fichier est inaccessible garde ses agrégats et sa marque.
+        """
+        cur = self.conn.cursor()
+        cur.execute("SELECT annee FROM stats_annuelles_a_recalculer ORDER BY annee")
+        marquees = [r[0] for r in cur.fetchall()]
+        recalculees = []
+        for annee in marquees:
+            # Une année archivée est relue dans son archive, qui ne peut pas être attachée pendant la transaction
+            try:
+                self._tables(annee)
+            except ArchiveInaccessible as e:
+                print(f"Statistiques de {annee} conservées: {e}")
+                continue
+            try:
+                # Verrou d'écriture pris avant de relire la marque: aucune modification ne peut se glisser
+                # entre le recalcul et l'effacement de la marque
+                cur.execute("BEGIN IMMEDIATE")
+                cur.execute("SELECT 1 FROM stats_annuelles_a_recalculer WHERE annee=?", (annee,))
+                if cur.fetchone() is None:
+                    self.conn.commit()
+                    continue
+                cur.execute("DELETE FROM stats_annuelles WHERE annee=?", (annee,))
+                cur.execute("DELETE FROM stats_annuelles_matieres WHERE annee=?", (annee,))
+                niveaux, matieres = self._load_grade_matrix(annee, None).agregats_par_niveau(self.get_regles())
+                cur.executemany("""INSERT INTO stats_annuelles (annee, niveau, effectif, admis, redoublant, exclus,
+                                                                sans_notes, somme_moyennes, histogramme)
+                                   VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+                                [(annee,) + ligne for ligne in niveaux])
+                cur.executemany("""INSERT INTO stats_annuelles_matieres (annee, niveau, codeMat, effectif, somme, reussis)
+                                   VALUES (?, ?, ?, ?, ?, ?)""",
+                                [(annee,) + ligne for ligne in matieres])
+                cur.execute("DELETE FROM stats_annuelles_a_recalculer WHERE annee=?", (annee,))
+                self.conn.commit()
+                recalculees.append(annee)
+            except sqlite3.Error as e:
+                self.conn.rollback()
+                print(f"Erreur lors du calcul des statistiques annuelles de {annee}: {e}")
+        return recalculees
+
+    def get_tendances(self, niveau=None):
+        """Évolution par année (niveau donné ou tous les niveaux), à partir des agrégats annuels"""
+        self.rafraichir_stats_annuelles()
+        q = """SELECT annee, SUM(effectif), SUM(admis), SUM(redoublant), SUM(exclus), SUM(sans_notes),
+                      SUM(somme_moyennes), GROUP_CONCAT(histogramme, ';')
+               FROM stats_annuelles"""
+        params = []
+        if niveau:
+            q += " WHERE niveau=?"
+            params.append(niveau)
+        q += " GROUP BY annee ORDER BY annee"
+        cur = self.conn.cursor()
+        cur.execute(q, params)
+        tendances = []
+        for annee, effectif, admis, redoublant, exclus, sans_notes, somme, histogrammes in cur.fetchall():
+            avec_moyenne = effectif - sans_notes
+            tendances.append({
+                'annee': annee,
+                'effectif': effectif,
+                'admis': admis,
+                'redoublant': redoublant,
+                'exclus': exclus,
+                'sans_notes': sans_notes,
+                'moyenne': somme / avec_moyenne if avec_moyenne else None,
+                'taux_admission': 100 * admis / avec_moyenne if avec_moyenne else None,
+                'histogramme': np.sum([json.loads(h) for h in histogrammes.split(';')], axis=0).tolist()
+            })
+        return tendances
+
+    def get_tendances_matieres(self, niveau=None):
+        """{codeMat: [(annee, effectif, moyenne, taux_reussite), ...]} à partir des agrégats annuels"""
+        self.rafraichir_stats_annuelles()
+        q = """SELECT codeMat, annee, SUM(effectif), SUM(somme) / SUM(effectif), 100.0 * SUM(reussis) / SUM(effectif)
+               FROM stats_annuelles_matieres"""
+        params = []
+        if niveau:
+            q += " WHERE niveau=?"
+            params.append(niveau)
+        q += " GROUP BY codeMat, annee HAVING SUM(effectif) > 0 ORDER BY codeMat, annee"
+        cur = self.conn.cursor()
+        cur.execute(q, params)
+        return {code: [r[1:] for r in rows] for code, rows in groupby(cur.fetchall(), key=lambda r: r[0])}
+
+    def _create_archives(self):
+        """Registre des années déplacées par archiver_annee dans un fichier par année.
+
+        Une année archivée n'existe plus que dans son archive, lue en lecture seule:
+        les triggers refusent d'y ajouter ou d'y déplacer étudiants, inscriptions et notes.
+        """
+        cur = self.conn.cursor()
+        cur.execute("""
+        CREATE TABLE IF NOT EXISTS archives_annuelles (
+            annee INTEGER PRIMARY KEY,
+            fichier TEXT NOT NULL,
+            etudiants INTEGER NOT NULL,
+            notes INTEGER NOT NULL,
+            archive_le TEXT NOT NULL
+        )""")
+        refuser = ("SELECT RAISE(ABORT, 'Année archivée') "
+                   "WHERE EXISTS (SELECT 1 FROM archives_annuelles WHERE annee = NEW.annee)")
+        notes = "notes_compactes" if self.compact else "notes"
+        triggers = {
+            "trg_archive_etudiants_insert": "BEFORE INSERT ON etudiants",
+            "trg_archive_etudiants_update": "BEFORE UPDATE OF annee ON etudiants",
+            "trg_archive_inscriptions_insert": "BEFORE INSERT ON inscriptions",
+            "trg_archive_notes_insert": f"BEFORE INSERT ON {notes}",
+            "trg_archive_notes_update": f"BEFORE UPDATE OF annee ON {notes}",
+        }
+        for nom, evenement in triggers.items():
+            cur.execute(f"DROP TRIGGER IF EXISTS {nom}")
+            cur.execute(f"CREATE TRIGGER {nom} {evenement} BEGIN {refuser}; END")
+        self.conn.commit()
+
+    def get_annees_archivees(self):
+        """{annee: fichier de l'archive} des années archivées"""
+        return self._cached(self._archives, None, self._load_archives)
+
+    def _load_archives(self):
+        cur = self.conn.cursor()
+        cur.execute("SELECT annee, fichier FROM archives_annuelles")
+        return dict(cur.fetchall())
+
+    def _chemin_archive(self, fichier):
+        # Relatif au dossier de la base: le dossier peut être déplacé avec ses archives
+        return os.path.join(os.path.dirname(os.path.abspath(self.filename)), fichier)
+
+    def _capacite_attachements(self):
+        # Une place reste libre pour l'archive en cours de création (archiver_annee)
+        return self.conn.getlimit(sqlite3.SQLITE_LIMIT_ATTACHED) - 1
+
+    def _attacher(self, annee, fichier):
+        """Schéma de l'archive de annee, attachée en lecture seule au premier besoin.
+
+        SQLite limite le nombre de bases attachées (SQLITE_LIMIT_ATTACHED): au-delà, l'archive
+        utilisée le moins récemment est détachée. Lève sqlite3.OperationalError si l'archive
+        ne peut pas être ouverte (ArchiveInaccessible).
+        """
+        schema = self._attachees.get(annee)
+        if schema is not None:
+            self._attachees.move_to_end(annee)
+            return schema
+        schema = f"archive_{annee}"
+        if self.conn.in_transaction:
+            raise sqlite3.OperationalError(f"Archive de {annee} non attachée: une transaction est en cours.")
+        while len(self._attachees) >= self._capacite_attachements():
+            self._detacher_ancienne()
+        uri = "file:" + pathname2url(self._chemin_archive(fichier)) + "?mode=ro"
+        try:
+            self.conn.execute(f"ATTACH DATABASE ? AS {schema}", (uri,))
+            # ATTACH n'ouvre le fichier qu'à la première lecture: une archive absente doit échouer ici
+            self.conn.execute(f"SELECT 1 FROM {schema}.etudiants LIMIT 0")
+        except sqlite3.Error as e:
+            if schema in (r[1] for r in self.conn.execute("PRAGMA database_list")):
+                self.conn.execute(f"DETACH DATABASE {schema}")
+            raise ArchiveInaccessible(f"Archive de {annee} inaccessible ({fichier}): {e}") from e
+        self._attachees[annee] = schema
+        return schema
+
+    def _detacher_ancienne(self):
+        """Détache l'archive utilisée le moins récemment parmi celles qui ne servent pas aux vues de l'historique"""
+        epinglees = self._historique_attachees
+        for annee, schema in self._attachees.items():
+            if annee in epinglees:
+                continue
+            try:
+                self.conn.execute(f"DETACH DATABASE {schema}")
+            except sqlite3.Error:
+                # Lecture en cours sur cette archive: on essaie la suivante
+                continue
+            del self._attachees[annee]
+            return
+        raise sqlite3.OperationalError("Trop d'archives attachées simultanément.")
+
+    def _tables(self, annee, historique=True):
+        """Tables (etudiants, notes) où lire les données de annee.
+
+        Une année archivée est lue dans son archive; sans année et avec historique (rapports),
+        dans des vues temporaires qui réunissent la base et toutes les archives. Avec historique,
+        les étudiants de la base sont lus dans PARCOURS, avec les années qu'ils ont quittées.
+        Les écrans de travail (historique=False) ne lisent que les inscriptions en cours.
+        """
+        archives = self.get_annees_archivees()
+        if annee is None:
+            if not historique:
+                return "main.etudiants", "main.notes"
+            if not archives:
+                return self.PARCOURS, "main.notes"
+            annees = tuple(sorted(archives))
+            if annees != self._historique:
+                self._construire_historique(archives)
+                self._historique = annees
+            return "temp.historique_etudiants", "temp.historique_notes"
+        if annee not in archives:
+            return self.PARCOURS if historique else "main.etudiants", "main.notes"
+        schema = self._attacher(annee, archives[annee])
+        return f"{schema}.etudiants", f"{schema}.notes"
+
+    def _construire_historique(self, archives):
+        """(Re)crée les vues temp.historique_* sur la base et toutes les archives.
+
+        Si toutes les archives peuvent rester attachées, les vues les lisent directement;
+        sinon leurs données sont recopiées une fois dans des tables temporaires, chaque archive
+        n'étant attachée que le temps de la copie.
+        """
+        colonnes = {"etudiants": "n_inscription, nom, niveau, annee",
+                    "notes": "id, codeMat, n_inscription, annee, note"}
+        for table in colonnes:
+            self.conn.execute(f"DROP VIEW IF EXISTS temp.historique_{table}")
+            self.conn.execute(f"DROP TABLE IF EXISTS temp.historique_archives_{table}")
+        self._historique = None
+        self._historique_attachees = set()
+        annees = sorted(archives)
+        sources = [{"etudiants": self.PARCOURS, "notes": "main.notes"}]
+        if len(annees) <= self._capacite_attachements():
+            for a in annees:
+                schema = self._attacher(a, archives[a])
+                sources.append({table: f"{schema}.{table}" for table in colonnes})
+            self._historique_attachees = set(annees)
+        else:
+            for table, liste in colonnes.items():
+                self.conn.execute(f"CREATE TEMP TABLE historique_archives_{table} AS "
+                                  f"SELECT {liste} FROM main.{table} WHERE 0")
+            for a in annees:
+                schema = self._attacher(a, archives[a])
+                for table, liste in colonnes.items():
+                    self.conn.execute(f"INSERT INTO temp.historique_archives_{table} "
+                                      f"SELECT {liste} FROM {schema}.{table}")
+                # L'archive suivante ne peut être attachée (ni celle-ci détachée) qu'hors transaction
+                self.conn.commit()
+            sources.append({table: f"temp.historique_archives_{table}" for table in colonnes})
+        for table, liste in colonnes.items():
+            union = " UNION ALL ".join(f"SELECT {liste} FROM {source[table]}" for source in sources)
+            self.conn.execute(f"CREATE TEMP VIEW historique_{table} AS {union}")
+
+    @_ecriture_immediate
+    def archiver_annee(self, annee):
+        """Déplace une année close dans son fichier d'archive, à côté de la base.
+
+        Sont déplacés les étudiants de annee avec toutes leurs notes, les notes saisies pour annee,
+        et les inscriptions à annee des étudiants promus depuis (ceux-ci restent dans la base).
+        Les rapports sur annee lisent ensuite l'archive, attachée en lecture seule à la demande.
+        Renvoie (étudiants, notes) déplacés.
+        """
+        if annee in self.get_annees_archivees():
+            raise ValueError(f"L'année {annee} est déjà archivée.")
+        cur = self.conn.cursor()
+        # Les notes des étudiants de annee partent avec eux: celles d'une année antérieure encore
+        # dans la base en sortiraient avec
+        cur.execute("""SELECT MIN(inscriptions.annee) FROM inscriptions
+                       JOIN etudiants ON etudiants.n_inscription = inscriptions.n_inscription
+                       WHERE etudiants.annee = ? AND inscriptions.annee < ?""", (annee, annee))
+        anterieure = cur.fetchone()[0]
+        if anterieure is not None:
+            raise ValueError(f"Des étudiants de {annee} ont été promus depuis {anterieure}: "
+                             f"archivez d'abord l'année {anterieure}.")
+        fichier = f"{os.path.splitext(os.path.basename(self.filename))[0]}_{annee}.db"
+        chemin = self._chemin_archive(fichier)
+        if os.path.exists(chemin):
+            raise ValueError(f"Le fichier d'archive {chemin} existe déjà.")
+        self._enable_foreign_keys()
+        cur.execute("ATTACH DATABASE ? AS nouvelle_archive", (chemin,))
+        try:
+            cur.execute("""CREATE TABLE nouvelle_archive.etudiants (
+                               n_inscription TEXT PRIMARY KEY,
+                               nom TEXT NOT NULL,
+                               niveau TEXT NOT NULL,
+                               annee INTEGER NOT NULL
+                           )""")
+            cur.execute("""CREATE TABLE nouvelle_archive.notes (
+                               id INTEGER PRIMARY KEY,
+                               codeMat TEXT NOT NULL,
+                               n_inscription TEXT NOT NULL,
+                               annee INTEGER NOT NULL,
+                               note REAL NOT NULL,
+                               UNIQUE(codeMat, n_inscription, annee)
+                           )""")
+            cur.execute("CREATE INDEX nouvelle_archive.idx_notes_etudiant ON notes(n_inscription, annee)")
+            cur.execute("CREATE INDEX nouvelle_archive.idx_etudiants_annee_niveau ON etudiants(annee, niveau)")
+
+            cur.execute("BEGIN IMMEDIATE")
+            cond = "annee = ? OR n_inscription IN (SELECT n_inscription FROM main.etudiants WHERE annee = ?)"
+            cur.execute("""INSERT INTO nouvelle_archive.etudiants (n_inscription, nom, niveau, annee)
+                           SELECT n_inscription, nom, niveau, annee FROM main.etudiants WHERE annee = ?
+                           UNION ALL
+                           SELECT inscriptions.n_inscription, etudiants.nom, inscriptions.niveau, inscriptions.annee
+                           FROM main.inscriptions
+                           JOIN main.etudiants ON etudiants.n_inscription = inscriptions.n_inscription
+                           WHERE inscriptions.annee = ?""", (annee, annee))
+            etudiants = cur.rowcount
+            cur.execute(f"""INSERT INTO nouvelle_archive.notes (id, codeMat, n_inscription, annee, note)
+                            SELECT id, codeMat, n_inscription, annee, note FROM main.notes WHERE {cond}""",
+                        (annee, annee))
+            notes = cur.rowcount
+            if not etudiants and not notes:
+                raise ValueError(f"Aucune donnée à archiver pour {annee}.")
+            cur.execute(f"DELETE FROM main.notes WHERE {cond}", (annee, annee))
+            cur.execute("DELETE FROM main.inscriptions WHERE annee = ?", (annee,))
+            cur.execute("DELETE FROM main.etudiants WHERE annee = ?", (annee,))
+            cur.execute("""INSERT INTO archives_annuelles (annee, fichier, etudiants, notes, archive_le)
+                           VALUES (?, ?, ?, ?, ?)""",
+                        (annee, fichier, etudiants, notes, datetime.now().strftime("%Y-%m-%d %H:%M:%S")))
+            self.conn.commit()
+        except (sqlite3.Error, ValueError) as e:
+            self.conn.rollback()
+            cur.execute("DETACH DATABASE nouvelle_archive")
+            os.remove(chemin)
+            if isinstance(e, sqlite3.Error):
+                print(f"Erreur lors de l'archivage de {annee}: {e}")
+            raise e
+        cur.execute("DETACH DATABASE nouvelle_archive")
+        self._touch()
+        self._rankings.clear()
+        return etudiants, notes
+
     def _enable_foreign_keys(self):
         self.conn.execute("PRAGMA foreign_keys = ON")
 
+    def _touch(self):
+        self._data_version += 1
+
+    def activer_profilage(self, seuil=0.1):
+        """Mesure les méthodes et consigne les requêtes de plus de seuil secondes (ProfileurRequetes).
+
+        Après desactiver_profilage, reprend les mesures avec le même profileur et ses statistiques.
+        """
+        if self.profileur is None:
+            self.profileur = ProfileurRequetes(self, seuil)
+        self.profileur.installer()
+        return self.profileur
+
+    def desactiver_profilage(self):
+        """Suspend les mesures; le profileur et ses statistiques restent disponibles pour l'export"""
+        if self.profileur is not None:
+            self.profileur.retirer()
+
+    def _chemin_journal(self):
+        return self.filename + ".ecritures"
+
+    @staticmethod
+    def ecritures_a_reprendre(filename):
+        """Nombre d'écritures du journal du mode mémoire de filename pas encore recopiées (session interrompue)"""
+        try:
+            with open(filename + ".ecritures", encoding="utf-8") as journal:
+                # Première ligne: en-tête de la dernière recopie
+                return max(0, sum(1 for _ in journal) - 1)
+        except OSError:
+            return 0
+
+    def _empreinte_fichier(self):
+        # Date de modification et taille: changées par toute écriture dans le fichier, de n'importe quel programme
+        try:
+            etat = os.stat(self.filename)
+        except OSError:
+            return None
+        return [etat.st_mtime_ns, etat.st_size]
+
+    def _consigner(self, methode, args, kwargs):
+        self._journal.write(json.dumps({"methode": methode, "args": args, "kwargs": kwargs},
+                                       default=_encoder_journal) + "\n")
+        self._journal.flush()
+        os.fsync(self._journal.fileno())
+        self._ecritures_en_attente += 1
+
+    def ecritures_en_attente(self):
+        """Mode mémoire: nombre d'écritures consignées pas encore recopiées sur disque"""
+        return self._ecritures_en_attente
+
+    def ecrire_sur_disque(self):
+        """Mode mémoire: recopie la base en RAM dans son fichier puis repart d'un journal vide.
+
+        Chaque recopie incrémente une génération, enregistrée dans la base et en tête du journal avec
+        l'empreinte du fichier recopié: après un arrêt brutal, le journal n'est rejoué que s'il part
+        de la génération du fichier, jamais sur une recopie qui contient déjà ses écritures, et sur
+        un fichier que rien n'a modifié depuis (voir _rejouer_journal).
+
+        Lève ModificationConcurrente, sans rien écrire, si une autre connexion a modifié le fichier
+        depuis le chargement: la recopie effacerait ses écritures. Celles de la session restent
+        alors dans le journal, mis de côté sans être appliqué à la prochaine ouverture.
+        """
+        if self._disque.execute("PRAGMA data_version").fetchone()[0] != self._version_disque:
+            raise ModificationConcurrente(f"{self.filename} a été modifié par un autre programme pendant la session.")
+        cur = self.conn.cursor()
+        cur.execute("SELECT valeur FROM parametres WHERE cle='generation_ecritures'")
+        row = cur.fetchone()
+        generation = (int(row[0]) if row else 0) + 1
+        cur.execute("INSERT OR REPLACE INTO parametres (cle, valeur) VALUES ('generation_ecritures', ?)",
+                    (str(generation),))
+        self.conn.commit()
+        # Les écritures de cette connexion ne changent pas son data_version
+        self.conn.backup(self._disque)
+        journal = self._journal or open(self._chemin_journal(), "w", encoding="utf-8")
+        journal.seek(0)
+        journal.truncate()
+        journal.write(json.dumps({"generation": generation, "fichier": self._empreinte_fichier()}) + "\n")
+        journal.flush()
+        os.fsync(journal.fileno())
+        if journal is not self._journal:
+            journal.close()
+        self._ecritures_en_attente = 0
+
+    def _rejouer_journal(self, empreinte):
+        """Rejoue les écritures d'une session en mode mémoire interrompue avant leur recopie sur disque.
+
+        Le journal n'est rejoué que si le fichier n'a pas changé depuis sa dernière recopie (empreinte,
+        relevée à l'ouverture, égale à celle de l'en-tête): rejouées sur des modifications plus récentes,
+        ses écritures par id (update_note, delete_note) les écraseraient. Sinon, ou si des écritures
+        échouent (ignorées), le journal est mis de côté à côté de la base. Une session normale rejoue
+        aussi le journal, que ses propres écritures rendraient inutilisable. Le bilan est dans
+        reprise_journal (None sans écriture à reprendre); en mode mémoire, la base est ensuite recopiée.
+        """
+        chemin = self._chemin_journal()
+        self.reprise_journal = None
+        entete = None
+        entrees = []
+        if os.path.exists(chemin):
+            with open(chemin, encoding="utf-8") as journal:
+                for i, ligne in enumerate(journal):
+                    try:
+                        entree = json.loads(ligne, object_hook=_decoder_journal)
+                    except ValueError:
+                        # Dernière ligne tronquée par l'arrêt
+                        print(f"Journal des écritures: ligne {i + 1} illisible ignorée")
+                        break
+                    if i == 0:
+                        entete = entree
+                    else:
+                        entrees.append((i + 1, entree))
+        cur = self.conn.cursor()
+        cur.execute("SELECT valeur FROM parametres WHERE cle='generation_ecritures'")
+        row = cur.fetchone()
+        # Génération dépassée: la recopie suivante, qui contient déjà ces écritures, a eu lieu avant l'arrêt
+        if entrees and entete.get("generation", 0) == (int(row[0]) if row else 0):
+            rejouees = 0
+            echecs = []
+            if entete.get("fichier") != empreinte:
+                print(f"Journal des écritures non rejoué: {self.filename} a été modifié depuis la dernière recopie")
+            else:
+                for numero, entree in entrees:
+                    try:
+                        getattr(self, entree["methode"])(*entree["args"], **entree["kwargs"])
+                        rejouees += 1
+                    except Exception as e:
+                        if self.conn.in_transaction:
+                            self.conn.rollback()
+                        echecs.append(f"ligne {numero}, {entree.get('methode')}: {e}")
+                        print(f"Journal des écritures: ligne {numero} ignorée ({entree.get('methode')}: {e})")
+                print(f"Journal des écritures: {rejouees} écritures rejouées")
+            mis_de_cote = None
+            if rejouees < len(entrees):
+                mis_de_cote = f"{chemin}.{datetime.now():%Y%m%d-%H%M%S-%f}"
+                os.replace(chemin, mis_de_cote)
+                print(f"Journal des écritures mis de côté: {mis_de_cote}")
+            self.reprise_journal = {"ecritures": len(entrees), "rejouees": rejouees, "echecs": echecs,
+                                    "mis_de_cote": mis_de_cote}
+        if self.en_memoire:
+            self.ecrire_sur_disque()
+        elif self.reprise_journal is not None and os.path.exists(chemin):
+            # Écritures appliquées au fichier: le journal ne doit pas être repris une seconde fois
+            os.remove(chemin)
+
+    def get_data_version(self):
+        """Version des données: modifications locales + commits d'autres connexions"""
+        cur = self.conn.cursor()
+        cur.execute("PRAGMA data_version")
+        return self._data_version, cur.fetchone()[0]
+
+    @_journalise
     def add_etudiant(self, n_insc, nom, niveau, annee):
         try:
             self._enable_foreign_keys()
             self.conn.execute("INSERT INTO etudiants (n_inscription, nom, niveau, annee) VALUES (?, ?, ?, ?)",
                               (n_insc, nom, niveau, annee))
             self.conn.commit()
+            self._touch()
             return True
         except sqlite3.IntegrityError:
+            self.conn.rollback()
             return False
 
+    @_journalise
     def update_etudiant(self, n_insc, nom, niveau, annee):
         self._enable_foreign_keys()
+        self._drop_from_ranking(n_insc)
         cur = self.conn.cursor()
+        # Ramené dans une année qu'il avait quittée: l'année en cours remplace l'inscription gardée
+        cur.execute("DELETE FROM inscriptions WHERE n_inscription=? AND annee=?", (n_insc, annee))
+        if cur.rowcount:
+            self._rankings.clear()
         cur.execute("UPDATE etudiants SET nom=?, niveau=?, annee=? WHERE n_inscription=?",
                     (nom, niveau, annee, n_insc))
         self.conn.commit()
+        self._touch()
+        self._update_ranking(n_insc)
         return cur.rowcount
 
+    @_journalise
     def delete_etudiant(self, n_insc):
         self._enable_foreign_keys()
         cur = self.conn.cursor()
@@ -309,8 +1138,12 @@ class Database:
             if notes_count > 0:
                 cur.execute("DELETE FROM notes WHERE n_inscription=?", (n_insc,))
             
+            # Ses inscriptions des années quittées disparaissent avec lui: il sort de tous les classements
+            for index in self._rankings.values():
+                index.update(n_insc, None)
             cur.execute("DELETE FROM etudiants WHERE n_inscription=?", (n_insc,))
             self.conn.commit()
+            self._touch()
             
             return cur.rowcount, notes_count
         except sqlite3.Error as e:
@@ -320,8 +1153,9 @@ class Database:
 
     def get_etudiants(self, annee=None, niveau=None):
         self._enable_foreign_keys()
+        etudiants, _ = self._tables(annee, historique=False)
         cur = self.conn.cursor()
-        q = "SELECT n_inscription, nom, niveau, annee FROM etudiants"
+        q = f"SELECT n_inscription, nom, niveau, annee FROM {etudiants} AS etudiants"
         params = []
         cond = []
         if annee is not None:
@@ -336,6 +1170,33 @@ class Database:
         cur.execute(q, params)
         return cur.fetchall()
 
+    def get_etudiant(self, n_insc):
+        self._enable_foreign_keys()
+        cur = self.conn.cursor()
+        cur.execute("SELECT n_inscription, nom, niveau, annee FROM etudiants WHERE n_inscription=?", (n_insc,))
+        return cur.fetchone()
+
+    def rechercher_etudiants(self, prefixe, limite=50):
+        """Étudiants dont le n° d'inscription ou le nom commence par prefixe (casse ASCII ignorée pour le nom).
+
+        Deux recherches par plage, sur la clé primaire et sur idx_etudiants_nom, chacune bornée à limite:
+        seules les lignes affichées sont lues, quelle que soit la taille de la table.
+        """
+        self._enable_foreign_keys()
+        # Borne haute de la plage: le plus grand caractère Unicode, après tout ce qui commence par prefixe
+        fin = prefixe + "\U0010ffff"
+        cur = self.conn.cursor()
+        cur.execute("""SELECT * FROM (SELECT n_inscription, nom, niveau, annee FROM etudiants
+                                      WHERE n_inscription >= ? AND n_inscription < ?
+                                      ORDER BY n_inscription LIMIT ?)
+                       UNION
+                       SELECT * FROM (SELECT n_inscription, nom, niveau, annee FROM etudiants
+                                      WHERE nom >= ? COLLATE NOCASE AND nom < ? COLLATE NOCASE
+                                      ORDER BY nom COLLATE NOCASE LIMIT ?)
+                       ORDER BY 1 LIMIT ?""",
+                    (prefixe, fin, limite, prefixe, fin, limite, limite))
+        return cur.fetchall()
+
     def find_etudiant(self, n_insc_or_nom):
         self._enable_foreign_keys()
         cur = self.conn.cursor()
@@ -344,24 +1205,30 @@ class Database:
                     (n_insc_or_nom, f"%{n_insc_or_nom}%"))
         return cur.fetchall()
 
+    @_journalise
     def add_matiere(self, code, libelle, coef):
         try:
             self._enable_foreign_keys()
             self.conn.execute("INSERT INTO matieres (codeMat, libelle, coef) VALUES (?, ?, ?)",
                               (code, libelle, coef))
             self.conn.commit()
+            self._touch()
             return True
         except sqlite3.IntegrityError:
             return False
 
+    @_journalise
     def update_matiere(self, code, libelle, coef):
         self._enable_foreign_keys()
         cur = self.conn.cursor()
         cur.execute("UPDATE matieres SET libelle=?, coef=? WHERE codeMat=?",
                     (libelle, coef, code))
         self.conn.commit()
+        self._touch()
+        self._rankings.clear()
         return cur.rowcount
 
+    @_journalise
     def delete_matiere(self, code):
         self._enable_foreign_keys()
         cur = self.conn.cursor()
@@ -378,6 +1245,8 @@ class Database:
             
             cur.execute("DELETE FROM matieres WHERE codeMat=?", (code,))
             self.conn.commit()
+            self._touch()
+            self._rankings.clear()
             
             return cur.rowcount, notes_count
         except sqlite3.Error as e:
@@ -417,6 +1286,7 @@ class Database:
         cur.execute("SELECT codeMat, libelle, coef FROM matieres WHERE codeMat=?", (code,))
         return cur.fetchone()
 
+    @_journalise
     def add_note(self, codeMat, n_inscription, annee, note):
         self._enable_foreign_keys()
         cur = self.conn.cursor()
@@ -430,9 +1300,16 @@ class Database:
     
         cur.execute("INSERT INTO notes (codeMat, n_inscription, annee, note) VALUES (?, ?, ?, ?)",
                 (codeMat, n_inscription, annee, note))
+        # Relu plutôt que lastrowid: au format compact, l'insertion passe par un trigger de la vue notes
+        cur.execute("SELECT id FROM notes WHERE codeMat=? AND n_inscription=? AND annee=?",
+                    (codeMat, n_inscription, annee))
+        note_id = cur.fetchone()[0]
         self.conn.commit()
-        return cur.lastrowid
+        self._touch()
+        self._update_ranking(n_inscription, annee)
+        return note_id
 
+    @_journalise
     def update_note(self, note_id, codeMat, n_inscription, annee, note):
         self._enable_foreign_keys()
         cur = self.conn.cursor()
@@ -443,26 +1320,129 @@ class Database:
         if existing_note:
             return None  
     
-        cur.execute("UPDATE notes SET codeMat=?, n_inscription=?, annee=?, note=? WHERE id=?",
-                    (codeMat, n_inscription, annee, note, note_id))
+        cle, params = self._cle_note(note_id)
+        cur.execute(f"SELECT n_inscription, annee FROM notes WHERE {cle}", params)
+        old_note = cur.fetchone()
+        cur.execute(f"UPDATE notes SET codeMat=?, n_inscription=?, annee=?, note=? WHERE {cle}",
+                    (codeMat, n_inscription, annee, note) + params)
         self.conn.commit()
-        return cur.rowcount
-
+        self._touch()
+        if old_note and tuple(old_note) != (n_inscription, annee):
+            self._update_ranking(old_note[0], old_note[1])
+        self._update_ranking(n_inscription, annee)
+        # Pas de rowcount fiable au format compact (écriture par trigger de la vue): l'id est unique
+        return int(old_note is not None)
+
+    @_journalise
     def delete_note(self, note_id):
         self._enable_foreign_keys()
         cur = self.conn.cursor()
-        cur.execute("DELETE FROM notes WHERE id=?", (note_id,))
+        cle, params = self._cle_note(note_id)
+        cur.execute(f"SELECT n_inscription, annee FROM notes WHERE {cle}", params)
+        old_note = cur.fetchone()
+        cur.execute(f"DELETE FROM notes WHERE {cle}", params)
         self.conn.commit()
-        return cur.rowcount
+        self._touch()
+        if old_note:
+            self._update_ranking(old_note[0], old_note[1])
+        return int(old_note is not None)
+
+    def get_saisie(self, annee, niveau, codeMat):
+        """Étudiants de (annee, niveau) avec leur note de codeMat pour annee: (n_inscription, nom, note ou None)"""
+        self._enable_foreign_keys()
+        etudiants, notes = self._tables(annee, historique=False)
+        q = f"""SELECT etudiants.n_inscription, etudiants.nom, notes.note
+               FROM {etudiants} AS etudiants
+               LEFT JOIN {notes} AS notes ON notes.n_inscription = etudiants.n_inscription
+                              AND notes.codeMat = ? AND notes.annee = ?
+               WHERE etudiants.annee = ?"""
+        params = [codeMat, annee, annee]
+        if niveau:
+            q += " AND etudiants.niveau = ?"
+            params.append(niveau)
+        q += " ORDER BY etudiants.n_inscription"
+        cur = self.conn.cursor()
+        cur.execute(q, params)
+        return cur.fetchall()
+
+    @_journalise
+    def enregistrer_saisie(self, codeMat, annee, modifications):
+        """Écrit en une transaction les notes saisies dans la grille.
+
+        modifications: (n_inscription, note lue au chargement, nouvelle note) — None pour absence de note;
+        une nouvelle note None supprime la note. Une ligne dont la note en base n'est plus celle lue au
+        chargement (modifiée entre-temps par un autre utilisateur) n'est pas écrite.
+        Renvoie (nombre de notes écrites, conflits [(n_inscription, note en base)]).
+        """
+        self._enable_foreign_keys()
+        cur = self.conn.cursor()
+        try:
+            cur.execute("BEGIN IMMEDIATE")
+            cur.execute("""CREATE TEMP TABLE IF NOT EXISTS saisie (
+                               n_inscription TEXT PRIMARY KEY,
+                               ancienne REAL,
+                               nouvelle REAL
+                           )""")
+            cur.execute("DELETE FROM temp.saisie")
+            cur.executemany("INSERT INTO temp.saisie (n_inscription, ancienne, nouvelle) VALUES (?, ?, ?)",
+                            modifications)
+
+            cur.execute("""SELECT saisie.n_inscription, notes.note
+                           FROM temp.saisie
+                           LEFT JOIN notes ON notes.n_inscription = saisie.n_inscription
+                                          AND notes.codeMat = ? AND notes.annee = ?
+                           WHERE notes.note IS NOT saisie.ancienne""", (codeMat, annee))
+            conflits = cur.fetchall()
+            cur.executemany("DELETE FROM temp.saisie WHERE n_inscription = ?", [(c[0],) for c in conflits])
+
+            if self.compact:
+                # Pas d'upsert sur une vue: écriture directe dans notes_compactes
+                cur.execute("""INSERT INTO notes_compactes (annee, etudiant_id, matiere_id, centiemes)
+                               SELECT ?, etudiants.id, (SELECT id FROM matieres WHERE codeMat = ?),
+                                      CAST(round(saisie.nouvelle * 100) AS INTEGER)
+                               FROM temp.saisie JOIN etudiants ON etudiants.n_inscription = saisie.n_inscription
+                               WHERE saisie.nouvelle IS NOT NULL
+                               ON CONFLICT(annee, etudiant_id, matiere_id) DO UPDATE SET centiemes = excluded.centiemes""",
+                            (annee, codeMat))
+            else:
+                cur.execute("""INSERT INTO notes (codeMat, n_inscription, annee, note)
+                               SELECT ?, n_inscription, ?, nouvelle FROM temp.saisie WHERE nouvelle IS NOT NULL
+                               ON CONFLICT(codeMat, n_inscription, annee) DO UPDATE SET note = excluded.note""",
+                            (codeMat, annee))
+            ecrites = cur.rowcount
+            if self.compact:
+                cur.execute("""DELETE FROM notes_compactes
+                               WHERE annee = ? AND matiere_id = (SELECT id FROM matieres WHERE codeMat = ?)
+                                 AND etudiant_id IN (SELECT etudiants.id FROM temp.saisie
+                                                     JOIN etudiants ON etudiants.n_inscription = saisie.n_inscription
+                                                     WHERE saisie.nouvelle IS NULL)""",
+                            (annee, codeMat))
+            else:
+                cur.execute("""DELETE FROM notes
+                               WHERE codeMat = ? AND annee = ?
+                                 AND n_inscription IN (SELECT n_inscription FROM temp.saisie WHERE nouvelle IS NULL)""",
+                            (codeMat, annee))
+            ecrites += cur.rowcount
+            cur.execute("DELETE FROM temp.saisie")
+            self.conn.commit()
+        except sqlite3.Error as e:
+            self.conn.rollback()
+            print(f"Erreur SQLite: {e}")
+            raise e
+        self._touch()
+        # Beaucoup de moyennes changent d'un coup: les index de classement seront reconstruits à la demande
+        self._rankings.clear()
+        return ecrites, conflits
 
     def get_notes(self, n_inscription=None, annee=None, niveau=None):
         self._enable_foreign_keys()
+        etudiants, notes = self._tables(annee or None, historique=False)
         cur = self.conn.cursor()
-        q = """SELECT notes.id, notes.codeMat, matieres.libelle, matieres.coef,
+        q = f"""SELECT notes.id, notes.codeMat, matieres.libelle, matieres.coef,
                       notes.n_inscription, etudiants.nom, etudiants.niveau, notes.annee, notes.note
-               FROM notes
+               FROM {notes} AS notes
                LEFT JOIN matieres ON notes.codeMat = matieres.codeMat
-               LEFT JOIN etudiants ON notes.n_inscription = etudiants.n_inscription"""
+               LEFT JOIN {etudiants} AS etudiants ON notes.n_inscription = etudiants.n_inscription"""
         params = []
         cond = []
         if n_inscription:
@@ -494,9 +1474,10 @@ class Database:
 
     def get_notes_for_student(self, n_inscription, annee):
         self._enable_foreign_keys()
+        _, notes = self._tables(annee, historique=False)
         cur = self.conn.cursor()
-        cur.execute("""SELECT matieres.codeMat, matieres.libelle, matieres.coef, notes.note
-                       FROM notes
+        cur.execute(f"""SELECT matieres.codeMat, matieres.libelle, matieres.coef, notes.note
+                       FROM {notes} AS notes
                        JOIN matieres ON notes.codeMat = matieres.codeMat
                        WHERE notes.n_inscription = ? AND notes.annee = ?""",
                     (n_inscription, annee))
@@ -504,12 +1485,21 @@ class Database:
 
     def calculate_average_for_student(self, n_inscription, annee):
         self._enable_foreign_keys()
+        _, notes = self._tables(annee, historique=False)
         cur = self.conn.cursor()
-        cur.execute("""SELECT matieres.coef, notes.note
-                       FROM notes
-                       JOIN matieres ON notes.codeMat = matieres.codeMat
-                       WHERE notes.n_inscription = ? AND notes.annee = ?""",
-                    (n_inscription, annee))
+        if self.compact and notes == "main.notes":
+            cur.execute("""SELECT matieres.coef, notes_compactes.centiemes / 100.0
+                           FROM notes_compactes
+                           JOIN matieres ON matieres.id = notes_compactes.matiere_id
+                           WHERE notes_compactes.annee = ?
+                             AND notes_compactes.etudiant_id = (SELECT id FROM etudiants WHERE n_inscription = ?)""",
+                        (annee, n_inscription))
+        else:
+            cur.execute(f"""SELECT matieres.coef, notes.note
+                           FROM {notes} AS notes
+                           JOIN matieres ON notes.codeMat = matieres.codeMat
+                           WHERE notes.n_inscription = ? AND notes.annee = ?""",
+                        (n_inscription, annee))
         rows = cur.fetchall()
         if not rows:
             return None
@@ -520,68 +1510,1277 @@ class Database:
         moyenne = weighted_sum / total_coef
         return round(moyenne, 2), weighted_sum, total_coef
 
+    @staticmethod
+    def average_from_notes(notes):
+        """Même calcul que calculate_average_for_student, sur des lignes (code, libelle, coef, note)"""
+        if not notes:
+            return None
+        total_coef = sum(r[2] for r in notes)
+        if total_coef == 0:
+            return None
+        weighted_sum = sum(r[2] * r[3] for r in notes)
+        moyenne = weighted_sum / total_coef
+        return round(moyenne, 2), weighted_sum, total_coef
+
+    def get_notes_for_students(self, n_inscriptions=None, annee=None, niveau=None):
+        """Parcourt en une seule requête les notes de plusieurs étudiants.
+
+        Sans n_inscriptions, les étudiants sont filtrés comme get_etudiants(annee, niveau), avec ceux
+        promus depuis annee. Les notes sont celles de `annee`, ou de l'année de l'étudiant si annee est None;
+        l'étudiant porte alors le niveau et l'année de son inscription à annee, s'il en a une.
+        Produit (etudiant, notes, moyenne_data) pour chaque étudiant, dans l'ordre des n° d'inscription.
+        """
+        self._enable_foreign_keys()
+        params = [annee]
+        if n_inscriptions is None:
+            etudiants, notes = self._tables(annee, historique=annee is not None)
+        else:
+            etudiants, notes = self._tables(annee, historique=False)
+            if annee is not None and etudiants == "main.etudiants":
+                etudiants = self.INSCRITS
+                params.insert(0, annee)
+        q = f"""SELECT etudiants.n_inscription, etudiants.nom, etudiants.niveau, etudiants.annee,
+                      matieres.codeMat, matieres.libelle, matieres.coef, notes.note
+               FROM {etudiants} AS etudiants
+               LEFT JOIN {notes} AS notes ON notes.n_inscription = etudiants.n_inscription
+                              AND notes.annee = COALESCE(?, etudiants.annee)
+               LEFT JOIN matieres ON notes.codeMat = matieres.codeMat"""
+        cond = []
+        if n_inscriptions is not None:
+            cond.append("etudiants.n_inscription IN (SELECT value FROM json_each(?))")
+            params.append(json.dumps(list(n_inscriptions)))
+        else:
+            if annee is not None:
+                cond.append("etudiants.annee=?")
+                params.append(annee)
+            if niveau is not None and niveau != "":
+                cond.append("etudiants.niveau=?")
+                params.append(niveau)
+        if cond:
+            q += " WHERE " + " AND ".join(cond)
+        q += " ORDER BY etudiants.n_inscription, matieres.codeMat"
+        cur = self.conn.cursor()
+        cur.execute(q, params)
+        for etudiant, rows in groupby(cur, key=lambda r: r[:4]):
+            notes = [r[4:] for r in rows if r[4] is not None]
+            yield etudiant, notes, self.average_from_notes(notes)
+
     def get_all_students_with_average(self, annee=None, niveau=None):
         self._enable_foreign_keys()
-        studs = self.get_etudiants(annee=annee, niveau=niveau)
         results = []
-        for n_insc, nom, niv, annee_row in studs:
-            calc = self.calculate_average_for_student(n_insc, annee_row)
+        for etudiant, notes, calc in self.get_notes_for_students(annee=annee, niveau=niveau):
             moyenne = calc[0] if calc else None
-            results.append((n_insc, nom, niv, annee_row, moyenne))
+            results.append(etudiant + (moyenne,))
         return results
 
     def get_statistics(self, annee=None, niveau=None):
+        return self.get_grade_matrix(annee=annee, niveau=niveau).statistiques(self.get_regles())
+
+    def _classement_query(self, annee=None, niveau=None):
+        etudiants, notes = self._tables(annee)
+        q = f"""WITH moyennes AS (
+                   SELECT etudiants.n_inscription, etudiants.nom, etudiants.niveau, etudiants.annee,
+                          arrondi(SUM(matieres.coef * notes.note) / SUM(matieres.coef), 2) AS moyenne
+                   FROM {etudiants} AS etudiants
+                   JOIN {notes} AS notes ON notes.n_inscription = etudiants.n_inscription
+                             AND notes.annee = etudiants.annee
+                   JOIN matieres ON notes.codeMat = matieres.codeMat"""
+        params = []
+        cond = []
+        if annee is not None:
+            cond.append("etudiants.annee=?")
+            params.append(annee)
+        if niveau is not None and niveau != "":
+            cond.append("etudiants.niveau=?")
+            params.append(niveau)
+        if cond:
+            q += " WHERE " + " AND ".join(cond)
+        q += """
+                   GROUP BY etudiants.n_inscription, etudiants.annee
+                   HAVING SUM(matieres.coef) > 0
+               ), classement AS (
+                   SELECT *, RANK() OVER w AS rang, DENSE_RANK() OVER w AS rang_dense,
+                          COUNT(*) OVER (PARTITION BY niveau) AS effectif
+                   FROM moyennes
+                   WINDOW w AS (PARTITION BY niveau ORDER BY moyenne DESC)
+               )
+               SELECT rang, n_inscription, nom, niveau, annee, moyenne, rang_dense, effectif
+               FROM classement"""
+        return q, params
+
+    def get_classement(self, annee=None, niveau=None, top_k=None):
+        """Classement de tous les niveaux en une requête, rangs ex aequo compris.
+
+        Lignes (rang, n_inscription, nom, niveau, annee, moyenne, rang_dense, effectif),
+        triées par niveau puis par rang. top_k limite chaque niveau aux k premiers rangs.
+        """
+        self._enable_foreign_keys()
+        q, params = self._classement_query(annee, niveau)
+        if top_k is not None:
+            q += " WHERE rang <= ?"
+            params.append(top_k)
+        q += " ORDER BY niveau, rang, n_inscription"
+        cur = self.conn.cursor()
+        cur.execute(q, params)
+        return cur.fetchall()
+
+    def get_rang_etudiant(self, n_inscription):
+        """Rang d'un étudiant dans son niveau et son année, sans remonter le classement complet"""
+        self._enable_foreign_keys()
+        cur = self.conn.cursor()
+        cur.execute("SELECT niveau, annee FROM etudiants WHERE n_inscription=?", (n_inscription,))
+        etudiant = cur.fetchone()
+        if etudiant is None:
+            return None
+        q, params = self._classement_query(annee=etudiant[1], niveau=etudiant[0])
+        cur.execute(q + " WHERE n_inscription = ?", params + [n_inscription])
+        return cur.fetchone()
+
+    def get_ranking_index(self, annee, niveau):
+        """Index de classement en mémoire de (annee, niveau), construit au premier appel"""
+        external_version = self.get_data_version()[1]
+        if external_version != self._rankings_version:
+            # Une autre connexion a écrit dans la base: les index ne sont plus fiables
+            self._rankings.clear()
+            self._rankings_version = external_version
+        index = self._rankings.get((annee, niveau))
+        self._compteurs_caches.setdefault(id(self._rankings), [0, 0])[index is None] += 1
+        if index is None:
+            rows = self.get_classement(annee=annee, niveau=niveau)
+            index = self._rankings[(annee, niveau)] = RankingIndex((r[1], r[5]) for r in rows)
+        return index
+
+    def _ranking_for_student(self, n_inscription, annee=None):
+        # Sans annee, l'année en cours de l'étudiant; sinon son inscription à annee, en cours ou quittée
+        if not self._rankings:
+            return None, None
+        cur = self.conn.cursor()
+        if annee is None:
+            cur.execute("SELECT niveau, annee FROM etudiants WHERE n_inscription=?", (n_inscription,))
+        else:
+            cur.execute(f"SELECT niveau, annee FROM {self.PARCOURS} WHERE n_inscription=? AND annee=?",
+                        (n_inscription, annee))
+        etudiant = cur.fetchone()
+        if etudiant is None:
+            return None, None
+        return self._rankings.get((etudiant[1], etudiant[0])), etudiant[1]
+
+    def _drop_from_ranking(self, n_inscription):
+        index, annee = self._ranking_for_student(n_inscription)
+        if index is not None:
+            index.update(n_inscription, None)
+
+    def _update_ranking(self, n_inscription, annee=None):
+        index, annee = self._ranking_for_student(n_inscription, annee)
+        if index is not None:
+            calc = self.calculate_average_for_student(n_inscription, annee)
+            index.update(n_inscription, calc[0] if calc else None)
+
+    def situer_etudiant(self, n_inscription, voisins=2):
+        """(rang, effectif, moyenne, voisins) d'un étudiant dans sa promotion, via l'index en mémoire"""
+        cur = self.conn.cursor()
+        cur.execute("SELECT niveau, annee FROM etudiants WHERE n_inscription=?", (n_inscription,))
+        etudiant = cur.fetchone()
+        if etudiant is None:
+            return None
+        index = self.get_ranking_index(etudiant[1], etudiant[0])
+        rang = index.rank(n_inscription)
+        if rang is None:
+            return None
+        return rang, len(index), index.moyenne(n_inscription), index.neighbours(n_inscription, voisins)
+
+    def verify_ranking_index(self, annee, niveau):
+        """Compare l'index en mémoire à un recalcul complet; renvoie les écarts (liste vide si cohérent)"""
+        index = self.get_ranking_index(annee, niveau)
+        expected = [(r[0], r[1], r[5]) for r in self.get_classement(annee=annee, niveau=niveau)]
+        actual = index.rows()
+        return sorted(set(expected) ^ set(actual))
+
+    def _cached(self, cache, key, build):
+        # Entrées (version, valeur): tout le cache est périmé dès que la version des données change
+        version = self.get_data_version()
+        cached = cache.get(key)
+        compteurs = self._compteurs_caches.setdefault(id(cache), [0, 0])
+        if cached is not None and cached[0] == version:
+            compteurs[0] += 1
+            return cached[1]
+        compteurs[1] += 1
+        if any(v != version for v, _ in cache.values()):
+            cache.clear()
+        value = build()
+        cache[key] = (version, value)
+        return value
+
+    def statistiques_caches(self):
+        """{cache: (succès, échecs)} des caches de Database depuis l'ouverture"""
+        caches = {"matrices": self._matrices, "statistiques_matieres": self._statistiques_matieres,
+                  "distributions": self._distributions, "classements": self._rankings,
+                  "regles": self._regles, "archives": self._archives}
+        return {nom: tuple(self._compteurs_caches.get(id(cache), (0, 0))) for nom, cache in caches.items()}
+
+    def statistiques_stockage(self):
+        """Taille du fichier, pages de la base et réglages du cache de pages SQLite de la connexion"""
+        cur = self.conn.cursor()
+        valeurs = {nom: cur.execute(f"PRAGMA {nom}").fetchone()[0]
+                   for nom in ("page_size", "page_count", "freelist_count", "cache_size", "mmap_size",
+                               "journal_mode", "auto_vacuum")}
+        valeurs["taille_fichier"] = os.path.getsize(self.filename) if os.path.exists(self.filename) else 0
+        return valeurs
+
+    def get_grade_matrix(self, annee=None, niveau=None):
+        """Matrice étudiants × matières de (annee, niveau), chargée une fois par version des données"""
+        niveau = niveau or None
+        return self._cached(self._matrices, (annee, niveau), lambda: self._load_grade_matrix(annee, niveau))
+
+    def _load_grade_matrix(self, annee, niveau):
+        self._enable_foreign_keys()
+        table_etudiants, table_notes = self._tables(annee)
+        params = []
+        cond = []
+        if annee is not None:
+            cond.append("etudiants.annee=?")
+            params.append(annee)
+        if niveau is not None:
+            cond.append("etudiants.niveau=?")
+            params.append(niveau)
+        where = " WHERE " + " AND ".join(cond) if cond else ""
+        if self.compact and table_notes == "main.notes":
+            return self._load_grade_matrix_compacte(where, params)
+        cur = self.conn.cursor()
+        cur.execute(f"""SELECT n_inscription, nom, niveau, annee FROM {table_etudiants} AS etudiants{where}
+                        ORDER BY n_inscription, annee""", params)
+        etudiants = cur.fetchall()
+        cur.execute("SELECT codeMat, libelle, coef FROM matieres ORDER BY codeMat")
+        matieres = cur.fetchall()
+        cur.execute(f"""SELECT notes.n_inscription, notes.annee, notes.codeMat, notes.note
+                        FROM {table_etudiants} AS etudiants
+                        JOIN {table_notes} AS notes ON notes.n_inscription = etudiants.n_inscription
+                                                   AND notes.annee = etudiants.annee{where}""", params)
+        return GradeMatrix.from_rows(etudiants, matieres, cur.fetchall())
+
+    def _load_grade_matrix_compacte(self, where, params):
+        """_load_grade_matrix au format compact: notes_compactes lue par clés entières, sans passer par la vue"""
+        cur = self.conn.cursor()
+        cur.execute(f"""SELECT id, n_inscription, nom, niveau, annee FROM {self.PARCOURS_COMPACT} AS etudiants{where}
+                        ORDER BY n_inscription, annee""", params)
+        etudiants = cur.fetchall()
+        cur.execute("SELECT id, codeMat, libelle, coef FROM matieres ORDER BY codeMat")
+        matieres = cur.fetchall()
+        cur.execute(f"""SELECT notes_compactes.etudiant_id * 10000 + notes_compactes.annee,
+                               notes_compactes.matiere_id, notes_compactes.centiemes
+                        FROM {self.PARCOURS_COMPACT} AS etudiants
+                        JOIN notes_compactes ON notes_compactes.annee = etudiants.annee
+                                            AND notes_compactes.etudiant_id = etudiants.id{where}""", params)
+        cles = np.array(cur.fetchall(), dtype=np.int64).reshape(-1, 3)
+        # Correspondances (id, annee) -> ligne (étudiant), par recherche dichotomique, et id -> colonne (matière);
+        # sans année, un étudiant promu a une ligne par année d'inscription
+        inscriptions = np.array([e[0] * 10000 + e[4] for e in etudiants], dtype=np.int64)
+        ordre = np.argsort(inscriptions)
+        lignes = ordre[np.searchsorted(inscriptions[ordre], cles[:, 0])]
+        colonnes = np.zeros(max((m[0] for m in matieres), default=0) + 1, dtype=np.int64)
+        colonnes[[m[0] for m in matieres]] = np.arange(len(matieres))
+        notes = np.full((len(etudiants), len(matieres)), np.nan)
+        notes[lignes, colonnes[cles[:, 1]]] = cles[:, 2] / 100
+        return GradeMatrix([e[1:] for e in etudiants], [m[1:] for m in matieres], notes)
+
+    def get_statistiques_matieres(self, annee=None, niveau=None):
+        """Statistiques de chaque matière (voir statistiques_par_matiere), en une seule requête d'agrégat"""
+        niveau = niveau or None
+        return self._cached(self._statistiques_matieres, (annee, niveau),
+                            lambda: self._load_statistiques_matieres(annee, niveau))
+
+    def _load_statistiques_matieres(self, annee, niveau):
         self._enable_foreign_keys()
-        students_with_avg = self.get_all_students_with_average(annee=annee, niveau=niveau)
-        
-        admis = 0
-        redoublant = 0
-        exclus = 0
-        sans_notes = 0
-        
-        for n_insc, nom, niv, annee_row, moyenne in students_with_avg:
-            if moyenne is None:
-                sans_notes += 1
-            elif moyenne >= 10:
-                admis += 1
-            elif moyenne >= 7.5:
-                redoublant += 1
+        # Une ligne par (matière, valeur de note) avec son effectif: le tableau reste petit,
+        # les notes n'ayant qu'un nombre limité de valeurs distinctes
+        etudiants, notes = self._tables(annee)
+        q = f"""SELECT matieres.codeMat, matieres.libelle, matieres.coef, n.note, COUNT(n.note)
+               FROM matieres
+               LEFT JOIN (SELECT notes.codeMat, notes.note
+                          FROM {notes} AS notes
+                          JOIN {etudiants} AS etudiants ON notes.n_inscription = etudiants.n_inscription
+                                        AND notes.annee = etudiants.annee"""
+        params = []
+        cond = []
+        if annee is not None:
+            cond.append("etudiants.annee=?")
+            params.append(annee)
+        if niveau is not None:
+            cond.append("etudiants.niveau=?")
+            params.append(niveau)
+        if cond:
+            q += " WHERE " + " AND ".join(cond)
+        q += """) n ON n.codeMat = matieres.codeMat
+               GROUP BY matieres.codeMat, n.note
+               ORDER BY matieres.codeMat, n.note"""
+        cur = self.conn.cursor()
+        cur.execute(q, params)
+        return statistiques_par_matiere(cur.fetchall())
+
+    def simuler_coefficients(self, annee, niveau, coefs, regles_simulees=None):
+        """Aperçu de l'effet de nouveaux coefficients et règles sur (annee, niveau), sans écrire dans la base"""
+        regles = self.get_regles()
+        return self.get_grade_matrix(annee=annee, niveau=niveau).simuler(coefs, regles, regles_simulees or regles)
+
+    def get_correlations(self, annee=None, niveau=None):
+        """(codes des matières, matrice de corrélation entre matières) de (annee, niveau), voir GradeMatrix.correlations"""
+        matrice = self.get_grade_matrix(annee=annee, niveau=niveau)
+        return [m[0] for m in matrice.matieres], matrice.correlations()
+
+    def get_decisions(self, annee=None, niveau=None):
+        """{n_inscription: observation} de toute une promotion, évalué en une passe"""
+        return self.get_grade_matrix(annee=annee, niveau=niveau).decisions(self.get_regles())
+
+    def get_cohort_distribution(self, annee, niveau):
+        """Distribution des moyennes de (annee, niveau), recalculée seulement après une écriture"""
+        return self._cached(self._distributions, (annee, niveau),
+                            lambda: CohortDistribution(self.get_grade_matrix(annee, niveau).moyennes_calculables()))
+
+    def rang_promotion(self, annee, etudiant, moyenne):
+        """(rang, effectif, percentile) de la moyenne d'etudiant (n_inscription, nom, niveau, annee) dans sa
+        promotion de annee; None sans moyenne, ou pour un bulletin d'une autre année que la sienne
+        (il n'est classé dans aucune promotion de annee, comme pour get_rang_etudiant)"""
+        if moyenne is None or etudiant[3] != annee:
+            return None
+        return self.get_cohort_distribution(annee, etudiant[2]).situer(moyenne)
+
+    def get_regles(self):
+        """Règles de délibération enregistrées (valeurs par défaut si aucune)"""
+        return self._cached(self._regles, None, self._load_regles)
+
+    def _load_regles(self):
+        cur = self.conn.cursor()
+        cur.execute("SELECT valeur FROM parametres WHERE cle='regles_deliberation'")
+        row = cur.fetchone()
+        if row is None:
+            return DeliberationRules()
+        try:
+            return DeliberationRules.from_dict(json.loads(row[0]))
+        except (ValueError, TypeError) as e:
+            print(f"Règles de délibération invalides, valeurs par défaut utilisées: {e}")
+            return DeliberationRules()
+
+    @_journalise
+    def save_regles(self, regles):
+        cur = self.conn.cursor()
+        cur.execute("INSERT OR REPLACE INTO parametres (cle, valeur) VALUES ('regles_deliberation', ?)",
+                    (json.dumps(regles.to_dict()),))
+        # Les décisions de toutes les années changent avec les règles
+        cur.execute("""INSERT OR IGNORE INTO stats_annuelles_a_recalculer (annee)
+                       SELECT annee FROM etudiants UNION SELECT annee FROM archives_annuelles""")
+        self.conn.commit()
+        self._touch()
+
+    def get_parametres_sauvegarde(self):
+        """Réglages des sauvegardes automatiques, complétés par les valeurs par défaut"""
+        parametres = {"dossier": os.path.join(os.path.dirname(os.path.abspath(self.filename)), "sauvegardes"),
+                      "intervalle": 60, "generations": 7, "compresser": False}
+        cur = self.conn.cursor()
+        cur.execute("SELECT valeur FROM parametres WHERE cle='sauvegarde'")
+        row = cur.fetchone()
+        if row is not None:
+            try:
+                parametres.update(json.loads(row[0]))
+            except ValueError as e:
+                print(f"Réglages de sauvegarde invalides, valeurs par défaut utilisées: {e}")
+        return parametres
+
+    @_journalise
+    def save_parametres_sauvegarde(self, parametres):
+        cur = self.conn.cursor()
+        cur.execute("INSERT OR REPLACE INTO parametres (cle, valeur) VALUES ('sauvegarde', ?)",
+                    (json.dumps(parametres),))
+        self.conn.commit()
+
+    def _cohorte(self, matrice, annee):
+        """(n_inscription, nom, niveau, moyenne ou None, observation) de chaque étudiant de la matrice
+        encore inscrit en annee: ceux qui en sont partis par promouvoir_promotion y restent pour les rapports
+        """
+        cur = self.conn.cursor()
+        cur.execute("SELECT n_inscription FROM etudiants WHERE annee=?", (annee,))
+        inscrits = {r[0] for r in cur.fetchall()}
+        moyennes = matrice.moyennes().tolist()
+        decisions = matrice.decisions(self.get_regles())
+        return [(n_insc, nom, niveau, None if np.isnan(moyenne) else moyenne, decisions[n_insc])
+                for (n_insc, nom, niveau, _), moyenne in zip(matrice.etudiants, moyennes) if n_insc in inscrits]
+
+    def _mouvements_passage(self, matrice, annee, redoublants):
+        mouvements = []
+        for n_insc, nom, niveau, moyenne, observation in self._cohorte(matrice, annee):
+            if observation == STATUTS[0]:
+                cible = NIVEAU_SUIVANT.get(niveau)
+            elif observation == STATUTS[1] and redoublants:
+                cible = niveau
             else:
-                exclus += 1
-        
-        total = len(students_with_avg)
-        return {
-            'admis': admis,
-            'redoublant': redoublant,
-            'exclus': exclus,
-            'sans_notes': sans_notes,
-            'total': total
-        }
+                cible = None
+            if cible is not None:
+                mouvements.append((n_insc, nom, niveau, moyenne, observation, cible, annee + 1))
+        return mouvements
+
+    @_journalise
+    def promouvoir_promotion(self, annee, niveau=None, redoublants=False, simulation=False):
+        """Passage à l'année suivante des admis de (annee, niveau), au niveau supérieur.
+
+        Avec redoublants, les redoublants passent aussi à annee + 1, au même niveau. Les admis de M2,
+        les exclus et les étudiants sans notes ne bougent pas. Les décisions sont celles des règles
+        de délibération, sur les moyennes calculées. L'inscription quittée est gardée dans inscriptions:
+        les rapports de annee comptent toujours les étudiants partis.
+        Renvoie les mouvements (n_inscription, nom, niveau, moyenne, observation, niveau cible,
+        année cible); avec simulation, rien n'est écrit (aperçu).
+        """
+        niveau = niveau or None
+        if annee in self.get_annees_archivees():
+            raise ValueError(f"L'année {annee} est archivée.")
+        if simulation:
+            return self._mouvements_passage(self.get_grade_matrix(annee, niveau), annee, redoublants)
+        self._enable_foreign_keys()
+        cur = self.conn.cursor()
+        try:
+            cur.execute("BEGIN IMMEDIATE")
+            # Décisions recalculées sous le verrou: aucune note ne peut changer entre le calcul et l'écriture
+            mouvements = self._mouvements_passage(self._load_grade_matrix(annee, niveau), annee, redoublants)
+            cur.execute("""CREATE TEMP TABLE IF NOT EXISTS passage (
+                               n_inscription TEXT PRIMARY KEY,
+                               niveau TEXT NOT NULL,
+                               annee INTEGER NOT NULL
+                           )""")
+            cur.execute("DELETE FROM temp.passage")
+            cur.executemany("INSERT INTO temp.passage (n_inscription, niveau, annee) VALUES (?, ?, ?)",
+                            [(m[0], m[5], m[6]) for m in mouvements])
+            cur.execute("""INSERT OR REPLACE INTO inscriptions (n_inscription, annee, niveau)
+                           SELECT n_inscription, annee, niveau FROM etudiants
+                           WHERE n_inscription IN (SELECT n_inscription FROM temp.passage)""")
+            cur.execute("""UPDATE etudiants
+                           SET (niveau, annee) = (SELECT niveau, annee FROM temp.passage
+                                                  WHERE passage.n_inscription = etudiants.n_inscription)
+                           WHERE n_inscription IN (SELECT n_inscription FROM temp.passage)""")
+            cur.execute("DELETE FROM temp.passage")
+            self.conn.commit()
+        except sqlite3.Error as e:
+            self.conn.rollback()
+            print(f"Erreur SQLite: {e}")
+            raise e
+        self._touch()
+        self._rankings.clear()
+        return mouvements
+
+    @_journalise
+    def supprimer_promotion(self, annee, niveau=None, simulation=False):
+        """Supprime en une transaction tous les étudiants de (annee, niveau) et toutes leurs notes.
 
-    def observation_from_moyenne(moyenne):
+        Pour conserver une année close, archiver_annee la déplace plutôt dans son fichier d'archive.
+        Renvoie (étudiants (n_inscription, nom, niveau, moyenne, observation), nombre de notes);
+        avec simulation, rien n'est écrit (aperçu).
+        """
+        niveau = niveau or None
+        if annee in self.get_annees_archivees():
+            raise ValueError(f"L'année {annee} est archivée.")
+        cond = "annee = ?"
+        params = [annee]
+        if niveau is not None:
+            cond += " AND niveau = ?"
+            params.append(niveau)
+        self._enable_foreign_keys()
+        cur = self.conn.cursor()
+        if simulation:
+            cur.execute(f"""SELECT COUNT(*) FROM notes
+                            WHERE n_inscription IN (SELECT n_inscription FROM etudiants WHERE {cond})""", params)
+            return self._cohorte(self.get_grade_matrix(annee, niveau), annee), cur.fetchone()[0]
+        try:
+            cur.execute("BEGIN IMMEDIATE")
+            cohorte = self._cohorte(self._load_grade_matrix(annee, niveau), annee)
+            cur.execute(f"""SELECT COUNT(*) FROM notes
+                            WHERE n_inscription IN (SELECT n_inscription FROM etudiants WHERE {cond})""", params)
+            nombre_notes = cur.fetchone()[0]
+            cur.execute(f"""DELETE FROM notes
+                            WHERE n_inscription IN (SELECT n_inscription FROM etudiants WHERE {cond})""", params)
+            cur.execute(f"DELETE FROM etudiants WHERE {cond}", params)
+            self.conn.commit()
+        except sqlite3.Error as e:
+            self.conn.rollback()
+            print(f"Erreur SQLite: {e}")
+            raise e
+        self._touch()
+        self._rankings.clear()
+        return cohorte, nombre_notes
+
+class ProfileurRequetes:
+    """Temps des méthodes publiques d'une Database et journal des requêtes lentes.
+
+    Les méthodes sont enveloppées sur l'instance (aucun coût une fois retirées); un générateur n'est
+    mesuré que jusqu'à sa création. Les requêtes sont
+    relevées par set_trace_callback pendant les appels; la durée d'une requête est estimée jusqu'à
+    l'événement suivant, lecture des lignes comprise. Au-delà de seuil secondes, la requête est
+    consignée avec son EXPLAIN QUERY PLAN.
+    """
+    def __init__(self, db, seuil=0.1, echantillons=10000):
+        self.db = db
+        self.seuil = seuil
+        self._echantillons = echantillons
+        # nom -> [appels, durée totale, lignes renvoyées, dernières durées]
+        self.methodes = {}
+        self.requetes_lentes = deque(maxlen=200)
+        self._enveloppes = []
+        self._evenements = []
+        self._profondeur = 0
+
+    @property
+    def actif(self):
+        return bool(self._enveloppes)
+
+    def installer(self):
+        """Installe (ou réinstalle après retirer) les mesures; les statistiques déjà relevées sont conservées"""
+        if self.actif:
+            return
+        for nom in dir(type(self.db)):
+            if (nom.startswith("_") or nom in ("activer_profilage", "desactiver_profilage")
+                    or not inspect.isroutine(getattr(type(self.db), nom))):
+                continue
+            setattr(self.db, nom, self._envelopper(nom, getattr(self.db, nom)))
+            self._enveloppes.append(nom)
+        self.db.conn.set_trace_callback(self._trace)
+
+    def retirer(self):
+        """Suspend les mesures sans effacer les statistiques"""
+        self.db.conn.set_trace_callback(None)
+        for nom in self._enveloppes:
+            delattr(self.db, nom)
+        self._enveloppes = []
+
+    def _trace(self, sql):
+        if self._profondeur:
+            self._evenements.append((time.perf_counter(), sql))
+
+    def _envelopper(self, nom, methode):
+        @functools.wraps(methode)
+        def enveloppe(*args, **kwargs):
+            self._profondeur += 1
+            lignes = 0
+            t0 = time.perf_counter()
+            try:
+                resultat = methode(*args, **kwargs)
+                if isinstance(resultat, list):
+                    lignes = len(resultat)
+                return resultat
+            finally:
+                fin = time.perf_counter()
+                self._profondeur -= 1
+                mesure = self.methodes.get(nom)
+                if mesure is None:
+                    mesure = self.methodes[nom] = [0, 0.0, 0, deque(maxlen=self._echantillons)]
+                mesure[0] += 1
+                mesure[1] += fin - t0
+                mesure[2] += lignes
+                mesure[3].append(fin - t0)
+                if not self._profondeur:
+                    self._relever_lentes(nom, fin)
+        return enveloppe
+
+    def _relever_lentes(self, methode, fin):
+        evenements, self._evenements = self._evenements, []
+        # Les instructions d'un déclencheur sont rapportées sous le texte de la requête qui le déclenche
+        requetes = []
+        for i, (t, sql) in enumerate(evenements):
+            suivant = evenements[i + 1][0] if i + 1 < len(evenements) else fin
+            if requetes and requetes[-1][0] == sql:
+                requetes[-1][1] += suivant - t
+            else:
+                requetes.append([sql, suivant - t])
+        for sql, duree in requetes:
+            if duree < self.seuil or not sql.lstrip()[:7].upper().startswith(("SELECT", "WITH", "INSERT", "UPDATE",
+                                                                                "DELETE", "REPLACE")):
+                continue
+            try:
+                plan = [row[3] for row in self.db.conn.execute("EXPLAIN QUERY PLAN " + sql)]
+            except sqlite3.Error as e:
+                # Table temporaire déjà supprimée, par exemple
+                plan = [f"Plan indisponible: {e}"]
+            print(f"Requête lente ({duree * 1000:.0f} ms) dans {methode}: {' '.join(sql.split())[:200]}")
+            self.requetes_lentes.append({"date": datetime.now().isoformat(timespec="seconds"), "methode": methode,
+                                         "duree": duree, "sql": sql, "plan": plan})
+
+    def statistiques(self):
+        """{méthode: {appels, total, p50, p95, lignes}}, durées en secondes"""
+        resultat = {}
+        for nom, (appels, total, lignes, durees) in sorted(self.methodes.items()):
+            p50, p95 = np.percentile(durees, [50, 95])
+            resultat[nom] = {"appels": appels, "total": total, "p50": float(p50), "p95": float(p95), "lignes": lignes}
+        return resultat
+
+    def exporter_json(self, chemin):
+        donnees = {"date": datetime.now().isoformat(timespec="seconds"), "base": self.db.filename,
+                   "sqlite": sqlite3.sqlite_version, "seuil": self.seuil, "methodes": self.statistiques(),
+                   "requetes_lentes": list(self.requetes_lentes)}
+        with open(chemin, "w", encoding="utf-8") as f:
+            json.dump(donnees, f, ensure_ascii=False, indent=2)
+        return chemin
+
+class RankingIndex:
+    """Classement en mémoire d'une promotion, tenu à jour étudiant par étudiant.
+
+    Les clés (-moyenne, n_inscription) restent triées: chaque mise à jour et chaque
+    recherche de rang se fait par dichotomie. Le rang d'un étudiant est celui de la
+    première clé de même moyenne, comme RANK() dans Database.get_classement.
+    """
+    def __init__(self, moyennes=()):
+        self._moyennes = {n_insc: moyenne for n_insc, moyenne in moyennes if moyenne is not None}
+        self._keys = sorted((-moyenne, n_insc) for n_insc, moyenne in self._moyennes.items())
+
+    def __len__(self):
+        return len(self._keys)
+
+    def moyenne(self, n_inscription):
+        return self._moyennes.get(n_inscription)
+
+    def update(self, n_inscription, moyenne):
+        old = self._moyennes.pop(n_inscription, None)
+        if old is not None:
+            del self._keys[bisect_left(self._keys, (-old, n_inscription))]
+        if moyenne is not None:
+            self._moyennes[n_inscription] = moyenne
+            insort(self._keys, (-moyenne, n_inscription))
+
+    def _rank_at(self, position):
+        return bisect_left(self._keys, (self._keys[position][0],)) + 1
+
+    def rank(self, n_inscription):
+        moyenne = self._moyennes.get(n_inscription)
         if moyenne is None:
-            return "N/A"
-        if moyenne >= 10:
-            return "Admis"
-        if moyenne < 7.5:
-            return "Exclus"
-        return "Redoublant"
+            return None
+        return bisect_left(self._keys, (-moyenne,)) + 1
 
-class MatplotlibWidget(QWidget):
-    def __init__(self, parent=None):
-        super().__init__(parent)
-        self.figure = plt.figure(figsize=(12, 6)) 
-        self.canvas = FigureCanvas(self.figure)
-        self.layout = QVBoxLayout()
-        self.layout.addWidget(self.canvas)
-        self.setLayout(self.layout)
+    def neighbours(self, n_inscription, k=2):
+        """Les k étudiants classés juste avant et juste après, l'étudiant compris: (rang, n_inscription, moyenne)"""
+        moyenne = self._moyennes.get(n_inscription)
+        if moyenne is None:
+            return []
+        position = bisect_left(self._keys, (-moyenne, n_inscription))
+        return [(self._rank_at(i), self._keys[i][1], -self._keys[i][0])
+                for i in range(max(0, position - k), min(len(self._keys), position + k + 1))]
 
-    def plot_statistics(self, statistics):
-        self.figure.clear()
-        
-        labels = ['Admis', 'Redoublant', 'Exclus', 'Sans notes']
-        sizes = [
-            statistics['admis'],
+    def top(self, n):
+        return [(self._rank_at(i), key[1], -key[0]) for i, key in enumerate(self._keys[:n])]
+
+    def rows(self):
+        return self.top(len(self._keys))
+
+class CohortDistribution:
+    """Moyennes triées d'une promotion et leurs percentiles, pour situer un bulletin par dichotomie.
+
+    Le rang suit RANK(): 1 + nombre de moyennes strictement supérieures. Le percentile est
+    la part de la promotion dont la moyenne est inférieure ou égale.
+    """
+    PERCENTILES = (10, 25, 50, 75, 90)
+
+    def __init__(self, moyennes=()):
+        self._moyennes = sorted(m for m in moyennes if m is not None)
+        n = len(self._moyennes)
+        # Percentile au rang le plus proche: la plus petite moyenne couvrant p % de la promotion
+        self.breakpoints = {p: self._moyennes[max(0, -(-p * n // 100) - 1)] for p in self.PERCENTILES} if n else {}
+
+    def __len__(self):
+        return len(self._moyennes)
+
+    def rang(self, moyenne):
+        return len(self._moyennes) - bisect_right(self._moyennes, moyenne) + 1
+
+    def percentile(self, moyenne):
+        if not self._moyennes:
+            return None
+        return round(100 * bisect_right(self._moyennes, moyenne) / len(self._moyennes))
+
+    def situer(self, moyenne):
+        if not self._moyennes:
+            return None
+        return self.rang(moyenne), len(self._moyennes), self.percentile(moyenne)
+
+class DeliberationRules:
+    """Règles de délibération: admis, redoublant ou exclus, pour un étudiant comme pour une promotion entière.
+
+    - seuil_admis / seuil_exclus: seuils sur la moyenne générale;
+    - minimums: {codeMat: note} éliminatoires, une note inférieure interdit l'admission, compensée ou non;
+    - marge_compensation: points de jury, un étudiant entre seuil_admis - marge et seuil_admis est admis
+      par compensation s'il remplit les conditions suivantes (au moins une est exigée avec une marge):
+    - note_plancher: aucune note inférieure pour être compensé (None: pas de plancher);
+    - max_matieres_non_acquises: nombre maximal de notes sous SEUIL_REUSSITE pour être compensé (None: illimité).
+    Avec les valeurs par défaut, seule la moyenne compte (10 / 7.5).
+    """
+    SEUIL_REUSSITE = 10
+
+    def __init__(self, seuil_admis=10, seuil_exclus=7.5, minimums=None, marge_compensation=0,
+                 max_matieres_non_acquises=None, note_plancher=None):
+        if seuil_exclus > seuil_admis:
+            raise ValueError("Le seuil d'exclusion doit être inférieur au seuil d'admission.")
+        if marge_compensation < 0 or marge_compensation > seuil_admis - seuil_exclus:
+            raise ValueError("La marge de compensation doit rester entre 0 et l'écart des deux seuils.")
+        if marge_compensation and note_plancher is None and max_matieres_non_acquises is None:
+            raise ValueError("La compensation demande une note plancher ou un nombre maximal de matières "
+                             "non acquises.")
+        self.seuil_admis = seuil_admis
+        self.seuil_exclus = seuil_exclus
+        self.minimums = dict(minimums or {})
+        self.marge_compensation = marge_compensation
+        self.max_matieres_non_acquises = max_matieres_non_acquises
+        self.note_plancher = note_plancher
+
+    def to_dict(self):
+        return {
+            'seuil_admis': self.seuil_admis,
+            'seuil_exclus': self.seuil_exclus,
+            'minimums': self.minimums,
+            'marge_compensation': self.marge_compensation,
+            'max_matieres_non_acquises': self.max_matieres_non_acquises,
+            'note_plancher': self.note_plancher
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(**data)
+
+    def avec(self, **changements):
+        """Copie des règles avec certains paramètres remplacés (simulation)"""
+        data = self.to_dict()
+        data.update(changements)
+        return self.from_dict(data)
+
+    def statuts(self, moyennes, notes=None, codes=()):
+        """Indice dans STATUTS pour chaque étudiant: 0 admis, 1 redoublant, 2 exclus, 3 sans notes.
+
+        moyennes: vecteur des moyennes (NaN sans moyenne); notes: matrice étudiants × matières (NaN sans
+        note) dont les colonnes suivent codes, nécessaire pour les minimums et la compensation
+        (sans notes, personne n'est compensé).
+        """
+        moyennes = np.asarray(moyennes, dtype=float)
+        with np.errstate(invalid='ignore'):
+            admis = moyennes >= self.seuil_admis
+            if self.marge_compensation and notes is not None:
+                compenses = (moyennes >= self.seuil_admis - self.marge_compensation) & ~admis
+                if self.note_plancher is not None:
+                    compenses &= ~(notes < self.note_plancher).any(axis=1)
+                if self.max_matieres_non_acquises is not None:
+                    compenses &= (notes < self.SEUIL_REUSSITE).sum(axis=1) <= self.max_matieres_non_acquises
+                admis |= compenses
+            if notes is not None and len(codes):
+                colonnes = [j for j, code in enumerate(codes) if code in self.minimums]
+                if colonnes:
+                    minimums = np.array([self.minimums[codes[j]] for j in colonnes], dtype=float)
+                    admis &= ~(notes[:, colonnes] < minimums).any(axis=1)
+            statuts = np.full(len(moyennes), 1)
+            statuts[admis] = 0
+            statuts[moyennes < self.seuil_exclus] = 2
+        statuts[np.isnan(moyennes)] = 3
+        return statuts
+
+    def observation(self, moyenne, notes=()):
+        """Observation du bulletin pour une moyenne et ses lignes (code, libelle, coef, note)"""
+        if moyenne is None:
+            return "N/A"
+        if not self.minimums and not self.marge_compensation:
+            # Seule la moyenne compte: inutile de passer par numpy pour un seul bulletin
+            if moyenne >= self.seuil_admis:
+                return STATUTS[0]
+            return STATUTS[2] if moyenne < self.seuil_exclus else STATUTS[1]
+        codes = [n[0] for n in notes]
+        matrice = np.array([[n[3] for n in notes]], dtype=float) if notes else None
+        return STATUTS[self.statuts([moyenne], matrice, codes)[0]]
+
+class GradeMatrix:
+    """Notes d'une tranche (annee, niveau) en matrice dense étudiants × matières.
+
+    notes[i, j] vaut NaN quand l'étudiant i n'a pas de note dans la matière j (mask[i, j] faux).
+    Moyennes, décisions, agrégats annuels et corrélations sont vectorisés sur cette matrice,
+    que Database.get_grade_matrix met en cache pour le tableau de bord, les classements et les exports.
+    """
+    SEUIL_REUSSITE = DeliberationRules.SEUIL_REUSSITE
+
+    def __init__(self, etudiants, matieres, notes):
+        self.etudiants = etudiants
+        self.matieres = matieres
+        self.coefs = np.array([m[2] for m in matieres], dtype=float)
+        self.notes = notes
+        self.mask = ~np.isnan(notes)
+        self._moyennes = None
+
+    @classmethod
+    def from_rows(cls, etudiants, matieres, rows):
+        """etudiants: (n_inscription, nom, niveau, annee), matieres: (codeMat, libelle, coef),
+        rows: (n_inscription, annee, codeMat, note); un étudiant promu a une ligne par année d'inscription
+        """
+        lignes = {(e[0], e[3]): i for i, e in enumerate(etudiants)}
+        colonnes = {m[0]: j for j, m in enumerate(matieres)}
+        notes = np.full((len(etudiants), len(matieres)), np.nan)
+        if rows:
+            i, j, valeurs = zip(*[(lignes[n, annee], colonnes[code], note) for n, annee, code, note in rows])
+            notes[list(i), list(j)] = valeurs
+        return cls(etudiants, matieres, notes)
+
+    def __len__(self):
+        return len(self.etudiants)
+
+    def moyennes(self, coefs=None):
+        """Moyenne pondérée de chaque étudiant (NaN sans note), arrondie comme average_from_notes.
+
+        coefs remplace le vecteur des coefficients (simulation); seul le résultat par défaut est mis en cache.
+        """
+        if coefs is None and self._moyennes is not None:
+            return self._moyennes
+        poids = np.where(self.mask, self.coefs if coefs is None else coefs, 0.0)
+        total_coef = poids.sum(axis=1)
+        ponderees = (np.where(self.mask, self.notes, 0.0) * poids).sum(axis=1)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            moyennes = np.where(total_coef > 0, ponderees / total_coef, np.nan)
+        # round() de Python et non np.round, pour garder les mêmes arrondis que le reste de l'application
+        moyennes = np.array([round(m, 2) for m in moyennes.tolist()], dtype=float)
+        if coefs is None:
+            self._moyennes = moyennes
+        return moyennes
+
+    def statuts(self, regles, moyennes=None, lignes=None):
+        """Décision de chaque étudiant (indices dans STATUTS) selon regles, pour toute la matrice en une passe"""
+        moyennes = self.moyennes() if moyennes is None else moyennes
+        notes = self.notes
+        if lignes is not None:
+            moyennes = moyennes[lignes]
+            notes = notes[lignes]
+        return regles.statuts(moyennes, notes, [m[0] for m in self.matieres])
+
+    def decisions(self, regles):
+        """{n_inscription: observation} de toute la matrice"""
+        statuts = self.statuts(regles).tolist()
+        return {e[0]: STATUTS[s] if s != 3 else "N/A" for e, s in zip(self.etudiants, statuts)}
+
+    def rangs(self, moyennes):
+        """Rang de chaque étudiant dans son niveau, ex aequo compris comme RANK(); 0 sans moyenne"""
+        n = len(moyennes)
+        if not n:
+            return np.zeros(0, dtype=int)
+        _, groupes = np.unique([e[2] for e in self.etudiants], return_inverse=True)
+        valides = ~np.isnan(moyennes)
+        cles = np.where(valides, -moyennes, np.inf)
+        ordre = np.lexsort((cles, groupes))
+        cles_triees = cles[ordre]
+        groupes_tries = groupes[ordre]
+        positions = np.arange(n)
+        debut_groupe = np.r_[True, groupes_tries[1:] != groupes_tries[:-1]]
+        debut_egalite = debut_groupe | np.r_[True, cles_triees[1:] != cles_triees[:-1]]
+        premier_groupe = np.maximum.accumulate(np.where(debut_groupe, positions, 0))
+        premier_egal = np.maximum.accumulate(np.where(debut_egalite, positions, 0))
+        rangs = np.empty(n, dtype=int)
+        rangs[ordre] = premier_egal - premier_groupe + 1
+        rangs[~valides] = 0
+        return rangs
+
+    def simuler(self, coefs, regles, regles_simulees):
+        """Moyennes, statuts et rangs avec d'autres coefficients ({codeMat: coef}) et règles, sans rien écrire.
+
+        Renvoie les compteurs avant/après et la liste des étudiants dont la moyenne, le statut ou
+        le rang change: (n_inscription, nom, niveau, moyenne, moyenne simulée, statut, statut simulé,
+        rang, rang simulé), les changements de statut en premier.
+        """
+        nouveaux_coefs = np.array([coefs.get(m[0], m[2]) for m in self.matieres], dtype=float)
+        avant = self.moyennes()
+        apres = self.moyennes(nouveaux_coefs)
+        statuts_avant = self.statuts(regles, avant)
+        statuts_apres = self.statuts(regles_simulees, apres)
+        rangs_avant = self.rangs(avant)
+        rangs_apres = self.rangs(apres)
+
+        change = ((statuts_avant != statuts_apres) | (rangs_avant != rangs_apres)
+                  | ~((avant == apres) | (np.isnan(avant) & np.isnan(apres))))
+        indices = np.flatnonzero(change)
+        ordre = np.lexsort((-np.abs(rangs_apres[indices] - rangs_avant[indices]),
+                            statuts_avant[indices] == statuts_apres[indices]))
+        changements = []
+        for i in indices[ordre].tolist():
+            n_insc, nom, niveau, _ = self.etudiants[i]
+            changements.append((n_insc, nom, niveau,
+                                None if np.isnan(avant[i]) else float(avant[i]),
+                                None if np.isnan(apres[i]) else float(apres[i]),
+                                STATUTS[statuts_avant[i]], STATUTS[statuts_apres[i]],
+                                int(rangs_avant[i]) or None, int(rangs_apres[i]) or None))
+
+        return {'avant': self.compteurs(statuts_avant), 'apres': self.compteurs(statuts_apres),
+                'changements': changements}
+
+    def moyennes_calculables(self):
+        moyennes = self.moyennes()
+        return moyennes[~np.isnan(moyennes)].tolist()
+
+    @staticmethod
+    def compteurs(statuts):
+        admis, redoublant, exclus, sans_notes = np.bincount(statuts, minlength=len(STATUTS)).tolist()
+        return {
+            'admis': admis,
+            'redoublant': redoublant,
+            'exclus': exclus,
+            'sans_notes': sans_notes,
+            'total': len(statuts)
+        }
+
+    def statistiques(self, regles):
+        """Mêmes compteurs que Database.get_statistics"""
+        return self.compteurs(self.statuts(regles))
+
+    def agregats_par_niveau(self, regles):
+        """Agrégats additifs de chaque niveau, pour stats_annuelles et stats_annuelles_matieres.
+
+        Renvoie (niveaux, matieres): lignes (niveau, effectif, admis, redoublant, exclus, sans_notes,
+        somme_moyennes, histogramme JSON) et (niveau, codeMat, effectif, somme, reussis).
+        """
+        moyennes = self.moyennes()
+        statuts = self.statuts(regles)
+        niveaux_etudiants = np.array([e[2] for e in self.etudiants], dtype=object)
+        niveaux = []
+        matieres = []
+        for niveau in sorted(set(niveaux_etudiants.tolist())):
+            lignes = niveaux_etudiants == niveau
+            calculables = moyennes[lignes]
+            calculables = calculables[~np.isnan(calculables)]
+            compteurs = self.compteurs(statuts[lignes])
+            histogramme = np.histogram(calculables, HISTOGRAMME_BORNES)[0].tolist()
+            niveaux.append((niveau, compteurs['total'], compteurs['admis'], compteurs['redoublant'],
+                            compteurs['exclus'], compteurs['sans_notes'], float(calculables.sum()),
+                            json.dumps(histogramme)))
+
+            notes = self.notes[lignes]
+            presentes = self.mask[lignes]
+            effectifs = presentes.sum(axis=0)
+            sommes = np.where(presentes, notes, 0.0).sum(axis=0)
+            reussis = (np.where(presentes, notes, 0.0) >= self.SEUIL_REUSSITE).sum(axis=0)
+            for j, (code, libelle, coef) in enumerate(self.matieres):
+                if effectifs[j]:
+                    matieres.append((niveau, code, int(effectifs[j]), float(sommes[j]), int(reussis[j])))
+        return niveaux, matieres
+
+    def correlations(self):
+        """Matrice de corrélation entre matières, calculée sur les étudiants ayant les deux notes (NaN sinon)"""
+        if len(self.etudiants) < 2:
+            # np.ma.corrcoef réduit alors la matrice à un seul élément
+            return np.full((len(self.matieres), len(self.matieres)), np.nan)
+        correlations = np.ma.corrcoef(np.ma.masked_invalid(self.notes), rowvar=False)
+        return np.ma.filled(np.ma.atleast_2d(correlations).astype(float), np.nan)
+
+HISTOGRAMME_BORNES = np.linspace(0, 20, 11)
+
+def statistiques_par_matiere(frequences, bornes=HISTOGRAMME_BORNES):
+    """Statistiques par matière à partir des lignes (code, libelle, coef, note, effectif).
+
+    Les lignes sont triées par matière puis par note; une matière sans note a une seule
+    ligne d'effectif 0. Tous les calculs sont vectorisés sur l'ensemble des matières:
+    effectif, moyenne, médiane, écart-type, min, max, taux de réussite et histogramme.
+    """
+    if not frequences:
+        return []
+    codes, libelles, coefs, notes, effectifs = zip(*frequences)
+    # Une matière par changement de code; groupe[i] est la matière de la ligne i
+    nouvelle = np.array([i == 0 or codes[i] != codes[i - 1] for i in range(len(codes))])
+    groupe = np.cumsum(nouvelle) - 1
+    debuts = np.flatnonzero(nouvelle)
+    nb = len(debuts)
+    notes = np.array([n if n is not None else 0.0 for n in notes], dtype=float)
+    poids = np.array(effectifs, dtype=float)
+
+    effectif = np.bincount(groupe, weights=poids, minlength=nb)
+    somme = np.bincount(groupe, weights=poids * notes, minlength=nb)
+    somme_carres = np.bincount(groupe, weights=poids * notes * notes, minlength=nb)
+    reussis = np.bincount(groupe, weights=poids * (notes >= GradeMatrix.SEUIL_REUSSITE), minlength=nb)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        moyenne = somme / effectif
+        ecart_type = np.sqrt(np.maximum(somme_carres / effectif - moyenne * moyenne, 0))
+        taux = 100 * reussis / effectif
+
+    # Min, max et médiane sur les seules lignes présentes, déjà triées par note dans chaque matière
+    presentes = poids > 0
+    notes_min = np.full(nb, np.inf)
+    notes_max = np.full(nb, -np.inf)
+    np.minimum.at(notes_min, groupe[presentes], notes[presentes])
+    np.maximum.at(notes_max, groupe[presentes], notes[presentes])
+    cumul = np.cumsum(poids)
+    avant = cumul[debuts] - poids[debuts]
+    bas = np.searchsorted(cumul, avant + (effectif - 1) // 2, side='right')
+    haut = np.searchsorted(cumul, avant + effectif // 2, side='right')
+    mediane = (notes[np.minimum(bas, len(notes) - 1)] + notes[np.minimum(haut, len(notes) - 1)]) / 2
+
+    nb_classes = len(bornes) - 1
+    classes = np.clip(np.searchsorted(bornes, notes, side='right') - 1, 0, nb_classes - 1)
+    histogrammes = np.bincount(groupe * nb_classes + classes, weights=poids,
+                               minlength=nb * nb_classes).reshape(nb, nb_classes)
+
+    resultats = []
+    for k, i in enumerate(debuts):
+        stats = {'code': codes[i], 'libelle': libelles[i], 'coef': coefs[i], 'effectif': int(effectif[k])}
+        valeurs = (moyenne[k], mediane[k], ecart_type[k], notes_min[k], notes_max[k], taux[k])
+        for nom, valeur in zip(('moyenne', 'mediane', 'ecart_type', 'min', 'max', 'taux_reussite'), valeurs):
+            stats[nom] = float(valeur) if effectif[k] else None
+        stats['histogramme'] = histogrammes[k].astype(int).tolist()
+        resultats.append(stats)
+    return resultats
+
+def draw_histogrammes_matieres(figure, statistiques, bornes=HISTOGRAMME_BORNES):
+    """Petits multiples: un histogramme des notes par matière, sur des axes partagés"""
+    n = len(statistiques)
+    colonnes = int(np.ceil(np.sqrt(n)))
+    lignes = int(np.ceil(n / colonnes))
+    axes = figure.subplots(lignes, colonnes, sharex=True, sharey=True, squeeze=False).ravel()
+    largeur = bornes[1] - bornes[0]
+    for ax, stats in zip(axes, statistiques):
+        couleurs = ['#2ecc71' if b >= GradeMatrix.SEUIL_REUSSITE else '#e74c3c' for b in bornes[:-1]]
+        ax.bar(bornes[:-1], stats['histogramme'], width=largeur, align='edge', color=couleurs, edgecolor='white')
+        ax.set_title(stats['code'], fontsize=9)
+        ax.tick_params(labelsize=7)
+    for ax in axes[n:]:
+        ax.axis('off')
+
+def draw_correlations(figure, codes, correlations):
+    """Corrélation entre les notes de chaque paire de matières, valeurs affichées tant que la grille reste lisible"""
+    ax = figure.add_subplot(111)
+    image = ax.imshow(correlations, cmap='RdBu_r', vmin=-1, vmax=1)
+    ax.set_xticks(range(len(codes)))
+    ax.set_xticklabels(codes, rotation=90, fontsize=7)
+    ax.set_yticks(range(len(codes)))
+    ax.set_yticklabels(codes, fontsize=7)
+    if len(codes) <= 12:
+        for i, j in zip(*np.nonzero(np.isfinite(correlations))):
+            ax.text(j, i, f"{correlations[i, j]:.2f}", ha='center', va='center', fontsize=7,
+                    color='white' if abs(correlations[i, j]) > 0.6 else 'black')
+    ax.set_title('Corrélations entre matières', fontsize=10)
+    figure.colorbar(image, ax=ax, shrink=0.8)
+
+def draw_tendances(figure, tendances, tendances_matieres, bornes=HISTOGRAMME_BORNES):
+    """Taux d'admission, moyenne générale, distribution des moyennes et moyenne par matière, année par année"""
+    annees = [t['annee'] for t in tendances]
+    ax1, ax2, ax3, ax4 = figure.subplots(2, 2).ravel()
+
+    ax1.plot(annees, [t['taux_admission'] if t['taux_admission'] is not None else np.nan for t in tendances],
+             marker='o', color='#2ecc71')
+    ax1.set_title("Taux d'admission (%)")
+    ax1.set_ylim(0, 100)
+
+    ax2.plot(annees, [t['moyenne'] if t['moyenne'] is not None else np.nan for t in tendances],
+             marker='o', color='#3498db')
+    ax2.axhline(GradeMatrix.SEUIL_REUSSITE, color='#e74c3c', linestyle='--', linewidth=1)
+    ax2.set_title('Moyenne générale')
+    ax2.set_ylim(0, 20)
+
+    # Une ligne par année, part de la promotion dans chaque tranche de moyenne
+    histogrammes = np.array([t['histogramme'] for t in tendances], dtype=float)
+    totaux = histogrammes.sum(axis=1, keepdims=True)
+    parts = np.divide(histogrammes, totaux, out=np.zeros_like(histogrammes), where=totaux > 0)
+    ax3.imshow(parts, aspect='auto', cmap='Blues', origin='lower',
+               extent=(bornes[0], bornes[-1], -0.5, len(annees) - 0.5))
+    ax3.set_yticks(range(len(annees)))
+    ax3.set_yticklabels(annees)
+    ax3.set_title('Distribution des moyennes')
+    ax3.set_xlabel('Moyenne')
+
+    for code, lignes in tendances_matieres.items():
+        ax4.plot([l[0] for l in lignes], [l[2] for l in lignes], marker='.', label=code)
+    ax4.set_title('Moyenne par matière')
+    ax4.set_ylim(0, 20)
+    if tendances_matieres:
+        ax4.legend(fontsize=7, ncol=2)
+
+    for ax in (ax1, ax2, ax4):
+        ax.set_xticks(annees)
+        ax.grid(True, alpha=0.3)
+
+STATUTS = ['Admis', 'Redoublant', 'Exclus', 'Sans notes']
+COULEURS_STATUTS = ['#2ecc71', '#f39c12', '#e74c3c', '#95a5a6']
+
+def draw_statistics(figure, statistics):
+    sizes = [
+        statistics['admis'],
+        statistics['redoublant'],
+        statistics['exclus'],
+        statistics['sans_notes']
+    ]
+
+    ax1 = figure.add_subplot(121)
+    bars = ax1.bar(STATUTS, sizes, color=COULEURS_STATUTS)
+    ax1.set_title('Nombre d\'étudiants par statut')
+    ax1.set_ylabel('Nombre d\'étudiants')
+    ax1.set_xlabel('Statut')
+
+    for bar, value in zip(bars, sizes):
+        ax1.text(bar.get_x() + bar.get_width()/2, bar.get_height() + 0.1,
+                f'{value}', ha='center', va='bottom')
+
+    ax2 = figure.add_subplot(122)
+    explode = (0.1, 0, 0, 0)
+    ax2.pie(sizes, explode=explode, labels=STATUTS, colors=COULEURS_STATUTS, autopct='%1.1f%%',
+            shadow=True, startangle=90)
+    ax2.axis('equal')
+    ax2.set_title('Répartition des étudiants par statut')
+
+class ChartCache:
+    """Cache LRU des graphiques rendus, indexé par (année, niveau, version des données)"""
+    def __init__(self, max_size=16):
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry
+
+    def put(self, key, pixmap, statistics):
+        version = key[-1]
+        for old_key in [k for k in self._entries if k[-1] != version]:
+            del self._entries[old_key]
+        self._entries[key] = (pixmap, statistics)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        self._entries.clear()
+
+class MesuresInterface:
+    """Dernières durées (secondes) des opérations de l'interface, par nom d'opération.
+
+    Une mesure coûte deux perf_counter et un ajout à une deque bornée: elle reste active
+    en permanence, seul le panneau de diagnostic ouvert en fait des tableaux et des graphiques.
+    """
+    def __init__(self, taille=200):
+        self.taille = taille
+        self.durees = {}
+
+    def ajouter(self, nom, duree):
+        durees = self.durees.get(nom)
+        if durees is None:
+            durees = self.durees[nom] = deque(maxlen=self.taille)
+        durees.append(duree)
+
+    def mesurer(self, nom, fonction):
+        @functools.wraps(fonction)
+        def enveloppe(*args, **kwargs):
+            t0 = time.perf_counter()
+            try:
+                return fonction(*args, **kwargs)
+            finally:
+                self.ajouter(nom, time.perf_counter() - t0)
+        return enveloppe
+
+    def instrumenter(self, objet, noms):
+        """Remplace les méthodes noms de objet, sur l'instance, par leur version mesurée"""
+        for nom in noms:
+            setattr(objet, nom, self.mesurer(nom, getattr(objet, nom)))
+
+    def resume(self):
+        """[(nom, mesures, dernière, p50, p95, max)] triés par durée cumulée décroissante"""
+        lignes = []
+        for nom, durees in self.durees.items():
+            p50, p95 = np.percentile(durees, [50, 95])
+            lignes.append((nom, len(durees), durees[-1], float(p50), float(p95), max(durees), sum(durees)))
+        lignes.sort(key=lambda ligne: -ligne[-1])
+        return [ligne[:-1] for ligne in lignes]
+
+def draw_durees(figure, durees, nombre=6):
+    """Histogrammes des dernières durées (ms) des opérations les plus coûteuses"""
+    operations = sorted(durees.items(), key=lambda item: -sum(item[1]))[:nombre]
+    colonnes = min(3, len(operations))
+    lignes = (len(operations) + colonnes - 1) // colonnes
+    for i, (nom, valeurs) in enumerate(operations):
+        ax = figure.add_subplot(lignes, colonnes, i + 1)
+        ax.hist(np.array(valeurs) * 1000, bins=20, color='#3498db', edgecolor='white')
+        ax.set_title(f"{nom} ({len(valeurs)})", fontsize=9)
+        ax.set_xlabel('ms', fontsize=8)
+        ax.tick_params(labelsize=7)
+
+class MatplotlibWidget(QWidget):
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.figure = Figure(figsize=(12, 6))
+        self.canvas = FigureCanvas(self.figure)
+        self.pixmap_label = QLabel()
+        self.pixmap_label.setAlignment(Qt.AlignCenter)
+        self.stack = QtWidgets.QStackedWidget()
+        self.stack.addWidget(self.canvas)
+        self.stack.addWidget(self.pixmap_label)
+        self.layout = QVBoxLayout()
+        self.layout.addWidget(self.stack)
+        self.setLayout(self.layout)
+
+    def render_pixmap(self):
+        buffer = io.BytesIO()
+        self.figure.savefig(buffer, format='png', dpi=self.figure.dpi)
+        pixmap = QPixmap()
+        pixmap.loadFromData(buffer.getvalue(), "PNG")
+        return pixmap
+
+    def show_pixmap(self, pixmap):
+        self.pixmap_label.setPixmap(pixmap)
+        self.stack.setCurrentWidget(self.pixmap_label)
+
+    def plot_histogrammes_matieres(self, statistiques):
+        self.stack.setCurrentWidget(self.canvas)
+        self.figure.clear()
+        if not any(stats['effectif'] for stats in statistiques):
+            ax = self.figure.add_subplot(111)
+            ax.text(0.5, 0.5, 'Aucune note pour cette sélection',
+                   horizontalalignment='center', verticalalignment='center',
+                   transform=ax.transAxes, fontsize=14, color='gray')
+            ax.axis('off')
+        else:
+            draw_histogrammes_matieres(self.figure, statistiques)
+            self.figure.tight_layout()
+        self.canvas.draw()
+
+    def plot_correlations(self, codes, correlations):
+        self.stack.setCurrentWidget(self.canvas)
+        self.figure.clear()
+        # Diagonale exclue: une matière notée est toujours corrélée à elle-même
+        if not np.isfinite(correlations[~np.eye(len(codes), dtype=bool)]).any():
+            ax = self.figure.add_subplot(111)
+            ax.text(0.5, 0.5, 'Pas assez de notes pour les corrélations',
+                   horizontalalignment='center', verticalalignment='center',
+                   transform=ax.transAxes, fontsize=14, color='gray')
+            ax.axis('off')
+        else:
+            draw_correlations(self.figure, codes, correlations)
+            self.figure.tight_layout()
+        self.canvas.draw()
+
+    def plot_tendances(self, tendances, tendances_matieres):
+        self.stack.setCurrentWidget(self.canvas)
+        self.figure.clear()
+        if not tendances:
+            ax = self.figure.add_subplot(111)
+            ax.text(0.5, 0.5, 'Aucune donnée disponible',
+                   horizontalalignment='center', verticalalignment='center',
+                   transform=ax.transAxes, fontsize=14, color='gray')
+            ax.axis('off')
+        else:
+            draw_tendances(self.figure, tendances, tendances_matieres)
+            self.figure.tight_layout()
+        self.canvas.draw()
+
+    def plot_durees(self, durees):
+        self.stack.setCurrentWidget(self.canvas)
+        self.figure.clear()
+        if not durees:
+            ax = self.figure.add_subplot(111)
+            ax.text(0.5, 0.5, 'Aucune mesure pour le moment',
+                   horizontalalignment='center', verticalalignment='center',
+                   transform=ax.transAxes, fontsize=14, color='gray')
+            ax.axis('off')
+        else:
+            draw_durees(self.figure, durees)
+            self.figure.tight_layout()
+        self.canvas.draw()
+
+    def plot_statistics(self, statistics):
+        self.stack.setCurrentWidget(self.canvas)
+        self.figure.clear()
+        
+        sizes = [
+            statistics['admis'],
             statistics['redoublant'], 
             statistics['exclus'],
             statistics['sans_notes']
@@ -596,25 +2795,7 @@ class MatplotlibWidget(QWidget):
             self.canvas.draw()
             return
         
-        colors = ['#2ecc71', '#f39c12', '#e74c3c', '#95a5a6']
-        
-        ax1 = self.figure.add_subplot(121)
-        bars = ax1.bar(labels, sizes, color=colors)
-        ax1.set_title('Nombre d\'étudiants par statut')
-        ax1.set_ylabel('Nombre d\'étudiants')
-        ax1.set_xlabel('Statut')
-        
-        for bar, value in zip(bars, sizes):
-            ax1.text(bar.get_x() + bar.get_width()/2, bar.get_height() + 0.1,
-                    f'{value}', ha='center', va='bottom')
-        
-        ax2 = self.figure.add_subplot(122)
-        explode = (0.1, 0, 0, 0)  
-        ax2.pie(sizes, explode=explode, labels=labels, colors=colors, autopct='%1.1f%%',
-                shadow=True, startangle=90)
-        ax2.axis('equal')
-        ax2.set_title('Répartition des étudiants par statut')
-        
+        draw_statistics(self.figure, statistics)
         self.figure.tight_layout()
         self.canvas.draw()
 
@@ -659,16 +2840,1108 @@ class BulletinDialog(QDialog):
         except Exception as e:
             QMessageBox.warning(self, "Erreur", f"Erreur d'impression: {str(e)}")
 
-class MainWindow(QMainWindow):
+class StudentPicker(QLineEdit):
+    """Choix d'un étudiant par saisie: les suggestions sont cherchées dans la base au fil de la frappe.
+
+    Remplace un QComboBox rempli avec tous les étudiants: seules les lignes correspondant au début
+    saisi (n° d'inscription ou nom) sont chargées, via Database.rechercher_etudiants.
+    """
+    DELAI_MS = 150
+    LIMITE = 50
+
+    def __init__(self, db, parent=None):
+        super().__init__(parent)
+        self.db = db
+        self._n_inscription = None
+        self._libelles = {}
+        self.setPlaceholderText("N° inscription ou nom...")
+        self.model = QStringListModel(self)
+        self.completer = QCompleter(self.model, self)
+        # Le modèle est déjà filtré par la base: le completer affiche tout sans refiltrer
+        self.completer.setCompletionMode(QCompleter.UnfilteredPopupCompletion)
+        self.completer.setWidget(self)
+        self.completer.activated[str].connect(self._choisir)
+        self._timer = QTimer(self)
+        self._timer.setSingleShot(True)
+        self._timer.setInterval(self.DELAI_MS)
+        self._timer.timeout.connect(self._rechercher)
+        self.textEdited.connect(self._texte_modifie)
+
+    @staticmethod
+    def libelle(n_insc, nom):
+        return f"{n_insc} - {nom}"
+
+    def _texte_modifie(self, texte):
+        self._n_inscription = None
+        self._timer.start()
+
+    def _rechercher(self):
+        etudiants = self.db.rechercher_etudiants(self.text().strip(), self.LIMITE)
+        self._libelles = {self.libelle(n_insc, nom): n_insc for n_insc, nom, niveau, annee in etudiants}
+        self.model.setStringList(list(self._libelles))
+        if etudiants and self.hasFocus():
+            self.completer.complete()
+
+    def _choisir(self, libelle):
+        self._n_inscription = self._libelles.get(libelle)
+        self.setText(libelle)
+
+    def currentData(self):
+        """N° d'inscription choisi, ou celui tapé en entier s'il existe; None sinon"""
+        if self._n_inscription is None:
+            etudiant = self.db.get_etudiant(self.text().split(" - ")[0].strip())
+            if etudiant is not None:
+                self._n_inscription = etudiant[0]
+                self.setText(self.libelle(etudiant[0], etudiant[1]))
+        return self._n_inscription
+
+    def setCurrentData(self, n_insc):
+        etudiant = self.db.get_etudiant(n_insc)
+        self._n_inscription = etudiant[0] if etudiant else None
+        self.setText(self.libelle(etudiant[0], etudiant[1]) if etudiant else "")
+
+    def clear(self):
+        self._n_inscription = None
+        super().clear()
+
+class GrilleSaisie(QTableWidget):
+    """Tableau de saisie: Entrée valide la cellule et ouvre directement celle du dessous"""
+    def closeEditor(self, editor, hint):
+        if hint == QtWidgets.QAbstractItemDelegate.SubmitModelCache:
+            super().closeEditor(editor, QtWidgets.QAbstractItemDelegate.NoHint)
+            current = self.currentIndex()
+            below = current.sibling(current.row() + 1, current.column())
+            if below.isValid():
+                self.setCurrentIndex(below)
+                self.edit(below)
+            return
+        super().closeEditor(editor, hint)
+
+class ReglesDialog(QDialog):
+    """Édition des règles de délibération: seuils, compensation et minimums éliminatoires par matière"""
+    def __init__(self, regles, matieres, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle("Règles de délibération")
+        self.setMinimumWidth(500)
+        self._regles = regles
+
+        layout = QVBoxLayout()
+
+        seuils_layout = QHBoxLayout()
+        self.seuil_admis = QDoubleSpinBox()
+        self.seuil_admis.setRange(0.0, 20.0)
+        self.seuil_admis.setSingleStep(0.5)
+        self.seuil_admis.setValue(regles.seuil_admis)
+        self.seuil_exclus = QDoubleSpinBox()
+        self.seuil_exclus.setRange(0.0, 20.0)
+        self.seuil_exclus.setSingleStep(0.5)
+        self.seuil_exclus.setValue(regles.seuil_exclus)
+        seuils_layout.addWidget(QLabel("Seuil admis:"))
+        seuils_layout.addWidget(self.seuil_admis)
+        seuils_layout.addWidget(QLabel("Seuil exclus:"))
+        seuils_layout.addWidget(self.seuil_exclus)
+        layout.addLayout(seuils_layout)
+
+        compensation_layout = QHBoxLayout()
+        self.marge = QDoubleSpinBox()
+        self.marge.setRange(0.0, 20.0)
+        self.marge.setSingleStep(0.25)
+        self.marge.setValue(regles.marge_compensation)
+        self.max_non_acquises = QSpinBox()
+        self.max_non_acquises.setRange(-1, 100)
+        self.max_non_acquises.setSpecialValueText("Illimité")
+        self.max_non_acquises.setValue(-1 if regles.max_matieres_non_acquises is None
+                                       else regles.max_matieres_non_acquises)
+        self.plancher = QDoubleSpinBox()
+        self.plancher.setRange(0.0, 20.0)
+        self.plancher.setSingleStep(0.5)
+        self.plancher.setSpecialValueText("Aucune")
+        self.plancher.setValue(regles.note_plancher or 0.0)
+        compensation_layout.addWidget(QLabel("Marge de compensation:"))
+        compensation_layout.addWidget(self.marge)
+        layout.addLayout(compensation_layout)
+        conditions_layout = QHBoxLayout()
+        conditions_layout.addWidget(QLabel("Pour être compensé — note plancher:"))
+        conditions_layout.addWidget(self.plancher)
+        conditions_layout.addWidget(QLabel("Matières non acquises max:"))
+        conditions_layout.addWidget(self.max_non_acquises)
+        layout.addLayout(conditions_layout)
+
+        layout.addWidget(QLabel("Notes minimales éliminatoires (0 = aucune):"))
+        self.tbl_minimums = QTableWidget()
+        self.tbl_minimums.setColumnCount(3)
+        self.tbl_minimums.setHorizontalHeaderLabels(["Code", "Libellé", "Minimum"])
+        self.tbl_minimums.setEditTriggers(QtWidgets.QAbstractItemView.NoEditTriggers)
+        self.tbl_minimums.setRowCount(len(matieres))
+        for r, (code, libelle, coef) in enumerate(matieres):
+            self.tbl_minimums.setItem(r, 0, QTableWidgetItem(code))
+            self.tbl_minimums.setItem(r, 1, QTableWidgetItem(libelle))
+            spin = QDoubleSpinBox()
+            spin.setRange(0.0, 20.0)
+            spin.setSingleStep(0.5)
+            spin.setValue(regles.minimums.get(code, 0.0))
+            self.tbl_minimums.setCellWidget(r, 2, spin)
+        layout.addWidget(self.tbl_minimums)
+
+        btn_layout = QHBoxLayout()
+        btn_ok = QPushButton("Enregistrer")
+        btn_cancel = QPushButton("Annuler")
+        btn_ok.clicked.connect(self.accept)
+        btn_cancel.clicked.connect(self.reject)
+        btn_layout.addStretch()
+        btn_layout.addWidget(btn_ok)
+        btn_layout.addWidget(btn_cancel)
+        layout.addLayout(btn_layout)
+
+        self.setLayout(layout)
+
+    def accept(self):
+        minimums = {}
+        for r in range(self.tbl_minimums.rowCount()):
+            minimum = self.tbl_minimums.cellWidget(r, 2).value()
+            if minimum > 0:
+                minimums[self.tbl_minimums.item(r, 0).text()] = minimum
+        max_non_acquises = self.max_non_acquises.value()
+        try:
+            self._regles = DeliberationRules(self.seuil_admis.value(), self.seuil_exclus.value(), minimums,
+                                             self.marge.value(), None if max_non_acquises < 0 else max_non_acquises,
+                                             self.plancher.value() or None)
+        except ValueError as e:
+            QMessageBox.warning(self, "Erreur", str(e))
+            return
+        super().accept()
+
+    def regles(self):
+        return self._regles
+
+class ApercuDialog(QDialog):
+    """Aperçu d'une opération sur toute une promotion, à confirmer avant écriture"""
+    def __init__(self, titre, message, entetes, lignes, libelle_confirmer, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle(titre)
+        self.setMinimumSize(700, 500)
+
+        layout = QVBoxLayout()
+        layout.addWidget(QLabel(message))
+
+        table = QTableWidget(len(lignes), len(entetes))
+        table.setHorizontalHeaderLabels(entetes)
+        table.setEditTriggers(QtWidgets.QAbstractItemView.NoEditTriggers)
+        for r, ligne in enumerate(lignes):
+            for c, val in enumerate(ligne):
+                table.setItem(r, c, QTableWidgetItem("" if val is None else str(val)))
+        layout.addWidget(table)
+
+        btn_layout = QHBoxLayout()
+        btn_ok = QPushButton(libelle_confirmer)
+        btn_cancel = QPushButton("Annuler")
+        btn_ok.setEnabled(bool(lignes))
+        btn_ok.clicked.connect(self.accept)
+        btn_cancel.clicked.connect(self.reject)
+        btn_layout.addStretch()
+        btn_layout.addWidget(btn_ok)
+        btn_layout.addWidget(btn_cancel)
+        layout.addLayout(btn_layout)
+
+        self.setLayout(layout)
+
+class SauvegardeDialog(QDialog):
+    """Réglages des sauvegardes automatiques et sauvegarde immédiate"""
+    def __init__(self, parametres, sauvegarder_maintenant, derniere=None, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle("Sauvegardes")
+        self.setMinimumWidth(500)
+
+        layout = QVBoxLayout()
+
+        dossier_layout = QHBoxLayout()
+        self.dossier = QLineEdit(parametres["dossier"])
+        btn_parcourir = QPushButton("Parcourir")
+        btn_parcourir.clicked.connect(self.choisir_dossier)
+        dossier_layout.addWidget(QLabel("Dossier:"))
+        dossier_layout.addWidget(self.dossier)
+        dossier_layout.addWidget(btn_parcourir)
+        layout.addLayout(dossier_layout)
+
+        options_layout = QHBoxLayout()
+        self.intervalle = QSpinBox()
+        self.intervalle.setRange(0, 24 * 60)
+        self.intervalle.setSuffix(" min")
+        self.intervalle.setSpecialValueText("Désactivée")
+        self.intervalle.setValue(parametres["intervalle"])
+        self.generations = QSpinBox()
+        self.generations.setRange(1, 365)
+        self.generations.setValue(parametres["generations"])
+        self.compresser = QCheckBox("Compresser (gzip)")
+        self.compresser.setChecked(parametres["compresser"])
+        options_layout.addWidget(QLabel("Intervalle:"))
+        options_layout.addWidget(self.intervalle)
+        options_layout.addWidget(QLabel("Générations conservées:"))
+        options_layout.addWidget(self.generations)
+        options_layout.addWidget(self.compresser)
+        layout.addLayout(options_layout)
+
+        self.lbl_derniere = QLabel(derniere or "Aucune sauvegarde depuis l'ouverture")
+        layout.addWidget(self.lbl_derniere)
+
+        btn_layout = QHBoxLayout()
+        btn_maintenant = QPushButton("Sauvegarder maintenant")
+        btn_ok = QPushButton("Enregistrer")
+        btn_cancel = QPushButton("Annuler")
+        btn_maintenant.clicked.connect(sauvegarder_maintenant)
+        btn_ok.clicked.connect(self.accept)
+        btn_cancel.clicked.connect(self.reject)
+        btn_layout.addWidget(btn_maintenant)
+        btn_layout.addStretch()
+        btn_layout.addWidget(btn_ok)
+        btn_layout.addWidget(btn_cancel)
+        layout.addLayout(btn_layout)
+
+        self.setLayout(layout)
+
+    def choisir_dossier(self):
+        dossier = QFileDialog.getExistingDirectory(self, "Dossier des sauvegardes", self.dossier.text())
+        if dossier:
+            self.dossier.setText(dossier)
+
+    def accept(self):
+        if not self.dossier.text().strip():
+            QMessageBox.warning(self, "Erreur", "Choisissez un dossier de sauvegarde.")
+            return
+        super().accept()
+
+    def parametres(self):
+        return {"dossier": self.dossier.text().strip(), "intervalle": self.intervalle.value(),
+                "generations": self.generations.value(), "compresser": self.compresser.isChecked()}
+
+class MaintenanceDialog(QDialog):
+    """Dernier rapport de maintenance et lancement immédiat"""
+    def __init__(self, rapport, lancer, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle("Maintenance de la base")
+        self.setMinimumSize(550, 350)
+
+        layout = QVBoxLayout()
+        self.lbl_resume = QLabel()
+        layout.addWidget(self.lbl_resume)
+        self.tbl_taches = QTableWidget(0, 3)
+        self.tbl_taches.setHorizontalHeaderLabels(["Tâche", "Durée (s)", "Résultat"])
+        self.tbl_taches.setEditTriggers(QtWidgets.QAbstractItemView.NoEditTriggers)
+        self.tbl_taches.horizontalHeader().setStretchLastSection(True)
+        layout.addWidget(self.tbl_taches)
+
+        btn_layout = QHBoxLayout()
+        self.btn_lancer = QPushButton("Lancer maintenant")
+        btn_fermer = QPushButton("Fermer")
+        self.btn_lancer.clicked.connect(lancer)
+        self.btn_lancer.clicked.connect(lambda: self.lbl_resume.setText("Maintenance en cours..."))
+        btn_fermer.clicked.connect(self.accept)
+        btn_layout.addWidget(self.btn_lancer)
+        btn_layout.addStretch()
+        btn_layout.addWidget(btn_fermer)
+        layout.addLayout(btn_layout)
+
+        self.setLayout(layout)
+        self.afficher(rapport)
+
+    def afficher(self, rapport):
+        if rapport is None:
+            self.lbl_resume.setText("Aucune maintenance depuis l'ouverture")
+            return
+        self.lbl_resume.setText(
+            f"{rapport['date']} — taille {rapport['taille_avant'] // 1024} Ko → {rapport['taille_apres'] // 1024} Ko, "
+            f"pages libres {rapport['pages_libres_avant']} → {rapport['pages_libres_apres']}, "
+            f"{rapport['duree']:.2f} s")
+        self.tbl_taches.setRowCount(len(rapport["taches"]))
+        for r, (nom, duree, resultat) in enumerate(rapport["taches"]):
+            self.tbl_taches.setItem(r, 0, QTableWidgetItem(nom))
+            self.tbl_taches.setItem(r, 1, QTableWidgetItem(f"{duree:.3f}"))
+            self.tbl_taches.setItem(r, 2, QTableWidgetItem(resultat))
+
+class BulletinTemplate:
+    """Gabarit du bulletin: parties fixes (en-tête, CSS) préparées une fois, lignes assemblées par join"""
+
+    HEAD = """<!DOCTYPE html>
+<html>
+<head>
+    <meta charset="UTF-8">
+    <title>Bulletin de Notes</title>
+    <style>
+        body { font-family: Arial, sans-serif; margin: 20px; }
+        .header { text-align: center; border-bottom: 2px solid #333; padding-bottom: 10px; margin-bottom: 20px; }
+        .student-info { margin-bottom: 20px; }
+        .table { width: 100%; border-collapse: collapse; margin-bottom: 20px; }
+        .table th, .table td { border: 1px solid #ddd; padding: 8px; text-align: left; }
+        .table th { background-color: #f2f2f2; font-weight: bold; }
+        .summary { margin-top: 20px; padding: 10px; background-color: #f9f9f9; border-radius: 5px; }
+        .footer { margin-top: 30px; text-align: center; font-size: 12px; color: #666; }
+    </style>
+</head>
+<body>
+"""
+
+    INFO = """<div class="header">
+    <h1>BULLETIN DE NOTES</h1>
+    <h2>Année Universitaire {annee}</h2>
+</div>
+<div class="student-info">
+    <p><strong>Numéro d'inscription:</strong> {n_insc}</p>
+    <p><strong>Nom:</strong> {nom}</p>
+    <p><strong>Niveau:</strong> {niveau}</p>
+    <p><strong>Année:</strong> {annee}</p>
+</div>
+"""
+
+    TABLE_START = """<table class="table">
+<thead>
+    <tr><th>Matière</th><th>Coefficient</th><th>Note</th><th>Note pondérée</th></tr>
+</thead>
+<tbody>
+"""
+
+    ROW_MATIERE = "<tr><td>{0} - {1}</td><td>{2}</td>"
+    ROW_NOTE = "<td>{0}/20</td><td>{1:.2f}</td></tr>\n"
+    MAX_CELLULES = 10000
+
+    TOTAL = """</tbody>
+<tfoot>
+    <tr style="font-weight: bold;"><td>TOTAL</td><td>{0}</td><td></td><td>{1:.2f}</td></tr>
+"""
+
+    MOYENNE = """    <tr style="font-weight: bold; background-color: #e8f4f8;"><td>MOYENNE GÉNÉRALE</td><td></td><td></td><td>{moyenne}/20</td></tr>
+</tfoot>
+</table>
+<div class="summary">
+    <p><strong>Moyenne générale:</strong> {moyenne}/20</p>
+    <p><strong>Observation:</strong> {observation}</p>
+"""
+
+    RANG = """    <p><strong>Rang:</strong> {0}/{1} (percentile {2})</p>
+"""
+
+    DATE = """    <p><strong>Date d'édition:</strong> {0}</p>
+</div>
+"""
+
+    NON_CALCULABLE = """</tfoot>
+</table>
+<div class="summary">
+    <p><strong>Moyenne générale:</strong> Non calculable</p>
+    <p><strong>Observation:</strong> N/A</p>
+</div>
+"""
+
+    SANS_NOTES = """<div class="summary">
+    <p><strong>Aucune note enregistrée pour cette année.</strong></p>
+</div>
+"""
+
+    FOOTER = """<div class="footer">
+    <p>© {0} E-note - Tous droits réservés</p>
+</div>
+</body>
+</html>
+"""
+
     def __init__(self):
+        self._info = self.INFO.format
+        self._matiere_cells = {}
+        self._note_cells = {}
+        self._total = self.TOTAL.format
+        self._moyenne = self.MOYENNE.format
+        self._footers = {}
+
+    def _footer(self, year):
+        footer = self._footers.get(year)
+        if footer is None:
+            footer = self._footers[year] = self.FOOTER.format(year)
+        return footer
+
+    def _rows(self, notes):
+        # Les cellules matière et note se répètent d'un bulletin à l'autre: on les formate une seule fois
+        matiere_cells = self._matiere_cells
+        note_cells = self._note_cells
+        if len(note_cells) > self.MAX_CELLULES:
+            note_cells.clear()
+        parts = []
+        total_coef = 0
+        total_notes_ponderees = 0
+        for code, libelle, coef, note in notes:
+            total_coef += coef
+            total_notes_ponderees += note * coef
+            cle = (code, libelle, coef)
+            matiere = matiere_cells.get(cle)
+            if matiere is None:
+                matiere = matiere_cells[cle] = self.ROW_MATIERE.format(escape(str(code)), escape(libelle), coef)
+            cell = note_cells.get((note, coef))
+            if cell is None:
+                cell = note_cells[(note, coef)] = self.ROW_NOTE.format(note, note * coef)
+            parts.append(matiere)
+            parts.append(cell)
+        parts.append(self._total(total_coef, total_notes_ponderees))
+        return parts
+
+    def render(self, n_insc, nom, niveau, annee, notes, moyenne_data, rang=None, observation=None, now=None):
+        """observation: décision des règles enregistrées (Database.get_regles), requise avec moyenne_data"""
+        now = now or datetime.now()
+        parts = [self.HEAD, self._info(annee=annee, n_insc=escape(str(n_insc)), nom=escape(str(nom)),
+                                       niveau=escape(str(niveau)))]
+
+        if notes:
+            parts.append(self.TABLE_START)
+            parts.extend(self._rows(notes))
+
+            if moyenne_data:
+                moyenne = moyenne_data[0]
+                if observation is None:
+                    # Des règles par défaut contrediraient la délibération configurée
+                    raise ValueError(f"Bulletin de {n_insc}: observation manquante pour la moyenne {moyenne}.")
+                parts.append(self._moyenne(moyenne=moyenne, observation=observation))
+                if rang:
+                    parts.append(self.RANG.format(*rang))
+                parts.append(self.DATE.format(now.strftime('%d/%m/%Y %H:%M')))
+            else:
+                parts.append(self.NON_CALCULABLE)
+        else:
+            parts.append(self.SANS_NOTES)
+
+        parts.append(self._footer(now.year))
+        return "".join(parts)
+
+BULLETIN_TEMPLATE = BulletinTemplate()
+
+def generate_bulletin_html(n_insc, nom, niveau, annee, notes, moyenne_data, rang=None, observation=None):
+    return BULLETIN_TEMPLATE.render(n_insc, nom, niveau, annee, notes, moyenne_data, rang, observation)
+
+BULLETINS_PAR_LOT = 50
+
+def _safe_filename(value):
+    return re.sub(r'[^\w.-]+', '_', str(value))
+
+def _init_bulletin_worker():
+    if QGuiApplication.instance() is None:
+        _init_bulletin_worker.app = QGuiApplication(["e-Note"])
+
+def print_html_to_pdf(html, filename):
+    writer = QPdfWriter(filename)
+    writer.setPageSize(QPageSize(QPageSize.A4))
+    document = QTextDocument()
+    document.setHtml(html)
+    document.print_(writer)
+
+def render_bulletins_lot(bulletins, output_dir=None):
+    """Rend un lot de bulletins: HTML en mémoire, ou un PDF par étudiant si output_dir est donné"""
+    results = []
+    for n_insc, nom, niveau, annee, notes, moyenne_data, rang, observation in bulletins:
+        html = generate_bulletin_html(n_insc, nom, niveau, annee, notes, moyenne_data, rang, observation)
+        if output_dir:
+            filename = os.path.join(output_dir, f"bulletin_{_safe_filename(n_insc)}_{annee}.pdf")
+            print_html_to_pdf(html, filename)
+            results.append((n_insc, filename))
+        else:
+            results.append((n_insc, html))
+    return results
+
+def write_bulletins_pdf(html_list, filename, on_progress=None):
+    """Écrit tous les bulletins dans un seul PDF, chaque bulletin commençant sur une nouvelle page"""
+    writer = QPdfWriter(filename)
+    writer.setPageSize(QPageSize(QPageSize.A4))
+    writer.setPageMargins(QMarginsF(15, 15, 15, 15), QPageLayout.Millimeter)
+    writer.setResolution(96)
+    page_w = writer.width()
+    page_h = writer.height()
+    painter = QPainter(writer)
+    try:
+        for i, html in enumerate(html_list):
+            if i:
+                writer.newPage()
+            document = QTextDocument()
+            document.documentLayout().setPaintDevice(writer)
+            document.setPageSize(QSizeF(page_w, page_h))
+            document.setHtml(html)
+            for page in range(document.pageCount()):
+                if page:
+                    writer.newPage()
+                painter.save()
+                painter.translate(0, -page * page_h)
+                document.drawContents(painter, QRectF(0, page * page_h, page_w, page_h))
+                painter.restore()
+            if on_progress is not None and on_progress(i + 1) is False:
+                return False
+    finally:
+        painter.end()
+    return True
+
+class ExportAnnule(Exception):
+    pass
+
+def export_statistics_pdf_file(filename, statistics, annee, progress=None):
+    figure = Figure(figsize=(12, 6))
+    draw_statistics(figure, statistics)
+    figure.suptitle(f'Statistiques des étudiants - Année {annee}', fontsize=16, fontweight='bold')
+    figure.tight_layout()
+    if progress is not None:
+        progress(1, 2)
+    with PdfPages(filename) as pdf:
+        pdf.savefig(figure)
+    if progress is not None:
+        progress(2, 2)
+
+CLASSEMENT_LIGNES_PAR_PAGE = 40
+CLASSEMENT_COLONNES = [("Rang", 0.03, 'left'), ("N° Inscription", 0.11, 'left'), ("Nom", 0.32, 'left'),
+                       ("Niveau", 0.68, 'left'), ("Année", 0.78, 'left'), ("Moyenne", 0.97, 'right')]
+# Polices standard PDF: pas d'incorporation ni de sous-ensemble de police, ~4x plus rapide. Elles ne
+# couvrent que cp1252: une page qui contient d'autres caractères est écrite en DejaVu Sans, dont le
+# sous-ensemble est incorporé en TrueType (pdf.fonttype 42)
+CLASSEMENT_RC = {'pdf.use14corefonts': True, 'pdf.fonttype': 42, 'font.family': 'sans-serif',
+                 'font.sans-serif': ['Helvetica'], 'font.weight': 'medium'}
+# (famille, graisse du texte courant): Helvetica n'existe qu'en medium, DejaVu Sans qu'en normal
+CLASSEMENT_POLICE_STANDARD = ('Helvetica', 'medium')
+CLASSEMENT_POLICE_INCORPOREE = ('DejaVu Sans', 'normal')
+CLASSEMENT_TAILLE = (8.27, 11.69)
+
+def _cp1252(texte):
+    try:
+        texte.encode('cp1252')
+        return True
+    except UnicodeEncodeError:
+        return False
+
+def _coupeur_noms(largeur, taille):
+    """Fonction qui coupe un nom (avec «…») pour qu'il tienne dans largeur points en corps taille.
+
+    Mesure en DejaVu Sans, plus large que Helvetica: le nom tient dans sa colonne avec les deux polices.
+    """
+    famille, graisse = CLASSEMENT_POLICE_INCORPOREE
+    police = get_font(findfont(FontProperties(family=famille, weight=graisse)))
+    police.set_size(taille, 72)
+    # Avance de chaque caractère, sans crénage (qui ne fait que rapprocher les lettres): set_text
+    # mettrait en page toute la chaîne à chaque mesure
+    avances = {}
+
+    def largeur_texte(texte):
+        for c in texte:
+            if c not in avances:
+                avances[c] = police.load_char(ord(c)).linearHoriAdvance / 65536
+        return sum(avances[c] for c in texte)
+
+    def couper(nom):
+        if largeur_texte(nom) <= largeur:
+            return nom
+        # Plus long début du nom qui tient avec les points de suspension
+        debut, fin = 0, len(nom)
+        while debut < fin:
+            milieu = (debut + fin + 1) // 2
+            if largeur_texte(nom[:milieu] + "…") <= largeur:
+                debut = milieu
+            else:
+                fin = milieu - 1
+        return nom[:debut].rstrip() + "…"
+    return couper
+
+def _format_classement_row(row, couper_nom):
+    rang, n_insc, nom, niv, annee_etud, moyenne = row
+    return (str(rang), str(n_insc), couper_nom(str(nom)), str(niv), str(annee_etud),
+            f"{moyenne:.2f}" if moyenne is not None else "N/A")
+
+def export_classement_pdf_file(filename, rows, annee, niveau, progress=None, total=None):
+    """Classement paginé: une page A4 par tranche de CLASSEMENT_LIGNES_PAR_PAGE étudiants.
+
+    rows: (rang, n_inscription, nom, niveau, annee, moyenne) dans l'ordre du classement,
+    éventuellement un itérateur (total doit alors être fourni). Une seule figure est
+    réutilisée d'une page à l'autre et chaque colonne est un seul texte multiligne,
+    si bien que le coût d'une page ne dépend pas de la taille de la promotion.
+    """
+    with matplotlib.rc_context(CLASSEMENT_RC):
+        _write_classement_pages(filename, rows, annee, niveau, progress, total)
+
+def _write_classement_pages(filename, rows, annee, niveau, progress, total):
+    if total is None:
+        total = len(rows)
+    per_page = CLASSEMENT_LIGNES_PAR_PAGE
+    pages = max(1, -(-total // per_page))
+
+    figure = Figure(figsize=CLASSEMENT_TAILLE)
+    figure.text(0.5, 0.965, f"Classement des Étudiants - Année {annee}",
+                ha='center', va='center', fontsize=14, fontweight='bold')
+    figure.text(0.5, 0.94, f"Niveau: {niveau}", ha='center', va='center', fontsize=11)
+    figure.patches.append(Rectangle((0.05, 0.895), 0.9, 0.025, facecolor='#34495e', edgecolor='none',
+                                    transform=figure.transFigure, figure=figure))
+    columns = []
+    for label, x, align in CLASSEMENT_COLONNES:
+        x = 0.05 + 0.9 * x
+        figure.text(x, 0.9075, label, ha=align, va='center', fontsize=9, fontweight='bold', color='white')
+        columns.append(figure.text(x, 0.888, "", ha=align, va='top', multialignment=align,
+                                   fontsize=9, linespacing=1.9))
+    footer = figure.text(0.5, 0.025, "", ha='center', va='center', fontsize=8, color='#666666')
+    date_edition = datetime.now().strftime('%d/%m/%Y %H:%M')
+    # Colonne Nom jusqu'à la colonne Niveau, moins un espace
+    x_nom, x_niveau = CLASSEMENT_COLONNES[2][1], CLASSEMENT_COLONNES[3][1]
+    couper_nom = _coupeur_noms((x_niveau - x_nom) * 0.9 * CLASSEMENT_TAILLE[0] * 72 - 6, 9)
+
+    rows = iter(rows)
+    with PdfPages(filename) as pdf:
+        for page in range(1, pages + 1):
+            chunk = [_format_classement_row(row, couper_nom) for _, row in zip(range(per_page), rows)]
+            for c, column in enumerate(columns):
+                column.set_text("\n".join(row[c] for row in chunk))
+            footer.set_text(f"Page {page}/{pages} - {total} étudiant(s) - édité le {date_edition}")
+            standard = _cp1252(str(niveau)) and all(_cp1252(text) for row in chunk for text in row)
+            famille, graisse = CLASSEMENT_POLICE_STANDARD if standard else CLASSEMENT_POLICE_INCORPOREE
+            for text in figure.texts:
+                text.set_fontfamily(famille)
+                if text.get_fontweight() != 'bold':
+                    text.set_fontweight(graisse)
+            with matplotlib.rc_context({'pdf.use14corefonts': standard}):
+                pdf.savefig(figure)
+            if progress is not None:
+                progress(page, pages)
+
+def _run_export(export_func, args, queue, cancel_event):
+    """Point d'entrée du processus d'export: rendu Agg/PDF, sans pyplot ni Qt"""
+    filename = args[0]
+
+    def progress(done, total):
+        if cancel_event.is_set():
+            raise ExportAnnule()
+        queue.put(("progress", done, total))
+
+    try:
+        export_func(*args, progress=progress)
+        queue.put(("done", filename))
+    except ExportAnnule:
+        if os.path.exists(filename):
+            os.remove(filename)
+        queue.put(("canceled", filename))
+    except Exception as e:
+        queue.put(("error", str(e)))
+
+class ExportWorker(QObject):
+    """Exécute un export PDF dans un processus séparé et relaie sa progression"""
+    progress = pyqtSignal(int, int)
+    finished = pyqtSignal(str)
+    failed = pyqtSignal(str)
+    canceled = pyqtSignal()
+
+    def __init__(self, export_func, args, parent=None):
+        super().__init__(parent)
+        context = multiprocessing.get_context("spawn")
+        self._queue = context.Queue()
+        self._cancel_event = context.Event()
+        self._process = context.Process(target=_run_export,
+                                        args=(export_func, args, self._queue, self._cancel_event),
+                                        daemon=True)
+        self._timer = QTimer(self)
+        self._timer.setInterval(100)
+        self._timer.timeout.connect(self._poll)
+
+    def start(self):
+        self._process.start()
+        self._timer.start()
+
+    def cancel(self):
+        self._cancel_event.set()
+
+    def _poll(self):
+        while not self._queue.empty():
+            message = self._queue.get_nowait()
+            if message[0] == "progress":
+                self.progress.emit(message[1], message[2])
+            else:
+                self._stop()
+                if message[0] == "done":
+                    self.finished.emit(message[1])
+                elif message[0] == "canceled":
+                    self.canceled.emit()
+                else:
+                    self.failed.emit(message[1])
+                return
+        if not self._process.is_alive() and self._queue.empty():
+            self._stop()
+            self.failed.emit(f"Le processus d'export s'est arrêté (code {self._process.exitcode})")
+
+    def _stop(self):
+        self._timer.stop()
+        self._process.join(1)
+
+class SauvegardeRelancee(Exception):
+    pass
+
+def _rotation_sauvegardes(dossier, base, generations):
+    """Supprime les sauvegardes de la base au-delà des generations plus récentes"""
+    motif = re.compile(re.escape(base) + r"-\d{8}-\d{6}\.db(\.gz)?$")
+    fichiers = sorted(f for f in os.listdir(dossier) if motif.match(f))
+    for fichier in fichiers[:-generations]:
+        os.remove(os.path.join(dossier, fichier))
+
+def _copier_archives(source, dossier, fichiers):
+    """Copie dans dossier les archives annuelles nouvelles ou modifiées depuis la dernière sauvegarde.
+
+    Les chemins du registre sont relatifs au dossier de la base: une sauvegarde restaurée dans
+    dossier y retrouve ses archives. Une archive déjà copiée (même taille, même date) ne l'est plus.
+    """
+    origine = os.path.dirname(os.path.abspath(source))
+    for fichier in fichiers:
+        chemin_source = os.path.join(origine, fichier)
+        chemin_copie = os.path.join(dossier, fichier)
+        try:
+            etat = os.stat(chemin_source)
+        except OSError as e:
+            print(f"Archive {fichier} non sauvegardée: {e}")
+            continue
+        if os.path.exists(chemin_copie):
+            copie = os.stat(chemin_copie)
+            if copie.st_size == etat.st_size and int(copie.st_mtime) == int(etat.st_mtime):
+                continue
+        shutil.copy2(chemin_source, chemin_copie + ".tmp")
+        os.replace(chemin_copie + ".tmp", chemin_copie)
+
+def sauvegarder_base(source, dossier, generations=7, compresser=False, pages=256, pause=0.01, relances=5):
+    """Sauvegarde en ligne de la base source dans dossier et renvoie le chemin du fichier créé.
+
+    La copie avance par lots de pages avec une pause entre deux lots: chaque lot ne tient
+    qu'un bref verrou de lecture, l'interface et les écritures continuent pendant la copie.
+    Une écriture venant d'une autre connexion relance la copie; si elle piétine plus de
+    relances fois, la base est copiée d'un seul tenant. La copie n'est retenue qu'après PRAGMA integrity_check.
+    Les fichiers des années archivées sont copiés à côté des sauvegardes (_copier_archives).
+    """
+    base = os.path.splitext(os.path.basename(source))[0]
+    os.makedirs(dossier, exist_ok=True)
+    chemin = os.path.join(dossier, f"{base}-{datetime.now():%Y%m%d-%H%M%S}.db")
+    # Copie puis, si compresser, version gzip: tous deux effacés en cas d'échec
+    temporaires = [chemin + ".tmp"]
+    restant = [None, 0]
+
+    def progression(status, remaining, total):
+        # remaining ne diminue plus quand SQLite recommence la copie après une écriture concurrente
+        if restant[0] is not None and remaining >= restant[0]:
+            restant[1] += 1
+            if restant[1] > relances:
+                raise SauvegardeRelancee()
+        restant[0] = remaining
+        time.sleep(pause)
+
+    try:
+        src = sqlite3.connect(source, timeout=30)
+        dst = sqlite3.connect(temporaires[0])
+        try:
+            try:
+                src.backup(dst, pages=pages, progress=progression)
+            except SauvegardeRelancee:
+                src.backup(dst)
+            resultat = [row[0] for row in dst.execute("PRAGMA integrity_check")]
+            if resultat != ["ok"]:
+                raise sqlite3.DatabaseError("Sauvegarde corrompue: " + "; ".join(resultat[:5]))
+            # Registre de la copie: celui que retrouvera une restauration
+            archives = [row[0] for row in dst.execute("SELECT fichier FROM archives_annuelles")]
+        finally:
+            dst.close()
+            src.close()
+        if compresser:
+            chemin += ".gz"
+            temporaires.append(chemin + ".tmp")
+            with open(temporaires[0], "rb") as entree, gzip.open(temporaires[1], "wb") as sortie:
+                shutil.copyfileobj(entree, sortie)
+            os.remove(temporaires[0])
+        os.replace(temporaires[-1], chemin)
+    except BaseException:
+        for temporaire in temporaires:
+            if os.path.exists(temporaire):
+                os.remove(temporaire)
+        raise
+    _copier_archives(source, dossier, archives)
+    _rotation_sauvegardes(dossier, base, max(1, generations))
+    return chemin
+
+TACHE_INTERROMPUE = "interrompu (budget épuisé)"
+
+def _pages_base(conn):
+    return conn.execute("PRAGMA page_count").fetchone()[0], conn.execute("PRAGMA freelist_count").fetchone()[0]
+
+def convertir_auto_vacuum(source):
+    """Passe une fois pour toutes une base en auto_vacuum NONE ou FULL en INCREMENTAL; True si convertie.
+
+    Le VACUUM complet n'a pas de budget et verrouille la base: il est lancé au démarrage,
+    avant l'ouverture de l'interface, et jamais par la maintenance planifiée.
+    """
+    if not os.path.exists(source):
+        return False
+    conn = sqlite3.connect(source, timeout=30)
+    try:
+        if conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 2:
+            return False
+        conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+        conn.execute("VACUUM")
+        return True
+    finally:
+        conn.close()
+
+def maintenir_base(source, budget=5.0, lot_vacuum=256, pause=0.01):
+    """Maintenance de la base source: ANALYZE, PRAGMA optimize, incremental_vacuum et integrity_check.
+
+    Chaque tâche dispose de budget secondes: ANALYZE et integrity_check sont interrompus au-delà,
+    l'incremental_vacuum libère lot_vacuum pages par transaction, avec une pause entre deux lots,
+    jusqu'à épuisement des pages libres ou du budget, si la base est en auto_vacuum INCREMENTAL
+    (convertir_auto_vacuum). Renvoie le rapport: tailles et pages libres avant/après, puis
+    (tâche, durée, résultat) par tâche.
+    """
+    debut = time.perf_counter()
+    conn = sqlite3.connect(source, timeout=30)
+    echeance = [0.0]
+    taille_page = conn.execute("PRAGMA page_size").fetchone()[0]
+    pages, libres = _pages_base(conn)
+    rapport = {"date": datetime.now().isoformat(timespec="seconds"), "taille_avant": pages * taille_page,
+               "pages_libres_avant": libres, "taches": []}
+
+    def tache(nom, fonction):
+        echeance[0] = time.perf_counter() + budget
+        t0 = time.perf_counter()
+        try:
+            resultat = fonction()
+        except sqlite3.OperationalError as e:
+            if str(e) != "interrupted":
+                raise
+            resultat = TACHE_INTERROMPUE
+        rapport["taches"].append((nom, time.perf_counter() - t0, resultat))
+
+    def analyse():
+        # ANALYZE complet: un échantillon (analysis_limit) sous-estime les années et dégrade les plans
+        conn.execute("ANALYZE")
+        conn.commit()
+        return "ok"
+
+    def optimise():
+        conn.execute("PRAGMA optimize").fetchall()
+        return "ok"
+
+    def vacuum_incremental():
+        liberees = 0
+        while _pages_base(conn)[1] and time.perf_counter() < echeance[0]:
+            avant = _pages_base(conn)[1]
+            # Un pas de VM par page rendue, sans colonne de résultat: execute() s'arrêterait après la première
+            conn.executescript(f"PRAGMA incremental_vacuum({int(lot_vacuum)});")
+            liberees += avant - _pages_base(conn)[1]
+            time.sleep(pause)
+        return f"{liberees} pages rendues"
+
+    def verification():
+        erreurs = [row[0] for row in conn.execute("PRAGMA integrity_check")]
+        return "ok" if erreurs == ["ok"] else "; ".join(erreurs[:5])
+
+    try:
+        # Appelé toutes les 10000 instructions de la VM: une valeur vraie interrompt la requête
+        conn.set_progress_handler(lambda: time.perf_counter() > echeance[0], 10000)
+        tache("analyze", analyse)
+        tache("optimize", optimise)
+        tache("incremental_vacuum", vacuum_incremental)
+        tache("integrity_check", verification)
+        pages, libres = _pages_base(conn)
+        conn.execute("INSERT OR REPLACE INTO parametres (cle, valeur) VALUES ('derniere_maintenance', ?)",
+                     (rapport["date"],))
+        conn.commit()
+    finally:
+        conn.close()
+    rapport["taille_apres"] = pages * taille_page
+    rapport["pages_libres_apres"] = libres
+    rapport["duree"] = time.perf_counter() - debut
+    return rapport
+
+class TachePeriodique(QObject):
+    """Tâche exécutée périodiquement dans un thread dédié, résultats relayés au thread de l'interface.
+
+    tache(parametres) est appelée dans le thread avec une copie des réglages; parametres["intervalle"]
+    est en minutes, 0 pour une tâche lancée seulement à la demande.
+    """
+    finished = pyqtSignal(object)
+    failed = pyqtSignal(str)
+
+    def __init__(self, tache, parametres, parent=None):
+        super().__init__(parent)
+        self._tache = tache
+        self._parametres = dict(parametres)
+        self._commandes = Queue()
+        self._resultats = Queue()
+        self._thread = threading.Thread(target=self._boucle, daemon=True)
+        self._timer = QTimer(self)
+        self._timer.setInterval(500)
+        self._timer.timeout.connect(self._poll)
+
+    def start(self):
+        self._thread.start()
+        self._timer.start()
+
+    def executer_maintenant(self):
+        self._commandes.put("executer")
+
+    def configurer(self, parametres):
+        """Nouveaux réglages; l'échéance suivante est recalculée à partir de maintenant"""
+        self._commandes.put(("configurer", dict(parametres)))
+
+    def stop(self):
+        self._timer.stop()
+        if self._thread.is_alive():
+            self._commandes.put("arreter")
+            self._thread.join()
+
+    def _attente(self):
+        intervalle = self._parametres["intervalle"]
+        return intervalle * 60 if intervalle > 0 else None
+
+    def _report(self):
+        """Secondes dont repousser une exécution planifiée arrivée à échéance (0: pas de report)"""
+        return 0
+
+    def _boucle(self):
+        attente = self._attente()
+        while True:
+            try:
+                commande = self._commandes.get(timeout=attente)
+            except Empty:
+                attente = self._report()
+                if attente > 0:
+                    continue
+                commande = "executer"
+            if commande == "arreter":
+                return
+            if isinstance(commande, tuple):
+                self._parametres = commande[1]
+            else:
+                try:
+                    self._resultats.put(("done", self._tache(dict(self._parametres))))
+                except (sqlite3.Error, OSError) as e:
+                    self._resultats.put(("error", str(e)))
+            attente = self._attente()
+
+    def _poll(self):
+        while not self._resultats.empty():
+            message = self._resultats.get_nowait()
+            if message[0] == "done":
+                self.finished.emit(message[1])
+            else:
+                self.failed.emit(message[1])
+
+class SauvegardeAuto(TachePeriodique):
+    """Sauvegardes périodiques de la base (sauvegarder_base)"""
+    def __init__(self, source, parametres, parent=None):
+        super().__init__(lambda p: sauvegarder_base(source, p["dossier"], p["generations"], p["compresser"]),
+                         parametres, parent)
+
+class MaintenanceAuto(TachePeriodique):
+    """Maintenance périodique de la base (maintenir_base), repoussée tant que la base vient d'être modifiée"""
+    def __init__(self, source, parametres, parent=None):
+        super().__init__(lambda p: maintenir_base(source, p["budget"]), parametres, parent)
+        self._source = source
+
+    def _attente(self):
+        # Échéance comptée depuis la dernière maintenance enregistrée: les sessions courtes en profitent aussi
+        attente = super()._attente()
+        if attente is None:
+            return None
+        try:
+            conn = sqlite3.connect(self._source, timeout=30)
+            try:
+                row = conn.execute("SELECT valeur FROM parametres WHERE cle='derniere_maintenance'").fetchone()
+            finally:
+                conn.close()
+        except sqlite3.Error:
+            return attente
+        if row is None:
+            return 0
+        ecoule = (datetime.now() - datetime.fromisoformat(row[0])).total_seconds()
+        return max(0, attente - ecoule)
+
+    def _report(self):
+        # La date de modification du fichier suit les écritures de toutes les connexions
+        inactive_depuis = time.time() - os.path.getmtime(self._source)
+        return max(0, self._parametres["inactivite"] - inactive_depuis)
+
+def _rapport(methode):
+    """Slot qui construit un rapport: une archive inaccessible l'abandonne avec un message.
+
+    Les arguments des signaux (index, état coché) sont ignorés, les rapports n'en prennent pas.
+    """
+    @functools.wraps(methode)
+    def enveloppe(self, *_):
+        try:
+            return methode(self)
+        except ArchiveInaccessible as e:
+            QMessageBox.warning(self, "Archive inaccessible",
+                                f"{e}\n\nReplacez le fichier d'archive à côté de la base.")
+    return enveloppe
+
+class MainWindow(QMainWindow):
+    # Boîtes de dialogue modales: leur durée serait celle de l'utilisateur
+    VUES_NON_MESUREES = ("show_login", "show_sauvegardes", "show_maintenance")
+
+    def __init__(self, en_memoire=False, profil=False):
         super().__init__()
-        self.setWindowTitle("e-Note")
+        self.setWindowTitle("e-Note (mode mémoire)" if en_memoire else "e-Note")
         self.setMinimumSize(1200, 800)
 
         self.setWindowIcon(QIcon("logo.ico"))
 
-        self.db = Database()
+        # Conversion unique avant l'ouverture de la base: son VACUUM complet la verrouille entièrement.
+        # Pas avant la reprise d'un journal du mode mémoire, qui n'est rejoué que sur un fichier inchangé
+        try:
+            if Database.ecritures_a_reprendre(DB_FILE):
+                print("Conversion en auto_vacuum INCREMENTAL reportée: écritures du mode mémoire à reprendre")
+            elif convertir_auto_vacuum(DB_FILE):
+                print("Base convertie en auto_vacuum INCREMENTAL")
+        except sqlite3.Error as e:
+            print(f"Conversion en auto_vacuum INCREMENTAL reportée: {e}")
+        self.db = Database(en_memoire=en_memoire)
+        if profil:
+            self.db.activer_profilage()
+        self.chart_cache = ChartCache()
+        self.exports = []
+        self.derniere_sauvegarde = None
+        self.sauvegardes = SauvegardeAuto(self.db.filename, self.db.get_parametres_sauvegarde(), self)
+        self.sauvegardes.finished.connect(self._sauvegarde_terminee)
+        self.sauvegardes.failed.connect(self._sauvegarde_echouee)
+        self.sauvegardes.start()
+        QApplication.instance().aboutToQuit.connect(self.sauvegardes.stop)
+        self.dernier_rapport_maintenance = None
+        self.maintenance = MaintenanceAuto(self.db.filename, {"intervalle": 24 * 60, "budget": 5.0, "inactivite": 120},
+                                           self)
+        self.maintenance.finished.connect(self._maintenance_terminee)
+        self.maintenance.failed.connect(self._maintenance_echouee)
+        if en_memoire:
+            # Les écritures sont déjà dans le journal: la recopie périodique borne sa taille et le temps de reprise
+            self.recopie_timer = QTimer(self)
+            self.recopie_timer.setInterval(30000)
+            self.recopie_timer.timeout.connect(self.recopier_sur_disque)
+            self.recopie_timer.start()
+            QApplication.instance().aboutToQuit.connect(self.recopier_sur_disque)
+        else:
+            # En mode mémoire, la recopie réécrit le fichier: la maintenance se fait en session normale
+            self.maintenance.start()
+            QApplication.instance().aboutToQuit.connect(self.maintenance.stop)
+        if profil:
+            # En dernier: l'arrêt des tâches et la recopie passent avant l'export
+            QApplication.instance().aboutToQuit.connect(self.exporter_profil)
+        # Avant _init_ui: les boutons du menu se connectent aux méthodes mesurées
+        self.mesures = MesuresInterface()
+        self.mesures.instrumenter(self, [nom for nom in dir(self) if nom.startswith(("show_", "load_"))
+                                         and nom not in self.VUES_NON_MESUREES])
         self._init_ui()
+        self._signaler_reprise_journal()
+
+    def _signaler_reprise_journal(self):
+        reprise = self.db.reprise_journal
+        if reprise is None:
+            return
+        message = (f"{reprise['rejouees']} écriture(s) sur {reprise['ecritures']} d'une session en mode mémoire "
+                   "interrompue ont été appliquées à la base.")
+        if reprise["echecs"]:
+            message += "\n\nÉcritures ignorées:\n" + "\n".join(reprise["echecs"][:10])
+        if reprise["mis_de_cote"]:
+            if not reprise["rejouees"] and not reprise["echecs"]:
+                message = (f"{reprise['ecritures']} écriture(s) d'une session en mode mémoire interrompue n'ont pas "
+                           "été appliquées: la base a été modifiée depuis leur saisie.")
+            message += f"\n\nJournal conservé: {reprise['mis_de_cote']}"
+            QMessageBox.warning(self, "Reprise des écritures", message)
+        else:
+            QMessageBox.information(self, "Reprise des écritures", message)
         
     def _init_ui(self):
         central = QWidget()
@@ -681,6 +3954,10 @@ class MainWindow(QMainWindow):
         
         title = QLabel("<h1 style='color: #2c3e50;'>Gestion des Notes</h1>")
         title.setAlignment(Qt.AlignLeft)
+        # Panneau de diagnostic: double-clic sur le titre ou Ctrl+Maj+D
+        self.titre = title
+        title.installEventFilter(self)
+        QShortcut(QKeySequence("Ctrl+Shift+D"), self, self.show_diagnostics)
         
         
         self.logout_btn = QPushButton("Déconnexion")
@@ -702,9 +3979,31 @@ class MainWindow(QMainWindow):
             }
         """)
         self.logout_btn.clicked.connect(self.logout)
+
+        btn_sauvegardes = QPushButton("Sauvegardes")
+        btn_maintenance = QPushButton("Maintenance")
+        style_outils = """
+            QPushButton {
+                background-color: #7f8c8d;
+                color: white;
+                font-weight: bold;
+                padding: 8px 16px;
+                border: none;
+                border-radius: 4px;
+            }
+            QPushButton:hover {
+                background-color: #707b7c;
+            }
+        """
+        btn_sauvegardes.setStyleSheet(style_outils)
+        btn_maintenance.setStyleSheet(style_outils)
+        btn_sauvegardes.clicked.connect(self.show_sauvegardes)
+        btn_maintenance.clicked.connect(self.show_maintenance)
         
         header_layout.addWidget(title)
         header_layout.addStretch()
+        header_layout.addWidget(btn_sauvegardes)
+        header_layout.addWidget(btn_maintenance)
         header_layout.addWidget(self.logout_btn)
         
         layout.addLayout(header_layout)
@@ -716,8 +4015,12 @@ class MainWindow(QMainWindow):
         btn_notes = QPushButton("Gestion des Notes")
         btn_edition_bulletin = QPushButton("Édition Bulletin")
         btn_classement = QPushButton("Classement par ordre")
+        btn_stats_matieres = QPushButton("Statistiques par matière")
+        btn_tendances = QPushButton("Tendances")
+        btn_simulation = QPushButton("Simulation")
 
-        menu_buttons = [btn_accueil, btn_etudiants, btn_matieres, btn_notes, btn_edition_bulletin, btn_classement]
+        menu_buttons = [btn_accueil, btn_etudiants, btn_matieres, btn_notes, btn_edition_bulletin, btn_classement,
+                        btn_stats_matieres, btn_tendances, btn_simulation]
         
         for button in menu_buttons:
             button.setStyleSheet("""
@@ -744,6 +4047,9 @@ class MainWindow(QMainWindow):
         btn_notes.clicked.connect(self.show_notes)
         btn_edition_bulletin.clicked.connect(self.show_edition_bulletin)
         btn_classement.clicked.connect(self.show_classement)
+        btn_stats_matieres.clicked.connect(self.show_statistiques_matieres)
+        btn_tendances.clicked.connect(self.show_tendances)
+        btn_simulation.clicked.connect(self.show_simulation)
 
         for b in menu_buttons:
             menu_layout.addWidget(b)
@@ -769,6 +4075,77 @@ class MainWindow(QMainWindow):
             
             self.show_login()
 
+    def exporter_profil(self):
+        """Profil des requêtes de la session, à joindre aux rapports d'anomalie"""
+        if self.db.profileur is None:
+            return
+        chemin = os.path.join(os.path.dirname(os.path.abspath(self.db.filename)),
+                              f"profil-{datetime.now():%Y%m%d-%H%M%S}.json")
+        try:
+            print(f"Profil des requêtes enregistré: {self.db.profileur.exporter_json(chemin)}")
+        except OSError as e:
+            print(f"Profil des requêtes non enregistré: {e}")
+
+    def recopier_sur_disque(self):
+        if not self.db.ecritures_en_attente() or not self.recopie_timer.isActive():
+            return
+        try:
+            self.db.ecrire_sur_disque()
+        except ModificationConcurrente as e:
+            self.recopie_timer.stop()
+            print(f"Recopie sur disque refusée: {e}")
+            QMessageBox.warning(self, "Mode mémoire",
+                                f"{e}\n\nLa base en mémoire n'est plus recopiée, pour ne pas effacer ses "
+                                "modifications. Les saisies de cette session restent dans le journal des écritures, "
+                                "qui sera mis de côté sans être appliqué à la prochaine ouverture: le fichier a "
+                                "changé depuis. Fermez l'autre programme puis relancez e-Note.")
+        except sqlite3.Error as e:
+            print(f"Recopie sur disque impossible, écritures conservées dans le journal: {e}")
+
+    def show_sauvegardes(self):
+        dialog = SauvegardeDialog(self.db.get_parametres_sauvegarde(), self.sauvegardes.executer_maintenant,
+                                  self.derniere_sauvegarde, self)
+        if dialog.exec_() == QDialog.Accepted:
+            parametres = dialog.parametres()
+            self.db.save_parametres_sauvegarde(parametres)
+            self.sauvegardes.configurer(parametres)
+
+    def _sauvegarde_terminee(self, chemin):
+        self.derniere_sauvegarde = f"Dernière sauvegarde: {chemin} ({datetime.now():%d/%m/%Y %H:%M})"
+        self.statusBar().showMessage(self.derniere_sauvegarde, 10000)
+
+    def _sauvegarde_echouee(self, message):
+        QMessageBox.warning(self, "Sauvegarde", f"La sauvegarde a échoué: {message}")
+
+    def show_maintenance(self):
+        if self.db.en_memoire:
+            QMessageBox.information(self, "Maintenance",
+                                    "La maintenance n'est pas disponible en mode mémoire: "
+                                    "relancez l'application sans --memoire.")
+            return
+        dialog = MaintenanceDialog(self.dernier_rapport_maintenance, self.maintenance.executer_maintenant, self)
+        self.maintenance.finished.connect(dialog.afficher)
+        dialog.exec_()
+        self.maintenance.finished.disconnect(dialog.afficher)
+
+    def _maintenance_terminee(self, rapport):
+        self.dernier_rapport_maintenance = rapport
+        print(f"Maintenance: {rapport['taille_avant'] // 1024} Ko -> {rapport['taille_apres'] // 1024} Ko, "
+              f"pages libres {rapport['pages_libres_avant']} -> {rapport['pages_libres_apres']}, "
+              f"{rapport['duree']:.2f} s")
+        for nom, duree, resultat in rapport["taches"]:
+            if nom == "integrity_check" and resultat not in ("ok", TACHE_INTERROMPUE):
+                QMessageBox.warning(self, "Maintenance", f"Contrôle d'intégrité: {resultat}")
+
+    def _maintenance_echouee(self, message):
+        print(f"Maintenance interrompue: {message}")
+
+    def eventFilter(self, objet, event):
+        if objet is self.titre and event.type() == QEvent.MouseButtonDblClick:
+            self.show_diagnostics()
+            return True
+        return super().eventFilter(objet, event)
+
     def show_login(self):
         """Affiche la fenêtre de login"""
         login = LoginDialog()
@@ -1027,15 +4404,35 @@ class MainWindow(QMainWindow):
         except:
             return "N/A"
 
+    @_rapport
     def refresh_statistics(self):
         annee = self.accueil_annee.value()
         niveau = self.accueil_niveau.currentText()
         if niveau == "Tous les niveaux":
             niveau = None
         
+        key = (annee, niveau, self.db.get_data_version())
+        cached = self.chart_cache.get(key)
+        if cached is not None:
+            pixmap, statistics = cached
+            self.stats_widget.show_pixmap(pixmap)
+            return
+        
         statistics = self.db.get_statistics(annee=annee, niveau=niveau)
+        t0 = time.perf_counter()
         self.stats_widget.plot_statistics(statistics)
-
+        pixmap = self.stats_widget.render_pixmap()
+        self.mesures.ajouter("plot_statistics", time.perf_counter() - t0)
+        self.chart_cache.put(key, pixmap, statistics)
+
+    def cached_statistics(self, annee, niveau):
+        key = (annee, niveau, self.db.get_data_version())
+        cached = self.chart_cache.get(key)
+        if cached is not None:
+            return cached[1]
+        return self.db.get_statistics(annee=annee, niveau=niveau)
+
+    @_rapport
     def export_statistics_pdf(self):
         annee = self.accueil_annee.value()
         niveau = self.accueil_niveau.currentText()
@@ -1047,50 +4444,61 @@ class MainWindow(QMainWindow):
             return
         
         try:
-            statistics = self.db.get_statistics(annee=annee, niveau=(niveau if niveau != "Tous les niveaux" else None))
+            statistics = self.cached_statistics(annee, niveau if niveau != "Tous les niveaux" else None)
             
             if sum([statistics['admis'], statistics['redoublant'], statistics['exclus'], statistics['sans_notes']]) == 0:
                 QMessageBox.warning(self, "Attention", "Aucune donnée disponible pour l'export.")
                 return
             
-            with PdfPages(filename) as pdf:
-                plt.figure(figsize=(12, 6))
-                
-                labels = ['Admis', 'Redoublant', 'Exclus', 'Sans notes']
-                sizes = [
-                    statistics['admis'],
-                    statistics['redoublant'], 
-                    statistics['exclus'],
-                    statistics['sans_notes']
-                ]
-                colors = ['#2ecc71', '#f39c12', '#e74c3c', '#95a5a6']
-                
-                plt.subplot(121)
-                bars = plt.bar(labels, sizes, color=colors)
-                plt.title('Nombre d\'étudiants par statut')
-                plt.ylabel('Nombre d\'étudiants')
-                plt.xlabel('Statut')
-                
-                for bar, value in zip(bars, sizes):
-                    plt.text(bar.get_x() + bar.get_width()/2, bar.get_height() + 0.1,
-                            f'{value}', ha='center', va='bottom')
-                
-                plt.subplot(122)
-                explode = (0.1, 0, 0, 0)
-                plt.pie(sizes, explode=explode, labels=labels, colors=colors, autopct='%1.1f%%',
-                        shadow=True, startangle=90)
-                plt.axis('equal')
-                plt.title('Répartition des étudiants par statut')
-                
-                plt.suptitle(f'Statistiques des étudiants - Année {annee}', fontsize=16, fontweight='bold')
-                plt.tight_layout()
-                pdf.savefig()
-                plt.close()
-            
-            QMessageBox.information(self, "Succès", f"Statistiques exportées: {filename}")
+            self.start_export(export_statistics_pdf_file, (filename, statistics, annee),
+                              f"Statistiques exportées: {filename}")
         except Exception as e:
             QMessageBox.critical(self, "Erreur", f"Erreur lors de l'export: {str(e)}")
 
+    def start_export(self, export_func, args, success_message):
+        progress = QProgressDialog("Export en cours...", "Annuler", 0, 0, self)
+        progress.setWindowTitle("Export PDF")
+        progress.setMinimumDuration(0)
+        progress.setAutoClose(False)
+        progress.setAutoReset(False)
+
+        worker = ExportWorker(export_func, args, self)
+        self.exports.append(worker)
+        debut = time.perf_counter()
+
+        def on_progress(done, total):
+            progress.setMaximum(total)
+            progress.setValue(done)
+
+        def on_end():
+            progress.close()
+            self.exports.remove(worker)
+            worker.deleteLater()
+
+        def on_finished(filename):
+            on_end()
+            self.mesures.ajouter(export_func.__name__, time.perf_counter() - debut)
+            QMessageBox.information(self, "Succès", success_message)
+
+        def on_failed(message):
+            on_end()
+            QMessageBox.critical(self, "Erreur", f"Erreur lors de l'export: {message}")
+
+        worker.progress.connect(on_progress)
+        worker.finished.connect(on_finished)
+        worker.failed.connect(on_failed)
+        worker.canceled.connect(on_end)
+        progress.canceled.connect(worker.cancel)
+        progress.show()
+        worker.start()
+
+    def _annee_archivee(self, annee):
+        """Prévient que annee est archivée (et donc en lecture seule); True dans ce cas"""
+        if annee in self.db.get_annees_archivees():
+            QMessageBox.warning(self, "Erreur", f"L'année {annee} est archivée: elle n'est plus modifiable.")
+            return True
+        return False
+
     def clear_student_form(self):
         self.input_ninsc.clear()
         self.input_nom.clear()
@@ -1103,7 +4511,7 @@ class MainWindow(QMainWindow):
         self.input_coef.setValue(1.0)
 
     def clear_note_form(self):
-        self.notes_ninsc.setCurrentIndex(0)
+        self.notes_ninsc.clear()
         self.notes_annee.setValue(datetime.now().year)
         self.notes_matiere.setCurrentIndex(0)
         self.notes_val.setValue(0.0)
@@ -1190,6 +4598,34 @@ class MainWindow(QMainWindow):
         filter_layout.addWidget(btn_filter)
         v.addLayout(filter_layout)
 
+        promotion = QGroupBox("Opérations sur la promotion")
+        promotion.setStyleSheet(form.styleSheet())
+        p_layout = QHBoxLayout()
+        promotion.setLayout(p_layout)
+        self.promotion_annee = QSpinBox()
+        self.promotion_annee.setRange(2000, 2100)
+        self.promotion_annee.setValue(datetime.now().year)
+        self.promotion_niveau = QComboBox()
+        self.promotion_niveau.addItems(["Tous les niveaux"] + NIVEAUX)
+        self.promotion_redoublants = QCheckBox("Redoublants inclus")
+        btn_passage = QPushButton("Passage à l'année suivante")
+        btn_supprimer_promotion = QPushButton("Supprimer la promotion")
+        btn_archiver_annee = QPushButton("Archiver l'année")
+
+        self._style_button(btn_passage, "#27ae60")
+        self._style_button(btn_supprimer_promotion, "#e74c3c", True)
+        self._style_button(btn_archiver_annee, "#7f8c8d")
+
+        p_layout.addWidget(QLabel("Année:"))
+        p_layout.addWidget(self.promotion_annee)
+        p_layout.addWidget(QLabel("Niveau:"))
+        p_layout.addWidget(self.promotion_niveau)
+        p_layout.addWidget(self.promotion_redoublants)
+        p_layout.addWidget(btn_passage)
+        p_layout.addWidget(btn_supprimer_promotion)
+        p_layout.addWidget(btn_archiver_annee)
+        v.addWidget(promotion)
+
         self.tbl_students = QTableWidget()
         self.tbl_students.setColumnCount(4)
         self.tbl_students.setHorizontalHeaderLabels(["N° Inscription", "Nom", "Niveau", "Année"])
@@ -1215,6 +4651,9 @@ class MainWindow(QMainWindow):
         btn_delete.clicked.connect(self.delete_student)
         btn_search.clicked.connect(self.search_student)
         btn_filter.clicked.connect(self.filter_students)
+        btn_passage.clicked.connect(self.passage_promotion)
+        btn_supprimer_promotion.clicked.connect(self.supprimer_promotion)
+        btn_archiver_annee.clicked.connect(self.archiver_annee)
         self.tbl_students.cellDoubleClicked.connect(self.fill_student_form_from_table)
         self.search_etudiant_input.returnPressed.connect(self.search_student)
 
@@ -1229,6 +4668,8 @@ class MainWindow(QMainWindow):
         if not n or not nom or niveau == "":
             QMessageBox.warning(self, "Erreur", "Veuillez remplir tous les champs.")
             return
+        if self._annee_archivee(annee):
+            return
         ok = self.db.add_etudiant(n, nom, niveau, annee)
         if not ok:
             QMessageBox.warning(self, "Erreur", "Étudiant déjà existant.")
@@ -1245,6 +4686,8 @@ class MainWindow(QMainWindow):
         if not n:
             QMessageBox.warning(self, "Erreur", "Entrez le N° d'inscription pour modifier.")
             return
+        if self._annee_archivee(annee):
+            return
         rows = self.db.update_etudiant(n, nom, niveau, annee)
         if rows:
             QMessageBox.information(self, "Succès", "Étudiant modifié.")
@@ -1282,6 +4725,80 @@ class MainWindow(QMainWindow):
             except Exception as e:
                 QMessageBox.critical(self, "Erreur", f"Erreur lors de la suppression : {str(e)}")
 
+    def _promotion_choisie(self):
+        niveau = self.promotion_niveau.currentText()
+        return self.promotion_annee.value(), None if niveau == "Tous les niveaux" else niveau
+
+    def passage_promotion(self):
+        annee, niveau = self._promotion_choisie()
+        redoublants = self.promotion_redoublants.isChecked()
+        try:
+            mouvements = self.db.promouvoir_promotion(annee, niveau, redoublants, simulation=True)
+        except ValueError as e:
+            QMessageBox.warning(self, "Erreur", str(e))
+            return
+        promotion = f"{niveau or 'tous niveaux'} {annee}"
+        dialog = ApercuDialog("Passage à l'année suivante",
+                              f"{len(mouvements)} étudiant(s) de {promotion} passeront en {annee + 1}.\n"
+                              "Les admis de M2, les exclus et les étudiants sans notes ne changent pas.",
+                              ["N° Inscription", "Nom", "Niveau", "Moyenne", "Observation",
+                               "Nouveau niveau", "Nouvelle année"],
+                              mouvements, "Appliquer", self)
+        if dialog.exec_() != QDialog.Accepted:
+            return
+        try:
+            mouvements = self.db.promouvoir_promotion(annee, niveau, redoublants)
+        except Exception as e:
+            QMessageBox.critical(self, "Erreur", f"Erreur lors du passage : {str(e)}")
+            return
+        QMessageBox.information(self, "Succès", f"{len(mouvements)} étudiant(s) passé(s) en {annee + 1}.")
+        self.load_students()
+
+    def supprimer_promotion(self):
+        annee, niveau = self._promotion_choisie()
+        try:
+            cohorte, nombre_notes = self.db.supprimer_promotion(annee, niveau, simulation=True)
+        except ValueError as e:
+            QMessageBox.warning(self, "Erreur", str(e))
+            return
+        promotion = f"{niveau or 'tous niveaux'} {annee}"
+        dialog = ApercuDialog("Supprimer la promotion",
+                              f"{len(cohorte)} étudiant(s) de {promotion} et {nombre_notes} note(s) "
+                              "seront supprimés définitivement.",
+                              ["N° Inscription", "Nom", "Niveau", "Moyenne", "Observation"],
+                              cohorte, "Supprimer", self)
+        if dialog.exec_() != QDialog.Accepted:
+            return
+        try:
+            cohorte, nombre_notes = self.db.supprimer_promotion(annee, niveau)
+        except Exception as e:
+            QMessageBox.critical(self, "Erreur", f"Erreur lors de la suppression : {str(e)}")
+            return
+        QMessageBox.information(self, "Succès",
+                                f"{len(cohorte)} étudiant(s) et {nombre_notes} note(s) supprimés définitivement.")
+        self.clear_student_form()
+        self.load_students()
+
+    def archiver_annee(self):
+        annee = self.promotion_annee.value()
+        reply = QMessageBox.question(self, "Archiver l'année",
+                                     f"Déplacer tous les étudiants et toutes les notes de {annee} "
+                                     "dans un fichier d'archive ?\n"
+                                     "L'année restera consultable dans les rapports mais ne sera plus modifiable.",
+                                     QMessageBox.Yes | QMessageBox.No,
+                                     QMessageBox.No)
+        if reply != QMessageBox.Yes:
+            return
+        try:
+            etudiants, notes = self.db.archiver_annee(annee)
+        except Exception as e:
+            QMessageBox.critical(self, "Erreur", f"Erreur lors de l'archivage : {str(e)}")
+            return
+        QMessageBox.information(self, "Succès",
+                                f"Année {annee} archivée: {etudiants} étudiant(s) et {notes} note(s) déplacé(s).")
+        self.clear_student_form()
+        self.load_students()
+
     def search_student(self):
         key = self.search_etudiant_input.text().strip()
         if not key:
@@ -1410,6 +4927,10 @@ class MainWindow(QMainWindow):
         filter_layout.addWidget(QLabel("Coef max:"))
         filter_layout.addWidget(self.filter_coef_max)
         filter_layout.addWidget(btn_filter_matiere)
+        btn_regles = QPushButton("Règles de délibération")
+        self._style_button(btn_regles, "#8e44ad")
+        btn_regles.clicked.connect(self.edit_regles)
+        filter_layout.addWidget(btn_regles)
         v.addLayout(filter_layout)
 
         self.tbl_matieres = QTableWidget()
@@ -1443,7 +4964,16 @@ class MainWindow(QMainWindow):
         self.view_layout.addWidget(container)
         self.load_matieres()
 
-    def add_matiere(self):
+    def edit_regles(self):
+        dialog = ReglesDialog(self.db.get_regles(), self.db.get_matieres(), self)
+        if dialog.exec_() == QDialog.Accepted:
+            try:
+                self.db.save_regles(dialog.regles())
+                QMessageBox.information(self, "Succès", "Règles de délibération enregistrées")
+            except Exception as e:
+                QMessageBox.critical(self, "Erreur", f"Erreur lors de l'enregistrement: {str(e)}")
+
+    def add_matiere(self):
         code = self.input_code.text().strip()
         lib = self.input_libelle.text().strip()
         coef = float(self.input_coef.value())
@@ -1571,9 +5101,7 @@ class MainWindow(QMainWindow):
         f_layout = QHBoxLayout()
         form.setLayout(f_layout)
 
-        self.notes_ninsc = QComboBox()
-        self.notes_ninsc.setEditable(True)
-        self.notes_ninsc.setInsertPolicy(QComboBox.NoInsert)
+        self.notes_ninsc = StudentPicker(self.db)
         self.notes_annee = QSpinBox()
         self.notes_annee.setRange(2000, 2100)
         self.notes_annee.setValue(datetime.now().year)
@@ -1632,6 +5160,15 @@ class MainWindow(QMainWindow):
         filter_layout.addWidget(QLabel("Niveau:"))
         filter_layout.addWidget(self.filter_notes_niveau)
         filter_layout.addWidget(btn_filter_notes)
+        btn_saisie_grille = QPushButton("Saisie en grille")
+        self._style_button(btn_saisie_grille, "#8e44ad")
+        btn_saisie_grille.clicked.connect(self.show_saisie_notes)
+        filter_layout.addWidget(btn_saisie_grille)
+        if not self.db.compact:
+            btn_format_compact = QPushButton("Format compact")
+            self._style_button(btn_format_compact, "#7f8c8d")
+            btn_format_compact.clicked.connect(self.migrer_format_compact)
+            filter_layout.addWidget(btn_format_compact)
         v.addLayout(filter_layout)
 
         self.tbl_notes = QTableWidget()
@@ -1666,20 +5203,225 @@ class MainWindow(QMainWindow):
         self.load_notes_combos()
         self.load_notes()
 
+    def show_saisie_notes(self):
+        self.clear_view()
+        container = QWidget()
+        v = QVBoxLayout()
+        container.setLayout(v)
+
+        title = QLabel("<h2 style='color: #2c3e50;'>Saisie des notes par matière</h2>")
+        title.setAlignment(Qt.AlignCenter)
+        v.addWidget(title)
+
+        filter_layout = QHBoxLayout()
+        self.saisie_annee = QSpinBox()
+        self.saisie_annee.setRange(2000, 2100)
+        self.saisie_annee.setValue(datetime.now().year)
+        self.saisie_niveau = QComboBox()
+        self.saisie_niveau.addItems(["Tous les niveaux", "L1", "L2", "L3", "M1", "M2"])
+        self.saisie_matiere = QComboBox()
+        for code, libelle, coef in self.db.get_matieres():
+            self.saisie_matiere.addItem(f"{code} - {libelle}", code)
+        btn_charger = QPushButton("Charger")
+        btn_enregistrer = QPushButton("Enregistrer")
+        btn_annuler = QPushButton("Annuler les modifications")
+        btn_retour = QPushButton("Retour aux notes")
+        self._style_button(btn_charger, "#3498db")
+        self._style_button(btn_enregistrer, "#2ecc71")
+        self._style_button(btn_annuler, "#95a5a6")
+        self._style_button(btn_retour, "#95a5a6")
+
+        filter_layout.addWidget(QLabel("Année:"))
+        filter_layout.addWidget(self.saisie_annee)
+        filter_layout.addWidget(QLabel("Niveau:"))
+        filter_layout.addWidget(self.saisie_niveau)
+        filter_layout.addWidget(QLabel("Matière:"))
+        filter_layout.addWidget(self.saisie_matiere)
+        filter_layout.addWidget(btn_charger)
+        v.addLayout(filter_layout)
+
+        self.tbl_saisie = GrilleSaisie()
+        self.tbl_saisie.setColumnCount(3)
+        self.tbl_saisie.setHorizontalHeaderLabels(["N° Inscription", "Nom", "Note /20"])
+        self.tbl_saisie.setEditTriggers(QtWidgets.QAbstractItemView.DoubleClicked
+                                        | QtWidgets.QAbstractItemView.EditKeyPressed
+                                        | QtWidgets.QAbstractItemView.AnyKeyPressed)
+        self.tbl_saisie.setStyleSheet("""
+            QTableWidget {
+                gridline-color: #bdc3c7;
+                border: 1px solid #bdc3c7;
+            }
+            QHeaderView::section {
+                background-color: #34495e;
+                color: white;
+                font-weight: bold;
+                padding: 6px;
+                border: 1px solid #2c3e50;
+            }
+        """)
+        self.tbl_saisie.itemChanged.connect(self.saisie_cellule_modifiee)
+        v.addWidget(self.tbl_saisie)
+
+        bottom_layout = QHBoxLayout()
+        self.lbl_saisie = QLabel("")
+        self.lbl_saisie.setStyleSheet("font-weight: bold; color: #2c3e50;")
+        bottom_layout.addWidget(self.lbl_saisie)
+        bottom_layout.addStretch()
+        bottom_layout.addWidget(btn_enregistrer)
+        bottom_layout.addWidget(btn_annuler)
+        bottom_layout.addWidget(btn_retour)
+        v.addLayout(bottom_layout)
+
+        btn_charger.clicked.connect(self.load_saisie)
+        btn_enregistrer.clicked.connect(self.enregistrer_saisie)
+        btn_annuler.clicked.connect(self.load_saisie)
+        btn_retour.clicked.connect(self.show_notes)
+
+        self.saisie_originales = {}
+        self.saisie_modifiees = {}
+        self.saisie_conflits = {}
+        self._saisie_chargement = False
+        self.view_layout.addWidget(container)
+        self.load_saisie()
+
+    def load_saisie(self):
+        self.saisie_cle = (self.saisie_matiere.currentData(), self.saisie_annee.value())
+        niveau = self.saisie_niveau.currentText()
+        lignes = []
+        if self.saisie_cle[0] is not None:
+            lignes = self.db.get_saisie(self.saisie_cle[1], niveau if niveau != "Tous les niveaux" else None,
+                                        self.saisie_cle[0])
+        self.saisie_originales = {n_insc: note for n_insc, nom, note in lignes}
+        self.saisie_modifiees = {}
+        self.saisie_conflits = {}
+
+        self._saisie_chargement = True
+        self.tbl_saisie.setRowCount(len(lignes))
+        for r, (n_insc, nom, note) in enumerate(lignes):
+            for c, valeur in enumerate((n_insc, nom)):
+                item = QTableWidgetItem(valeur)
+                item.setFlags(item.flags() & ~Qt.ItemIsEditable)
+                self.tbl_saisie.setItem(r, c, item)
+            self.tbl_saisie.setItem(r, 2, QTableWidgetItem("" if note is None else str(note)))
+        self._saisie_chargement = False
+        if lignes:
+            self.tbl_saisie.setCurrentCell(0, 2)
+        self._update_saisie_label()
+
+    def _update_saisie_label(self):
+        texte = f"{len(self.saisie_modifiees)} modification(s) non enregistrée(s)"
+        if self.saisie_conflits:
+            texte += f" - {len(self.saisie_conflits)} conflit(s)"
+        self.lbl_saisie.setText(texte)
+
+    def _marquer_cellule(self, item, n_insc):
+        font = item.font()
+        font.setBold(n_insc in self.saisie_modifiees)
+        item.setFont(font)
+        if n_insc in self.saisie_conflits:
+            actuelle = self.saisie_conflits[n_insc]
+            item.setBackground(QColor(231, 76, 60, 120))
+            item.setToolTip(f"Modifiée par un autre utilisateur, note actuelle: "
+                            f"{'aucune' if actuelle is None else actuelle}")
+        elif n_insc in self.saisie_modifiees:
+            item.setBackground(QColor(241, 196, 15, 120))
+            item.setToolTip("Modification non enregistrée")
+        else:
+            item.setBackground(QColor(0, 0, 0, 0))
+            item.setToolTip("")
+
+    def saisie_cellule_modifiee(self, item):
+        if self._saisie_chargement or item.column() != 2:
+            return
+        n_insc = self.tbl_saisie.item(item.row(), 0).text()
+        texte = item.text().strip().replace(",", ".")
+        try:
+            note = float(texte) if texte else None
+            if note is not None and not 0 <= note <= 20:
+                raise ValueError
+        except ValueError:
+            # Valeur refusée: on remet la dernière valeur valide sans ouvrir de boîte de dialogue
+            note = self.saisie_modifiees.get(n_insc, self.saisie_originales.get(n_insc))
+            self._saisie_chargement = True
+            item.setText("" if note is None else str(note))
+            self._saisie_chargement = False
+            self.lbl_saisie.setText(f"Note invalide pour {n_insc}: saisir une valeur entre 0 et 20")
+            return
+
+        if note == self.saisie_originales.get(n_insc) and n_insc not in self.saisie_conflits:
+            self.saisie_modifiees.pop(n_insc, None)
+        else:
+            self.saisie_modifiees[n_insc] = note
+        self._saisie_chargement = True
+        item.setText("" if note is None else str(note))
+        self._marquer_cellule(item, n_insc)
+        self._saisie_chargement = False
+        self._update_saisie_label()
+
+    def enregistrer_saisie(self):
+        if not self.saisie_modifiees:
+            QMessageBox.information(self, "Information", "Aucune modification à enregistrer.")
+            return
+        codeMat, annee = self.saisie_cle
+        modifications = [(n_insc, self.saisie_originales.get(n_insc), note)
+                         for n_insc, note in self.saisie_modifiees.items()]
+        try:
+            ecrites, conflits = self.db.enregistrer_saisie(codeMat, annee, modifications)
+        except Exception as e:
+            QMessageBox.critical(self, "Erreur", f"Erreur lors de l'enregistrement: {str(e)}")
+            return
+
+        conflits = dict(conflits)
+        enregistrees = [n for n in self.saisie_modifiees if n not in conflits]
+        for n_insc in enregistrees:
+            self.saisie_originales[n_insc] = self.saisie_modifiees.pop(n_insc)
+        # En conflit: la note en base devient la référence, la saisie reste en attente pour être confirmée
+        for n_insc, actuelle in conflits.items():
+            self.saisie_originales[n_insc] = actuelle
+        self.saisie_conflits = conflits
+
+        self._saisie_chargement = True
+        for r in range(self.tbl_saisie.rowCount()):
+            n_insc = self.tbl_saisie.item(r, 0).text()
+            self._marquer_cellule(self.tbl_saisie.item(r, 2), n_insc)
+        self._saisie_chargement = False
+        self._update_saisie_label()
+
+        if conflits:
+            QMessageBox.warning(self, "Conflits",
+                                f"{ecrites} note(s) enregistrée(s). {len(conflits)} note(s) modifiée(s) entre-temps "
+                                f"par un autre utilisateur n'ont pas été écrites (en rouge). "
+                                f"Enregistrez à nouveau pour confirmer votre saisie.")
+        else:
+            QMessageBox.information(self, "Succès", f"{ecrites} note(s) enregistrée(s)")
+
+    def migrer_format_compact(self):
+        reply = QMessageBox.question(self, "Format compact",
+                                     "Convertir la base au format compact des notes ?\n"
+                                     "Le fichier devient plus petit et les calculs de moyennes plus rapides; "
+                                     "les notes sont arrondies au centième. La conversion est définitive.",
+                                     QMessageBox.Yes | QMessageBox.No,
+                                     QMessageBox.No)
+        if reply != QMessageBox.Yes:
+            return
+        try:
+            migrees = self.db.migrer_format_compact()
+        except Exception as e:
+            QMessageBox.critical(self, "Erreur", f"Erreur lors de la conversion : {str(e)}")
+            return
+        QMessageBox.information(self, "Succès", f"Base convertie au format compact ({migrees} note(s)).")
+        self.show_notes()
+
     def load_notes_combos(self):
         self.notes_ninsc.clear()
         self.notes_matiere.clear()
         
-        etudiants = self.db.get_etudiants()
-        for n_insc, nom, niveau, annee in etudiants:
-            self.notes_ninsc.addItem(f"{n_insc} - {nom}", n_insc)
-        
         matieres = self.db.get_matieres()
         for code, libelle, coef in matieres:
             self.notes_matiere.addItem(f"{code} - {libelle}", code)
 
     def add_note(self):
-        if self.notes_ninsc.currentIndex() < 0 or self.notes_matiere.currentIndex() < 0:
+        if self.notes_ninsc.currentData() is None or self.notes_matiere.currentIndex() < 0:
             QMessageBox.warning(self, "Erreur", "Sélectionnez un étudiant et une matière.")
             return
         
@@ -1687,6 +5429,8 @@ class MainWindow(QMainWindow):
         codeMat = self.notes_matiere.currentData()
         annee = self.notes_annee.value()
         note = self.notes_val.value()
+        if self._annee_archivee(annee):
+            return
         
         try:
             note_id = self.db.add_note(codeMat, n_insc, annee, note)
@@ -1707,9 +5451,14 @@ class MainWindow(QMainWindow):
         
         note_id = int(self.tbl_notes.item(current_row, 0).text())
         n_insc = self.notes_ninsc.currentData()
+        if n_insc is None:
+            QMessageBox.warning(self, "Erreur", "Sélectionnez un étudiant.")
+            return
         codeMat = self.notes_matiere.currentData()
         annee = self.notes_annee.value()
         new_note = self.notes_val.value()
+        if self._annee_archivee(annee):
+            return
         
         rows = self.db.update_note(note_id, codeMat, n_insc, annee, new_note)
         if rows is None:
@@ -1731,9 +5480,7 @@ class MainWindow(QMainWindow):
         n_insc = etudiant_text.split(' - ')[0]
         code_matiere = matiere_text.split(' - ')[0]
         
-        idx_etudiant = self.notes_ninsc.findData(n_insc)
-        if idx_etudiant >= 0:
-            self.notes_ninsc.setCurrentIndex(idx_etudiant)
+        self.notes_ninsc.setCurrentData(n_insc)
         
         idx_matiere = self.notes_matiere.findData(code_matiere)
         if idx_matiere >= 0:
@@ -1823,9 +5570,7 @@ class MainWindow(QMainWindow):
         n_insc = etudiant_text.split(' - ')[0]
         code_matiere = matiere_text.split(' - ')[0]
         
-        idx_etudiant = self.notes_ninsc.findData(n_insc)
-        if idx_etudiant >= 0:
-            self.notes_ninsc.setCurrentIndex(idx_etudiant)
+        self.notes_ninsc.setCurrentData(n_insc)
         
         idx_matiere = self.notes_matiere.findData(code_matiere)
         if idx_matiere >= 0:
@@ -1846,9 +5591,7 @@ class MainWindow(QMainWindow):
 
         form_layout = QHBoxLayout()
         
-        self.bulletin_ninsc = QComboBox()
-        self.bulletin_ninsc.setEditable(True)
-        self.bulletin_ninsc.setInsertPolicy(QComboBox.NoInsert)
+        self.bulletin_ninsc = StudentPicker(self.db)
         self.bulletin_annee = QSpinBox()
         self.bulletin_annee.setRange(2000, 2100)
         self.bulletin_annee.setValue(datetime.now().year)
@@ -1890,46 +5633,73 @@ class MainWindow(QMainWindow):
         info_layout = QHBoxLayout()
         self.lbl_moyenne = QLabel("Moyenne: -")
         self.lbl_observation = QLabel("Observation: -")
+        self.lbl_rang = QLabel("Rang: -")
         self.lbl_moyenne.setStyleSheet("font-weight: bold; font-size: 14px; color: #2c3e50;")
         self.lbl_observation.setStyleSheet("font-weight: bold; font-size: 14px; color: #2c3e50;")
+        self.lbl_rang.setStyleSheet("font-weight: bold; font-size: 14px; color: #2c3e50;")
         
         info_layout.addWidget(self.lbl_moyenne)
         info_layout.addWidget(self.lbl_observation)
+        info_layout.addWidget(self.lbl_rang)
         info_layout.addStretch()
         
         v.addLayout(info_layout)
 
+        lot_group = QGroupBox("Bulletins de toute une classe")
+        lot_group.setStyleSheet("""
+            QGroupBox {
+                font-weight: bold;
+                border: 2px solid #bdc3c7;
+                border-radius: 5px;
+                margin-top: 1ex;
+                padding-top: 10px;
+            }
+            QGroupBox::title {
+                subcontrol-origin: margin;
+                left: 10px;
+                padding: 0 5px 0 5px;
+                color: #2c3e50;
+            }
+        """)
+        lot_layout = QHBoxLayout()
+        lot_group.setLayout(lot_layout)
+
+        self.lot_niveau = QComboBox()
+        self.lot_niveau.addItems(["Tous les niveaux", "L1", "L2", "L3", "M1", "M2"])
+        self.lot_mode = QComboBox()
+        self.lot_mode.addItems(["Un seul PDF", "Un PDF par étudiant"])
+        btn_lot = QPushButton("Générer les bulletins")
+        self._style_button(btn_lot, "#3498db")
+
+        lot_layout.addWidget(QLabel("Niveau:"))
+        lot_layout.addWidget(self.lot_niveau)
+        lot_layout.addWidget(QLabel("Sortie:"))
+        lot_layout.addWidget(self.lot_mode)
+        lot_layout.addWidget(btn_lot)
+        lot_layout.addStretch()
+        v.addWidget(lot_group)
+
         btn_generer.clicked.connect(self.generer_bulletin)
         btn_imprimer.clicked.connect(self.imprimer_bulletin)
+        btn_lot.clicked.connect(self.generer_bulletins_lot)
 
         self.view_layout.addWidget(container)
-        self.load_bulletin_combos()
 
-    def load_bulletin_combos(self):
-        self.bulletin_ninsc.clear()
-        etudiants = self.db.get_etudiants()
-        for n_insc, nom, niveau, annee in etudiants:
-            self.bulletin_ninsc.addItem(f"{n_insc} - {nom}", n_insc)
-
-    def observation_from_moyenne(self, moyenne):
-            if moyenne is None:
-                return "N/A"
-            if moyenne >= 10:
-                return "Admis"
-            if moyenne < 7.5:
-                return "Exclus"
-            return "Redoublant"
-    
+    @_rapport
     def generer_bulletin(self):
-        if self.bulletin_ninsc.currentIndex() < 0:
+        n_insc = self.bulletin_ninsc.currentData()
+        if n_insc is None:
             QMessageBox.warning(self, "Erreur", "Sélectionnez un étudiant.")
             return
-        
-        n_insc = self.bulletin_ninsc.currentData()
+
         annee = self.bulletin_annee.value()
         
-        notes = self.db.get_notes_for_student(n_insc, annee)
-        moyenne_data = self.db.calculate_average_for_student(n_insc, annee)
+        bulletin = next(self.db.get_notes_for_students([n_insc], annee), None)
+        if bulletin is None:
+            QMessageBox.warning(self, "Erreur", "Étudiant non trouvé.")
+            return
+        
+        etudiant, notes, moyenne_data = bulletin
         
         self.tbl_bulletin.setRowCount(0)
         total_coef = 0
@@ -1949,8 +5719,13 @@ class MainWindow(QMainWindow):
         if moyenne_data:
             moyenne, weighted_sum, total_coef_calc = moyenne_data
             self.lbl_moyenne.setText(f"Moyenne: {moyenne}/20")
-            observation = self.observation_from_moyenne(moyenne)  
+            observation = self.db.get_regles().observation(moyenne, notes)
             self.lbl_observation.setText(f"Observation: {observation}")
+            rang = self.db.rang_promotion(annee, etudiant, moyenne)
+            if rang:
+                self.lbl_rang.setText(f"Rang: {rang[0]}/{rang[1]} (percentile {rang[2]})")
+            else:
+                self.lbl_rang.setText("Rang: -")
             
             r = self.tbl_bulletin.rowCount()
             self.tbl_bulletin.insertRow(r)
@@ -1968,273 +5743,133 @@ class MainWindow(QMainWindow):
         else:
             self.lbl_moyenne.setText("Moyenne: Aucune note")
             self.lbl_observation.setText("Observation: N/A")
+            self.lbl_rang.setText("Rang: -")
     
-    def generate_bulletin_html(self, n_insc, nom, niveau, annee, notes, moyenne_data):
-        html = f"""
-        <!DOCTYPE html>
-        <html>
-        <head>
-            <meta charset="UTF-8">
-            <title>Bulletin de Notes</title>
-            <style>
-                body {{ font-family: Arial, sans-serif; margin: 20px; }}
-                .header {{ text-align: center; border-bottom: 2px solid #333; padding-bottom: 10px; margin-bottom: 20px; }}
-                .student-info {{ margin-bottom: 20px; }}
-                .table {{ width: 100%; border-collapse: collapse; margin-bottom: 20px; }}
-                .table th, .table td {{ border: 1px solid #ddd; padding: 8px; text-align: left; }}
-                .table th {{ background-color: #f2f2f2; font-weight: bold; }}
-                .summary {{ margin-top: 20px; padding: 10px; background-color: #f9f9f9; border-radius: 5px; }}
-                .footer {{ margin-top: 30px; text-align: center; font-size: 12px; color: #666; }}
-            </style>
-        </head>
-        <body>
-            <div class="header">
-                <h1>BULLETIN DE NOTES</h1>
-                <h2>Année Universitaire {annee}</h2>
-            </div>
-            
-            <div class="student-info">
-                <p><strong>Numéro d'inscription:</strong> {n_insc}</p>
-                <p><strong>Nom:</strong> {nom}</p>
-                <p><strong>Niveau:</strong> {niveau}</p>
-                <p><strong>Année:</strong> {annee}</p>
-            </div>
-        """
-        
-        if notes:
-            html += """
-            <table class="table">
-                <thead>
-                    <tr>
-                        <th>Matière</th>
-                        <th>Coefficient</th>
-                        <th>Note</th>
-                        <th>Note pondérée</th>
-                    </tr>
-                </thead>
-                <tbody>
-            """
-            
-            total_coef = 0
-            total_notes_ponderees = 0
-            
-            for code, libelle, coef, note in notes:
-                note_ponderee = note * coef
-                total_coef += coef
-                total_notes_ponderees += note_ponderee
-                
-                html += f"""
-                    <tr>
-                        <td>{code} - {libelle}</td>
-                        <td>{coef}</td>
-                        <td>{note}/20</td>
-                        <td>{note_ponderee:.2f}</td>
-                    </tr>
-                """
-            
-            html += f"""
-                </tbody>
-                <tfoot>
-                    <tr style="font-weight: bold;">
-                        <td>TOTAL</td>
-                        <td>{total_coef}</td>
-                        <td></td>
-                        <td>{total_notes_ponderees:.2f}</td>
-                    </tr>
-            """
-            
-            if moyenne_data:
-                moyenne, weighted_sum, total_coef_calc = moyenne_data
-                observation = self.observation_from_moyenne(moyenne) 
-                
-                html += f"""
-                    <tr style="font-weight: bold; background-color: #e8f4f8;">
-                        <td>MOYENNE GÉNÉRALE</td>
-                        <td></td>
-                        <td></td>
-                        <td>{moyenne}/20</td>
-                    </tr>
-                </tfoot>
-            </table>
-            
-            <div class="summary">
-                <p><strong>Moyenne générale:</strong> {moyenne}/20</p>
-                <p><strong>Observation:</strong> {observation}</p>
-                <p><strong>Date d'édition:</strong> {datetime.now().strftime('%d/%m/%Y %H:%M')}</p>
-            </div>
-                """
-            else:
-                html += """
-                </tfoot>
-            </table>
-            
-            <div class="summary">
-                <p><strong>Moyenne générale:</strong> Non calculable</p>
-                <p><strong>Observation:</strong> N/A</p>
-            </div>
-                """
-        else:
-            html += """
-            <div class="summary">
-                <p><strong>Aucune note enregistrée pour cette année.</strong></p>
-            </div>
-            """
-        
-        html += """
-            <div class="footer" style="margin-top: 40px; text-align: center; border-top: 1px solid #ddd; padding-top: 15px;">
-                <p style="color: #666; font-size: 12px; margin: 0;">
-                    <strong>e-NOTE</strong> - application gestion des notes<br>
-                    Bulletin généré le {}
-                </p>
-            </div>
-        </body>
-        </html>
-        """.format(datetime.now().strftime('%d/%m/%Y à %H:%M'))
-    
-
+    @_rapport
     def imprimer_bulletin(self):
-        if self.bulletin_ninsc.currentIndex() < 0:
+        n_insc = self.bulletin_ninsc.currentData()
+        if n_insc is None:
             QMessageBox.warning(self, "Erreur", "Sélectionnez un étudiant.")
             return
-        
-        n_insc = self.bulletin_ninsc.currentData()
+
         annee = self.bulletin_annee.value()
         
-        etudiant_info = self.db.find_etudiant(n_insc)
-        if not etudiant_info:
+        bulletin = next(self.db.get_notes_for_students([n_insc], annee), None)
+        if bulletin is None:
             QMessageBox.warning(self, "Erreur", "Étudiant non trouvé.")
             return
         
-        n_insc, nom, niveau, annee_etud = etudiant_info[0]
+        etudiant, notes, moyenne_data = bulletin
+        n_insc, nom, niveau, _ = etudiant
+        moyenne = moyenne_data[0] if moyenne_data else None
+        rang = self.db.rang_promotion(annee, etudiant, moyenne)
+        observation = self.db.get_regles().observation(moyenne, notes)
         
-        notes = self.db.get_notes_for_student(n_insc, annee)
-        moyenne_data = self.db.calculate_average_for_student(n_insc, annee)
-        
-        html_content = self.generate_bulletin_html(n_insc, nom, niveau, annee, notes, moyenne_data)
+        html_content = self.generate_bulletin_html(n_insc, nom, niveau, annee, notes, moyenne_data, rang, observation)
         
         dialog = BulletinDialog(html_content, self)
         dialog.exec_()
 
-    def generate_bulletin_html(self, n_insc, nom, niveau, annee, notes, moyenne_data):
-        html = f"""
-        <!DOCTYPE html>
-        <html>
-        <head>
-            <meta charset="UTF-8">
-            <title>Bulletin de Notes</title>
-            <style>
-                body {{ font-family: Arial, sans-serif; margin: 20px; }}
-                .header {{ text-align: center; border-bottom: 2px solid #333; padding-bottom: 10px; margin-bottom: 20px; }}
-                .student-info {{ margin-bottom: 20px; }}
-                .table {{ width: 100%; border-collapse: collapse; margin-bottom: 20px; }}
-                .table th, .table td {{ border: 1px solid #ddd; padding: 8px; text-align: left; }}
-                .table th {{ background-color: #f2f2f2; font-weight: bold; }}
-                .summary {{ margin-top: 20px; padding: 10px; background-color: #f9f9f9; border-radius: 5px; }}
-                .footer {{ margin-top: 30px; text-align: center; font-size: 12px; color: #666; }}
-            </style>
-        </head>
-        <body>
-            <div class="header">
-                <h1>BULLETIN DE NOTES</h1>
-                <h2>Année Universitaire {annee}</h2>
-            </div>
-            
-            <div class="student-info">
-                <p><strong>Numéro d'inscription:</strong> {n_insc}</p>
-                <p><strong>Nom:</strong> {nom}</p>
-                <p><strong>Niveau:</strong> {niveau}</p>
-                <p><strong>Année:</strong> {annee}</p>
-            </div>
-        """
-        
-        if notes:
-            html += """
-            <table class="table">
-                <thead>
-                    <tr>
-                        <th>Matière</th>
-                        <th>Coefficient</th>
-                        <th>Note</th>
-                        <th>Note pondérée</th>
-                    </tr>
-                </thead>
-                <tbody>
-            """
-            
-            total_coef = 0
-            total_notes_ponderees = 0
-            
-            for code, libelle, coef, note in notes:
-                note_ponderee = note * coef
-                total_coef += coef
-                total_notes_ponderees += note_ponderee
-                
-                html += f"""
-                    <tr>
-                        <td>{code} - {libelle}</td>
-                        <td>{coef}</td>
-                        <td>{note}/20</td>
-                        <td>{note_ponderee:.2f}</td>
-                    </tr>
-                """
-            
-            html += f"""
-                </tbody>
-                <tfoot>
-                    <tr style="font-weight: bold;">
-                        <td>TOTAL</td>
-                        <td>{total_coef}</td>
-                        <td></td>
-                        <td>{total_notes_ponderees:.2f}</td>
-                    </tr>
-            """
-            
-            if moyenne_data:
-                moyenne, weighted_sum, total_coef_calc = moyenne_data
-                observation = self.observation_from_moyenne(moyenne) 
-                
-                html += f"""
-                    <tr style="font-weight: bold; background-color: #e8f4f8;">
-                        <td>MOYENNE GÉNÉRALE</td>
-                        <td></td>
-                        <td></td>
-                        <td>{moyenne}/20</td>
-                    </tr>
-                </tfoot>
-            </table>
-            
-            <div class="summary">
-                <p><strong>Moyenne générale:</strong> {moyenne}/20</p>
-                <p><strong>Observation:</strong> {observation}</p>
-                <p><strong>Date d'édition:</strong> {datetime.now().strftime('%d/%m/%Y %H:%M')}</p>
-            </div>
-                """
-            else:
-                html += """
-                </tfoot>
-            </table>
-            
-            <div class="summary">
-                <p><strong>Moyenne générale:</strong> Non calculable</p>
-                <p><strong>Observation:</strong> N/A</p>
-            </div>
-                """
+    def generate_bulletin_html(self, n_insc, nom, niveau, annee, notes, moyenne_data, rang=None, observation=None):
+        return generate_bulletin_html(n_insc, nom, niveau, annee, notes, moyenne_data, rang, observation)
+
+    @_rapport
+    def generer_bulletins_lot(self):
+        annee = self.bulletin_annee.value()
+        niveau = self.lot_niveau.currentText()
+        niveau_nom = niveau if niveau != "Tous les niveaux" else "all"
+        un_par_etudiant = self.lot_mode.currentIndex() == 1
+
+        output_dir = None
+        filename = None
+        if un_par_etudiant:
+            output_dir = QFileDialog.getExistingDirectory(self, "Dossier des bulletins")
+            if not output_dir:
+                return
         else:
-            html += """
-            <div class="summary">
-                <p><strong>Aucune note enregistrée pour cette année.</strong></p>
-            </div>
-            """
-        
-        html += """
-            <div class="footer">
-                <p>© {} E-note - Tous droits réservés</p>
-            </div>
-        </body>
-        </html>
-        """.format(datetime.now().year)
-        
-        return html
+            filename, _ = QFileDialog.getSaveFileName(self, "Enregistrer les bulletins PDF",
+                                                    f"bulletins_{annee}_{niveau_nom}.pdf",
+                                                    "PDF Files (*.pdf)")
+            if not filename:
+                return
+
+        niveau_filtre = niveau if niveau != "Tous les niveaux" else None
+        decisions = self.db.get_decisions(annee=annee, niveau=niveau_filtre)
+        bulletins = [etudiant + (notes, moyenne_data,
+                                 self.db.rang_promotion(annee, etudiant, moyenne_data[0] if moyenne_data else None),
+                                 decisions.get(etudiant[0]))
+                     for etudiant, notes, moyenne_data
+                     in self.db.get_notes_for_students(annee=annee, niveau=niveau_filtre)]
+        if not bulletins:
+            QMessageBox.warning(self, "Attention", "Aucun étudiant pour cette année et ce niveau.")
+            return
+
+        progress = QProgressDialog("Génération des bulletins...", "Annuler", 0, len(bulletins), self)
+        progress.setWindowTitle("Bulletins")
+        progress.setWindowModality(Qt.WindowModal)
+        progress.setMinimumDuration(0)
+
+        try:
+            if un_par_etudiant:
+                lots = [bulletins[i:i + BULLETINS_PAR_LOT] for i in range(0, len(bulletins), BULLETINS_PAR_LOT)]
+                results = self._render_lots(lots, output_dir, progress)
+                if results is not None:
+                    QMessageBox.information(self, "Succès", f"{len(results)} bulletin(s) générés dans: {output_dir}")
+                return
+
+            def on_progress(done):
+                progress.setValue(done)
+                QApplication.processEvents()
+                return not progress.wasCanceled()
+
+            # Un seul PDF: mise en page et dessin dans un même QPdfWriter, donc dans ce processus;
+            # le HTML, peu coûteux, est produit au fil de l'écriture
+            html_list = (generate_bulletin_html(*bulletin) for bulletin in bulletins)
+            if not write_bulletins_pdf(html_list, filename, on_progress):
+                os.remove(filename)
+                return
+            QMessageBox.information(self, "Succès", f"{len(bulletins)} bulletin(s) exportés: {filename}")
+        except Exception as e:
+            QMessageBox.critical(self, "Erreur", f"Erreur lors de la génération: {str(e)}")
+        finally:
+            progress.close()
+
+    def _render_lots(self, lots, output_dir, progress):
+        """Un PDF par étudiant dans output_dir, lots rendus en parallèle; None si l'utilisateur annule"""
+        workers = min(len(lots), os.cpu_count() or 1)
+        if workers == 1:
+            # Un processus de plus n'apporterait que le coût de son démarrage (imports de PyQt5, matplotlib)
+            results = []
+            for lot in lots:
+                results += render_bulletins_lot(lot, output_dir)
+                progress.setValue(len(results))
+                QApplication.processEvents()
+                if progress.wasCanceled():
+                    return None
+            return results
+
+        results = {}
+        done_count = 0
+        annule = False
+        executor = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"),
+                                       initializer=_init_bulletin_worker)
+        try:
+            futures = {executor.submit(render_bulletins_lot, lot, output_dir): i for i, lot in enumerate(lots)}
+            pending = set(futures)
+            while pending and not annule:
+                done, pending = wait(pending, timeout=0.1, return_when=FIRST_COMPLETED)
+                for future in done:
+                    results[futures[future]] = future.result()
+                    done_count += len(results[futures[future]])
+                progress.setValue(done_count)
+                QApplication.processEvents()
+                annule = progress.wasCanceled()
+        finally:
+            # Après une annulation, les lots en cours se terminent sans bloquer l'interface
+            executor.shutdown(wait=not annule, cancel_futures=True)
+        if annule:
+            return None
+        return [r for i in sorted(results) for r in results[i]]
 
     def show_classement(self):
         self.clear_view()
@@ -2267,6 +5902,20 @@ class MainWindow(QMainWindow):
         filter_layout.addWidget(btn_export_classement)
         v.addLayout(filter_layout)
 
+        situer_layout = QHBoxLayout()
+        self.classement_situer_input = QLineEdit()
+        self.classement_situer_input.setPlaceholderText("N° inscription")
+        btn_situer = QPushButton("Situer")
+        self._style_button(btn_situer, "#3498db")
+        self.lbl_situer = QLabel("")
+        self.lbl_situer.setStyleSheet("font-weight: bold; color: #2c3e50;")
+        situer_layout.addWidget(QLabel("Étudiant:"))
+        situer_layout.addWidget(self.classement_situer_input)
+        situer_layout.addWidget(btn_situer)
+        situer_layout.addWidget(self.lbl_situer)
+        situer_layout.addStretch()
+        v.addLayout(situer_layout)
+
         self.tbl_classement = QTableWidget()
         self.tbl_classement.setColumnCount(6)
         self.tbl_classement.setHorizontalHeaderLabels(["Rang", "N° Inscription", "Nom", "Niveau", "Année", "Moyenne"])
@@ -2289,28 +5938,25 @@ class MainWindow(QMainWindow):
 
         btn_generer.clicked.connect(self.generer_classement)
         btn_export_classement.clicked.connect(self.export_classement)
+        btn_situer.clicked.connect(self.situer_etudiant)
+        self.classement_situer_input.returnPressed.connect(self.situer_etudiant)
 
         self.view_layout.addWidget(container)
         self.generer_classement()
 
+    @_rapport
     def generer_classement(self):
         annee = self.classement_annee.value()
         niveau = self.classement_niveau.currentText()
         if niveau == "Tous les niveaux":
             niveau = None
         
-        students_with_avg = self.db.get_all_students_with_average(annee=annee, niveau=niveau)
-        
-        students_with_avg = [s for s in students_with_avg if s[4] is not None]
-        
-        students_with_avg.sort(key=lambda x: x[4] if x[4] is not None else -1, reverse=True)
+        classement = self.db.get_classement(annee=annee, niveau=niveau)
         
         self.tbl_classement.setRowCount(0)
+        self.tbl_classement.setRowCount(len(classement))
         
-        for rang, (n_insc, nom, niv, annee_etud, moyenne) in enumerate(students_with_avg, 1):
-            r = self.tbl_classement.rowCount()
-            self.tbl_classement.insertRow(r)
-            
+        for r, (rang, n_insc, nom, niv, annee_etud, moyenne, rang_dense, effectif) in enumerate(classement):
             self.tbl_classement.setItem(r, 0, QTableWidgetItem(str(rang)))
             self.tbl_classement.setItem(r, 1, QTableWidgetItem(n_insc))
             self.tbl_classement.setItem(r, 2, QTableWidgetItem(nom))
@@ -2328,6 +5974,19 @@ class MainWindow(QMainWindow):
                 for c in range(6):
                     self.tbl_classement.item(r, c).setBackground(QColor(205, 127, 50))
 
+    def situer_etudiant(self):
+        n_insc = self.classement_situer_input.text().strip()
+        if not n_insc:
+            return
+        position = self.db.situer_etudiant(n_insc)
+        if position is None:
+            self.lbl_situer.setText("Aucune moyenne pour cet étudiant.")
+            return
+        rang, effectif, moyenne, voisins = position
+        voisins_txt = ", ".join(f"{r}. {n} ({m})" for r, n, m in voisins if n != n_insc)
+        self.lbl_situer.setText(f"Rang: {rang}/{effectif} - Moyenne: {moyenne} - Voisins: {voisins_txt}")
+
+    @_rapport
     def export_classement(self):
         annee = self.classement_annee.value()
         niveau = self.classement_niveau.currentText()
@@ -2339,47 +5998,412 @@ class MainWindow(QMainWindow):
             return
         
         try:
-            students_with_avg = self.db.get_all_students_with_average(annee=annee, niveau=(niveau if niveau != "Tous les niveaux" else None))
-            students_with_avg = [s for s in students_with_avg if s[4] is not None]
-            students_with_avg.sort(key=lambda x: x[4] if x[4] is not None else -1, reverse=True)
+            classement = self.db.get_classement(annee=annee, niveau=(niveau if niveau != "Tous les niveaux" else None))
             
-            if not students_with_avg:
+            if not classement:
                 QMessageBox.warning(self, "Attention", "Aucun étudiant avec des notes pour l'export.")
                 return
             
-            with PdfPages(filename) as pdf:
-                plt.figure(figsize=(12, 10))
-                
-                fig, ax = plt.subplots(figsize=(12, 10))
-                ax.axis('tight')
-                ax.axis('off')
-                
-                table_data = [["Rang", "N° Inscription", "Nom", "Niveau", "Année", "Moyenne"]]
-                
-                for rang, (n_insc, nom, niv, annee_etud, moyenne) in enumerate(students_with_avg, 1):
-                    table_data.append([
-                        str(rang),
-                        n_insc,
-                        nom,
-                        niv,
-                        str(annee_etud),
-                        f"{moyenne:.2f}" if moyenne is not None else "N/A"
-                    ])
-                
-                table = ax.table(cellText=table_data, loc='center', cellLoc='center')
-                table.auto_set_font_size(False)
-                table.set_fontsize(8)
-                table.scale(1, 1.5)
-                
-                plt.title(f"Classement des Étudiants - Année {annee}\nNiveau: {niveau}", fontsize=16, fontweight='bold', pad=20)
-                
-                pdf.savefig(fig, bbox_inches='tight')
-                plt.close()
-            
-            QMessageBox.information(self, "Succès", f"Classement exporté: {filename}")
+            rows = [row[:6] for row in classement]
+            self.start_export(export_classement_pdf_file, (filename, rows, annee, niveau),
+                              f"Classement exporté: {filename}")
         except Exception as e:
             QMessageBox.critical(self, "Erreur", f"Erreur lors de l'export: {str(e)}")
 
+    def show_statistiques_matieres(self):
+        self.clear_view()
+        container = QWidget()
+        v = QVBoxLayout()
+        container.setLayout(v)
+
+        title = QLabel("<h2 style='color: #2c3e50;'>Statistiques par Matière</h2>")
+        title.setAlignment(Qt.AlignCenter)
+        v.addWidget(title)
+
+        filter_layout = QHBoxLayout()
+        self.stats_matieres_annee = QSpinBox()
+        self.stats_matieres_annee.setRange(2000, 2100)
+        self.stats_matieres_annee.setValue(datetime.now().year)
+        self.stats_matieres_niveau = QComboBox()
+        self.stats_matieres_niveau.addItems(["Tous les niveaux", "L1", "L2", "L3", "M1", "M2"])
+        btn_actualiser = QPushButton("Actualiser")
+        self._style_button(btn_actualiser, "#3498db")
+
+        filter_layout.addWidget(QLabel("Année:"))
+        filter_layout.addWidget(self.stats_matieres_annee)
+        filter_layout.addWidget(QLabel("Niveau:"))
+        filter_layout.addWidget(self.stats_matieres_niveau)
+        filter_layout.addWidget(btn_actualiser)
+        filter_layout.addStretch()
+        v.addLayout(filter_layout)
+
+        self.tbl_stats_matieres = QTableWidget()
+        self.tbl_stats_matieres.setColumnCount(10)
+        self.tbl_stats_matieres.setHorizontalHeaderLabels(["Code", "Matière", "Coef", "Effectif", "Moyenne", "Médiane",
+                                                           "Écart-type", "Min", "Max", "Réussite (%)"])
+        self.tbl_stats_matieres.setEditTriggers(QtWidgets.QAbstractItemView.NoEditTriggers)
+        self.tbl_stats_matieres.setSelectionBehavior(QtWidgets.QAbstractItemView.SelectRows)
+        self.tbl_stats_matieres.setStyleSheet("""
+            QTableWidget {
+                gridline-color: #bdc3c7;
+                border: 1px solid #bdc3c7;
+            }
+            QHeaderView::section {
+                background-color: #34495e;
+                color: white;
+                font-weight: bold;
+                padding: 6px;
+                border: 1px solid #2c3e50;
+            }
+        """)
+        v.addWidget(self.tbl_stats_matieres)
+
+        charts_layout = QHBoxLayout()
+        self.stats_matieres_chart = MatplotlibWidget()
+        self.stats_matieres_chart.setMinimumHeight(350)
+        charts_layout.addWidget(self.stats_matieres_chart, 3)
+        self.stats_matieres_correlations = MatplotlibWidget()
+        self.stats_matieres_correlations.setMinimumHeight(350)
+        charts_layout.addWidget(self.stats_matieres_correlations, 2)
+        v.addLayout(charts_layout)
+
+        btn_actualiser.clicked.connect(self.refresh_statistiques_matieres)
+
+        self.view_layout.addWidget(container)
+        self.refresh_statistiques_matieres()
+
+    @_rapport
+    def refresh_statistiques_matieres(self):
+        annee = self.stats_matieres_annee.value()
+        niveau = self.stats_matieres_niveau.currentText()
+        if niveau == "Tous les niveaux":
+            niveau = None
+
+        statistiques = self.db.get_statistiques_matieres(annee=annee, niveau=niveau)
+
+        # Tri désactivé pendant le remplissage, sinon les lignes bougent à chaque setItem
+        self.tbl_stats_matieres.setSortingEnabled(False)
+        self.tbl_stats_matieres.setRowCount(len(statistiques))
+        colonnes = ('code', 'libelle', 'coef', 'effectif', 'moyenne', 'mediane', 'ecart_type', 'min', 'max', 'taux_reussite')
+        for r, stats in enumerate(statistiques):
+            for c, cle in enumerate(colonnes):
+                valeur = stats[cle]
+                item = QTableWidgetItem()
+                if isinstance(valeur, float):
+                    # Valeur numérique dans DisplayRole: le tri compare des nombres et non du texte
+                    item.setData(Qt.DisplayRole, round(valeur, 2))
+                elif valeur is None:
+                    item.setData(Qt.DisplayRole, "N/A")
+                else:
+                    item.setData(Qt.DisplayRole, valeur)
+                self.tbl_stats_matieres.setItem(r, c, item)
+        self.tbl_stats_matieres.setSortingEnabled(True)
+
+        self.stats_matieres_chart.plot_histogrammes_matieres(statistiques)
+        self.stats_matieres_correlations.plot_correlations(*self.db.get_correlations(annee=annee, niveau=niveau))
+
+    def show_tendances(self):
+        self.clear_view()
+        container = QWidget()
+        v = QVBoxLayout()
+        container.setLayout(v)
+
+        title = QLabel("<h2 style='color: #2c3e50;'>Tendances sur plusieurs années</h2>")
+        title.setAlignment(Qt.AlignCenter)
+        v.addWidget(title)
+
+        filter_layout = QHBoxLayout()
+        self.tendances_niveau = QComboBox()
+        self.tendances_niveau.addItems(["Tous les niveaux", "L1", "L2", "L3", "M1", "M2"])
+        filter_layout.addWidget(QLabel("Niveau:"))
+        filter_layout.addWidget(self.tendances_niveau)
+        filter_layout.addStretch()
+        v.addLayout(filter_layout)
+
+        self.tbl_tendances = QTableWidget()
+        self.tbl_tendances.setColumnCount(7)
+        self.tbl_tendances.setHorizontalHeaderLabels(["Année", "Effectif", "Moyenne", "Admission (%)",
+                                                      "Admis", "Redoublants", "Exclus"])
+        self.tbl_tendances.setEditTriggers(QtWidgets.QAbstractItemView.NoEditTriggers)
+        self.tbl_tendances.setMaximumHeight(200)
+        self.tbl_tendances.setStyleSheet("""
+            QTableWidget {
+                gridline-color: #bdc3c7;
+                border: 1px solid #bdc3c7;
+            }
+            QHeaderView::section {
+                background-color: #34495e;
+                color: white;
+                font-weight: bold;
+                padding: 6px;
+                border: 1px solid #2c3e50;
+            }
+        """)
+        v.addWidget(self.tbl_tendances)
+
+        self.tendances_chart = MatplotlibWidget()
+        self.tendances_chart.setMinimumHeight(400)
+        v.addWidget(self.tendances_chart)
+
+        self.tendances_niveau.currentIndexChanged.connect(self.refresh_tendances)
+
+        self.view_layout.addWidget(container)
+        self.refresh_tendances()
+
+    @_rapport
+    def refresh_tendances(self):
+        niveau = self.tendances_niveau.currentText()
+        if niveau == "Tous les niveaux":
+            niveau = None
+
+        tendances = self.db.get_tendances(niveau)
+        tendances_matieres = self.db.get_tendances_matieres(niveau)
+
+        self.tbl_tendances.setRowCount(len(tendances))
+        for r, t in enumerate(tendances):
+            valeurs = [t['annee'], t['effectif'],
+                       f"{t['moyenne']:.2f}" if t['moyenne'] is not None else "N/A",
+                       f"{t['taux_admission']:.1f}" if t['taux_admission'] is not None else "N/A",
+                       t['admis'], t['redoublant'], t['exclus']]
+            for c, valeur in enumerate(valeurs):
+                self.tbl_tendances.setItem(r, c, QTableWidgetItem(str(valeur)))
+
+        self.tendances_chart.plot_tendances(tendances, tendances_matieres)
+
+    def show_diagnostics(self):
+        """Panneau caché: durées des vues et des exports, caches et stockage de la base"""
+        self.clear_view()
+        container = QWidget()
+        v = QVBoxLayout()
+        container.setLayout(v)
+
+        title = QLabel("<h2 style='color: #2c3e50;'>Diagnostics de performance</h2>")
+        title.setAlignment(Qt.AlignCenter)
+        v.addWidget(title)
+
+        self.lbl_stockage = QLabel()
+        v.addWidget(self.lbl_stockage)
+
+        tables_layout = QHBoxLayout()
+        self.tbl_durees = QTableWidget(0, 6)
+        self.tbl_durees.setHorizontalHeaderLabels(["Opération", "Mesures", "Dernière (ms)", "p50 (ms)",
+                                                   "p95 (ms)", "Max (ms)"])
+        self.tbl_durees.setEditTriggers(QtWidgets.QAbstractItemView.NoEditTriggers)
+        self.tbl_caches = QTableWidget(0, 4)
+        self.tbl_caches.setHorizontalHeaderLabels(["Cache", "Succès", "Échecs", "Taux (%)"])
+        self.tbl_caches.setEditTriggers(QtWidgets.QAbstractItemView.NoEditTriggers)
+        tables_layout.addWidget(self.tbl_durees, 3)
+        tables_layout.addWidget(self.tbl_caches, 2)
+        v.addLayout(tables_layout)
+
+        self.diagnostics_chart = MatplotlibWidget()
+        self.diagnostics_chart.setMinimumHeight(350)
+        v.addWidget(self.diagnostics_chart)
+
+        btn_layout = QHBoxLayout()
+        btn_actualiser = QPushButton("Actualiser")
+        self.chk_profilage = QCheckBox("Profilage des requêtes SQL")
+        self.chk_profilage.setChecked(self.db.profileur is not None and self.db.profileur.actif)
+        btn_exporter = QPushButton("Exporter le profil (JSON)")
+        btn_actualiser.clicked.connect(self.refresh_diagnostics)
+        self.chk_profilage.toggled.connect(self.basculer_profilage)
+        btn_exporter.clicked.connect(self.exporter_profil_diagnostics)
+        btn_layout.addWidget(btn_actualiser)
+        btn_layout.addWidget(self.chk_profilage)
+        btn_layout.addWidget(btn_exporter)
+        btn_layout.addStretch()
+        v.addLayout(btn_layout)
+
+        # Rafraîchi seulement tant que le panneau est affiché: le minuteur disparaît avec lui
+        timer = QTimer(container)
+        timer.setInterval(5000)
+        timer.timeout.connect(self.refresh_diagnostics)
+        timer.start()
+
+        self.view_layout.addWidget(container)
+        self.refresh_diagnostics()
+
+    def refresh_diagnostics(self):
+        stockage = self.db.statistiques_stockage()
+        # cache_size négatif: taille en Kio plutôt qu'en pages
+        cache = stockage["cache_size"]
+        cache_ko = -cache if cache < 0 else cache * stockage["page_size"] // 1024
+        self.lbl_stockage.setText(
+            f"Base: {stockage['taille_fichier'] // 1024} Ko sur disque, {stockage['page_count']} pages de "
+            f"{stockage['page_size']} octets dont {stockage['freelist_count']} libres — "
+            f"cache de pages SQLite: {cache_ko} Ko, mmap: {stockage['mmap_size'] // 1024} Ko, "
+            f"journal: {stockage['journal_mode']}, auto_vacuum: {stockage['auto_vacuum']}"
+            + (" — mode mémoire" if self.db.en_memoire else ""))
+
+        lignes = self.mesures.resume()
+        if self.db.profileur is not None:
+            lignes += [(f"Database.{nom}", m["appels"], None, m["p50"], m["p95"], None)
+                       for nom, m in self.db.profileur.statistiques().items()]
+        self.tbl_durees.setRowCount(len(lignes))
+        for r, ligne in enumerate(lignes):
+            valeurs = [ligne[0], ligne[1]] + ["" if d is None else f"{d * 1000:.1f}" for d in ligne[2:]]
+            for c, valeur in enumerate(valeurs):
+                self.tbl_durees.setItem(r, c, QTableWidgetItem(str(valeur)))
+
+        caches = self.db.statistiques_caches()
+        caches["graphiques"] = (self.chart_cache.hits, self.chart_cache.misses)
+        self.tbl_caches.setRowCount(len(caches))
+        for r, (nom, (succes, echecs)) in enumerate(caches.items()):
+            taux = f"{100 * succes / (succes + echecs):.0f}" if succes + echecs else "N/A"
+            for c, valeur in enumerate([nom, succes, echecs, taux]):
+                self.tbl_caches.setItem(r, c, QTableWidgetItem(str(valeur)))
+
+        self.diagnostics_chart.plot_durees(self.mesures.durees)
+
+    def basculer_profilage(self, actif):
+        if actif:
+            self.db.activer_profilage()
+        else:
+            self.db.desactiver_profilage()
+
+    def exporter_profil_diagnostics(self):
+        if self.db.profileur is None:
+            QMessageBox.information(self, "Profil", "Activez d'abord le profilage des requêtes SQL.")
+            return
+        filename, _ = QFileDialog.getSaveFileName(self, "Exporter le profil", "profil.json", "JSON (*.json)")
+        if filename:
+            try:
+                self.db.profileur.exporter_json(filename)
+            except OSError as e:
+                QMessageBox.critical(self, "Erreur", f"Erreur lors de l'export: {e}")
+
+    def show_simulation(self):
+        self.clear_view()
+        container = QWidget()
+        v = QVBoxLayout()
+        container.setLayout(v)
+
+        title = QLabel("<h2 style='color: #2c3e50;'>Simulation des coefficients</h2>")
+        title.setAlignment(Qt.AlignCenter)
+        v.addWidget(title)
+
+        table_style = """
+            QTableWidget {
+                gridline-color: #bdc3c7;
+                border: 1px solid #bdc3c7;
+            }
+            QHeaderView::section {
+                background-color: #34495e;
+                color: white;
+                font-weight: bold;
+                padding: 6px;
+                border: 1px solid #2c3e50;
+            }
+        """
+
+        filter_layout = QHBoxLayout()
+        self.simulation_annee = QSpinBox()
+        self.simulation_annee.setRange(2000, 2100)
+        self.simulation_annee.setValue(datetime.now().year)
+        self.simulation_niveau = QComboBox()
+        self.simulation_niveau.addItems(["Tous les niveaux", "L1", "L2", "L3", "M1", "M2"])
+        self.simulation_seuil_admis = QDoubleSpinBox()
+        self.simulation_seuil_admis.setRange(0.0, 20.0)
+        self.simulation_seuil_admis.setSingleStep(0.5)
+        self.simulation_seuil_exclus = QDoubleSpinBox()
+        self.simulation_seuil_exclus.setRange(0.0, 20.0)
+        self.simulation_seuil_exclus.setSingleStep(0.5)
+        btn_simuler = QPushButton("Simuler")
+        btn_reinitialiser = QPushButton("Réinitialiser")
+        self._style_button(btn_simuler, "#3498db")
+        self._style_button(btn_reinitialiser, "#95a5a6")
+
+        filter_layout.addWidget(QLabel("Année:"))
+        filter_layout.addWidget(self.simulation_annee)
+        filter_layout.addWidget(QLabel("Niveau:"))
+        filter_layout.addWidget(self.simulation_niveau)
+        filter_layout.addWidget(QLabel("Seuil admis:"))
+        filter_layout.addWidget(self.simulation_seuil_admis)
+        filter_layout.addWidget(QLabel("Seuil exclus:"))
+        filter_layout.addWidget(self.simulation_seuil_exclus)
+        filter_layout.addWidget(btn_simuler)
+        filter_layout.addWidget(btn_reinitialiser)
+        v.addLayout(filter_layout)
+
+        self.tbl_simulation_coefs = QTableWidget()
+        self.tbl_simulation_coefs.setColumnCount(4)
+        self.tbl_simulation_coefs.setHorizontalHeaderLabels(["Code", "Libellé", "Coef actuel", "Coef simulé"])
+        self.tbl_simulation_coefs.setEditTriggers(QtWidgets.QAbstractItemView.NoEditTriggers)
+        self.tbl_simulation_coefs.setMaximumHeight(220)
+        self.tbl_simulation_coefs.setStyleSheet(table_style)
+        v.addWidget(self.tbl_simulation_coefs)
+
+        self.lbl_simulation = QLabel("")
+        self.lbl_simulation.setStyleSheet("font-weight: bold; font-size: 14px; color: #2c3e50;")
+        v.addWidget(self.lbl_simulation)
+
+        self.tbl_simulation = QTableWidget()
+        self.tbl_simulation.setColumnCount(9)
+        self.tbl_simulation.setHorizontalHeaderLabels(["N° Inscription", "Nom", "Niveau", "Moyenne", "Moyenne simulée",
+                                                       "Statut", "Statut simulé", "Rang", "Rang simulé"])
+        self.tbl_simulation.setEditTriggers(QtWidgets.QAbstractItemView.NoEditTriggers)
+        self.tbl_simulation.setSelectionBehavior(QtWidgets.QAbstractItemView.SelectRows)
+        self.tbl_simulation.setStyleSheet(table_style)
+        v.addWidget(self.tbl_simulation)
+
+        btn_simuler.clicked.connect(self.simuler_coefficients)
+        btn_reinitialiser.clicked.connect(self.load_simulation_coefs)
+
+        self.view_layout.addWidget(container)
+        self.load_simulation_coefs()
+
+    def load_simulation_coefs(self):
+        matieres = self.db.get_matieres()
+        self.tbl_simulation_coefs.setRowCount(len(matieres))
+        for r, (code, libelle, coef) in enumerate(matieres):
+            self.tbl_simulation_coefs.setItem(r, 0, QTableWidgetItem(code))
+            self.tbl_simulation_coefs.setItem(r, 1, QTableWidgetItem(libelle))
+            self.tbl_simulation_coefs.setItem(r, 2, QTableWidgetItem(str(coef)))
+            spin = QDoubleSpinBox()
+            spin.setRange(0.0, 100.0)
+            spin.setSingleStep(0.5)
+            spin.setValue(coef)
+            self.tbl_simulation_coefs.setCellWidget(r, 3, spin)
+        regles = self.db.get_regles()
+        self.simulation_seuil_admis.setValue(regles.seuil_admis)
+        self.simulation_seuil_exclus.setValue(regles.seuil_exclus)
+        self.lbl_simulation.setText("")
+        self.tbl_simulation.setRowCount(0)
+
+    @_rapport
+    def simuler_coefficients(self):
+        annee = self.simulation_annee.value()
+        niveau = self.simulation_niveau.currentText()
+        if niveau == "Tous les niveaux":
+            niveau = None
+        try:
+            regles = self.db.get_regles().avec(seuil_admis=self.simulation_seuil_admis.value(),
+                                               seuil_exclus=self.simulation_seuil_exclus.value())
+        except ValueError as e:
+            QMessageBox.warning(self, "Erreur", str(e))
+            return
+
+        coefs = {self.tbl_simulation_coefs.item(r, 0).text(): self.tbl_simulation_coefs.cellWidget(r, 3).value()
+                 for r in range(self.tbl_simulation_coefs.rowCount())}
+        resultat = self.db.simuler_coefficients(annee, niveau, coefs, regles)
+
+        avant = resultat['avant']
+        apres = resultat['apres']
+        self.lbl_simulation.setText(" | ".join(
+            f"{libelle}: {avant[cle]} → {apres[cle]}"
+            for cle, libelle in zip(('admis', 'redoublant', 'exclus', 'sans_notes'), STATUTS)))
+
+        changements = resultat['changements']
+        self.tbl_simulation.setRowCount(len(changements))
+        for r, ligne in enumerate(changements):
+            for c, valeur in enumerate(ligne):
+                self.tbl_simulation.setItem(r, c, QTableWidgetItem("N/A" if valeur is None else str(valeur)))
+            if ligne[5] != ligne[6]:
+                couleur = QColor(COULEURS_STATUTS[STATUTS.index(ligne[6])])
+                couleur.setAlpha(90)
+                for c in range(len(ligne)):
+                    self.tbl_simulation.item(r, c).setBackground(couleur)
+
 def main():
     app = QApplication(sys.argv)
     
@@ -2393,7 +6417,9 @@ def main():
         palette.setColor(QPalette.WindowText, QColor(0, 0, 0))
         app.setPalette(palette)
         
-        window = MainWindow()
+        # --memoire: base chargée en RAM pendant la session (semaine de délibération)
+        # --profil: temps des méthodes de Database et requêtes lentes, exportés en JSON à la fermeture
+        window = MainWindow(en_memoire="--memoire" in sys.argv, profil="--profil" in sys.argv)
         window.show()
         
         sys.exit(app.exec_())
@@ -2401,4 +6427,5 @@ def main():
         sys.exit(0)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    multiprocessing.freeze_support()
+    main()